@@ -1,67 +1,25 @@
-import requests
 import os, sys
 
 # Add 'utils/' directory to path for module imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "utils")))
 
-from utils.crypto_utils import (
-    load_public_key, load_dsa_key, load_key,
-    encrypt_message, sign_message, sign_dsa
-)
+from utils.bank_client import BankClient
 
-# Bank server API URL and its RSA public key
+# Bank server API URL; the client caches the bank public key and ATM signing keys
 BANK_URL = "http://127.0.0.1:1200/api"
-BANK_PUB_KEY = load_public_key("certs/bank_public.pem")
+client = BankClient(BANK_URL, wire_format=os.environ.get("BANK_WIRE_FORMAT", "json"))
 
 def atm_login(atm_id, user_id, password, sig_type):
     """
     Send encrypted and signed login request to the bank.
     """
-    message = f"{atm_id}:{user_id}:{password}".encode()
-    encrypted = encrypt_message(message, BANK_PUB_KEY)
-
-    # Choose signature method: RSA or DSA
-    if sig_type == "rsa":
-        priv_key = load_key(f"certs/{atm_id}_private.pem")
-        signature = sign_message(message, priv_key)
-    else:
-        priv_key = load_dsa_key(f"certs/{atm_id}_dsa_private.pem", is_private=True)
-        signature = sign_dsa(message, priv_key)
-
-    response = requests.post(f"{BANK_URL}/login", json={
-        "atm_id": atm_id,
-        "signature_type": sig_type,
-        "encrypted": encrypted.hex(),
-        "signature": signature.hex()
-    })
-
-    return response.json()
+    return client.login(atm_id, user_id, password, sig_type)
 
 def send_command(atm_id, user_id, command, sig_type):
     """
     Send encrypted and signed banking action command to the bank.
     """
-    message = command.encode()
-    encrypted = encrypt_message(message, BANK_PUB_KEY)
-
-    # Sign command using the selected method
-    if sig_type == "rsa":
-        priv_key = load_key(f"certs/{atm_id}_private.pem")
-        signature = sign_message(message, priv_key)
-    else:
-        priv_key = load_dsa_key(f"certs/{atm_id}_dsa_private.pem", is_private=True)
-        signature = sign_dsa(message, priv_key)
-
-    response = requests.post(f"{BANK_URL}/action", json={
-        "atm_id": atm_id,
-        "user_id": user_id,
-        "signature_type": sig_type,
-        "command": command,
-        "encrypted": encrypted.hex(),
-        "signature": signature.hex()
-    })
-
-    return response.json()
+    return client.send_command(atm_id, user_id, command, sig_type)
 
 def start_atm(atm_id):
     """
@@ -71,7 +29,7 @@ def start_atm(atm_id):
 
     user_id = input("Customer ID (6-digit): ").strip()
     password = input("Password: ").strip()
-    sig_type = input("Signature method (rsa or dsa): ").strip().lower()
+    sig_type = input("Signature method (rsa, dsa, ed25519 or ecdsa): ").strip().lower()
 
     login_result = atm_login(atm_id, user_id, password, sig_type)
     if login_result.get("status") != "ok":
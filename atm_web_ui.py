@@ -1,24 +1,35 @@
 from flask import Flask, render_template, request, redirect, session, url_for
 import os
 import sys
-import requests
 
 # Add utils to path for crypto imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "utils")))
 
-# Import cryptographic helpers
-from crypto_utils import (
-    load_key, load_public_key, load_dsa_key,
-    encrypt_message, sign_message, sign_dsa
-)
+# Shared bank client (pooled session, cached signing keys)
+from utils.bank_client import BankClient
+from utils.outbox import Outbox
+from utils.session_registry import SESSION_EXPIRED
 
 # Flask app setup
 app = Flask(__name__)
 app.secret_key = "super-secure-session-key"
 
-# Backend bank API and key
+# Backend bank API
 BANK_API = "http://127.0.0.1:1200/api"
-BANK_PUB_KEY = load_public_key("certs/bank_public.pem")
+bank = BankClient(BANK_API, wire_format=os.environ.get("BANK_WIRE_FORMAT", "json"))
+
+# Optional store-and-forward outbox (ATM_OUTBOX=1): deposits are queued in a
+# local SQLite file and delivered to the bank in batches in the background
+OUTBOX_ENABLED = os.environ.get("ATM_OUTBOX") == "1"
+OUTBOX_PATH = os.environ.get("ATM_OUTBOX_PATH", "atm_outbox.db")
+_outbox = None
+
+def get_outbox():
+    # Opened on first use so importing this module creates no files
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(bank, OUTBOX_PATH)
+    return _outbox
 
 # ATM Login Route
 @app.route("/", methods=["GET", "POST"])
@@ -33,28 +44,8 @@ def login():
         session["user_id"] = user_id
         session["signature"] = sig_type
 
-        # Encrypt login message with bank's public key
-        msg = f"{atm_id}:{user_id}:{password}".encode()
-        encrypted = encrypt_message(msg, BANK_PUB_KEY)
-
-        # Sign with ATM's private key (RSA or DSA)
-        if sig_type == "rsa":
-            priv_key = load_key(f"certs/{atm_id}_private.pem")
-            signature = sign_message(msg, priv_key)
-        else:
-            priv_key = load_dsa_key(f"certs/{atm_id}_dsa_private.pem", is_private=True)
-            signature = sign_dsa(msg, priv_key)
-
-        # Send encrypted login to bank server
-        res = requests.post(f"{BANK_API}/login", json={
-            "atm_id": atm_id,
-            "user_id": user_id,
-            "signature_type": sig_type,
-            "encrypted": encrypted.hex(),
-            "signature": signature.hex()
-        })
-
-        data = res.json()
+        # Encrypted (bank public key) and signed (ATM private key) login
+        data = bank.login(atm_id, user_id, password, sig_type)
         if data.get("status") != "ok":
             return render_template("login.html", error=data.get("message"))
 
@@ -71,33 +62,38 @@ def dashboard():
     result = None
     if request.method == "POST":
         command = request.form.get("command")
-        msg = command.encode()
-        encrypted = encrypt_message(msg, BANK_PUB_KEY)
 
-        # Sign the command
-        if session["signature"] == "rsa":
-            priv_key = load_key(f"certs/{session['atm_id']}_private.pem")
-            signature = sign_message(msg, priv_key)
+        if OUTBOX_ENABLED and Outbox.eligible(command):
+            # Queued locally; the page does not wait for the bank
+            entry = get_outbox().enqueue(session["atm_id"], session["user_id"], command, session["signature"])
+            result = f"{command.capitalize()} queued for delivery (#{entry})"
         else:
-            priv_key = load_dsa_key(f"certs/{session['atm_id']}_dsa_private.pem", is_private=True)
-            signature = sign_dsa(msg, priv_key)
-
-        # Send command to bank
-        res = requests.post(f"{BANK_API}/action", json={
-            "atm_id": session["atm_id"],
-            "user_id": session["user_id"],
-            "signature_type": session["signature"],
-            "command": command,
-            "encrypted": encrypted.hex(),
-            "signature": signature.hex()
-        })
-        result = res.json().get("message")
-
-    return render_template("atm_dashboard.html", user_id=session.get("user_id"), result=result)
-
-# Logout clears session
+            # Send encrypted and signed command to bank
+            data = bank.send_command(session["atm_id"], session["user_id"], command, session["signature"])
+            if data.get("message") == SESSION_EXPIRED:
+                # The bank ended the login (idle timeout, forced logout or restart)
+                session.clear()
+                return render_template("login.html", error=data["message"])
+            result = data.get("message")
+
+    outbox = None
+    if OUTBOX_ENABLED:
+        user_id = session["user_id"]
+        outbox = {
+            "pending": get_outbox().pending(user_id),
+            "balance": get_outbox().confirmed_balance(user_id),
+            "recent": get_outbox().recent_results(user_id),
+        }
+    return render_template("atm_dashboard.html", user_id=session.get("user_id"), result=result, outbox=outbox)
+
+# Logout ends the bank-side session and clears the cookie
 @app.route("/logout")
 def logout():
+    if "user_id" in session:
+        try:
+            bank.send_command(session["atm_id"], session["user_id"], "quit", session["signature"])
+        except Exception:
+            pass  # bank unreachable: its session expires on its own
     session.clear()
     return redirect("/")
 @app.route("/signup", methods=["GET", "POST"])
@@ -107,11 +103,7 @@ def signup():
         password = request.form.get("password")
 
         try:
-            response = requests.post(f"{BANK_API}/signup", json={
-                "user_id": user_id,
-                "password": password
-            })
-            data = response.json()
+            data = bank.signup(user_id, password)
             if data.get("status") == "ok":
                 return redirect("/")
             return render_template("signup.html", error=data.get("message"))
@@ -1,158 +1,593 @@
-from flask import Flask, request, jsonify
-from utils.crypto_utils import (
-    load_private_key, load_public_key,
-    rsa_decrypt, rsa_verify, dsa_verify
+from flask import Flask, request, jsonify, g, Response
+from utils.crypto_utils import KeyRegistry, SIG_TYPES
+from utils.account_store import AccountStore
+from utils.transactions import TransactionManager
+from utils.history_store import HistoryStore
+from utils.session_crypto import SessionChannel, new_session_id, open_blob
+from utils.crypto_executor import CryptoExecutor, CryptoOverloaded
+from utils.replay_cache import ReplayCache, bind_freshness
+from utils.admission import AdmissionController
+from utils.session_registry import SessionRegistry, SESSION_EXPIRED
+from utils.velocity import VelocityCheck
+from utils.sharding import ShardRouter, open_shard, parse_shards
+from utils.state_server import (
+    StateClient, RemoteAccountStore, RemoteTransactionManager, RemoteReplayCache, RemoteSessionRegistry,
+    RemoteVelocityCheck, state_authkey
 )
+from utils import wire
+from utils.metrics import Registry, SamplingProfiler
+import time
 import os, json
-from base64 import b64decode
 
 app = Flask(__name__)
 DATA_PATH = "user_db.json"
 
 # Load keys
-BANK_PRIV_KEY = load_private_key("certs/bank_private.pem")
+ATM_KEYS = KeyRegistry("certs")
 
-# Load user database
-def load_users():
-    if not os.path.exists(DATA_PATH):
-        return {}
-    with open(DATA_PATH, "r") as f:
-        return json.load(f)
+# Decrypts and signature verifies run on a bounded crypto pool, not the request thread
+crypto = CryptoExecutor(
+    "certs/bank_private.pem",
+    workers=int(os.environ.get("BANK_CRYPTO_WORKERS", 0)) or None,
+    mode=os.environ.get("BANK_CRYPTO_MODE", "thread"),
+    max_queue=int(os.environ.get("BANK_CRYPTO_QUEUE", 256)),
+)
+
+# Rate limits and in-flight cap checked before any crypto work (see utils/admission.py);
+# 0 turns a limit off
+ADMISSION = AdmissionController(
+    atm_rate=float(os.environ.get("BANK_ATM_RATE", 100)),
+    atm_burst=int(os.environ.get("BANK_ATM_BURST", 200)),
+    global_rate=float(os.environ.get("BANK_GLOBAL_RATE", 2000)),
+    global_burst=int(os.environ.get("BANK_GLOBAL_BURST", 4000)),
+    max_in_flight=int(os.environ.get("BANK_MAX_IN_FLIGHT", 64)),
+)
+
+# Largest request body accepted at all (a full batch fits); bigger ones get 413 unread
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("BANK_MAX_BODY", 8 * 1024 * 1024))
+
+# Multi-process mode: with BANK_STATE_ADDRESS set, this process is one of several
+# workers and accounts, history, the replay cache and login sessions live in a single-writer
+# state process (utils/state_server.py; bank_cluster.py starts both), reached
+# with the shared secret in BANK_STATE_AUTHKEY
+STATE_ADDRESS = os.environ.get("BANK_STATE_ADDRESS")
+
+# Sharded mode: BANK_SHARDS="s1=127.0.0.1:1301,s2=shards/s2" spreads accounts over
+# state processes or local directories by consistent hashing (utils/sharding.py).
+# The shard list and any migration in progress are kept in BANK_SHARD_STATE,
+# which takes over from BANK_SHARDS once it exists.
+SHARDS = os.environ.get("BANK_SHARDS")
+SHARD_STATE = os.environ.get("BANK_SHARD_STATE", "shard_state.json")
+
+# Login sessions: handle -> ATM, account and optional AES channel, with idle
+# TTL and LRU eviction (see utils/session_registry.py)
+SESSION_TTL = float(os.environ.get("BANK_SESSION_TTL", 900))
+MAX_SESSIONS = int(os.environ.get("BANK_MAX_SESSIONS", 500_000))
+
+# Velocity rules screening withdrawals over sliding windows per account and
+# per ATM (see utils/velocity.py); off unless BANK_VELOCITY_RULES is set, as
+# in bank_server (utils.velocity.DEFAULT_RULES is a starting point)
+VELOCITY_RULES = os.environ.get("BANK_VELOCITY_RULES", "")
+VELOCITY_WINDOW = float(os.environ.get("BANK_VELOCITY_WINDOW", 600))
+
+# Batched commands run under the login session named on each item; an item
+# without one may only deposit, unless its ATM is a back-office terminal
+# listed in BANK_BACKOFFICE_ATMS="ops1,ops2"
+BACKOFFICE_ATMS = frozenset(a.strip() for a in os.environ.get("BANK_BACKOFFICE_ATMS", "").split(",") if a.strip())
+UNATTENDED_COMMANDS = ("deposit",)
+
+if SHARDS:
+    VELOCITY = VelocityCheck.from_spec(VELOCITY_RULES, VELOCITY_WINDOW)
+    router = ShardRouter.restore(SHARD_STATE, parse_shards(SHARDS),
+                                 lambda name, spec: open_shard(name, spec, VELOCITY))
+    store = txn = router
+    REPLAY = ReplayCache(max_skew=int(os.environ.get("BANK_MAX_CLOCK_SKEW", 120)))
+    SESSIONS = SessionRegistry(SESSION_TTL, MAX_SESSIONS)
+elif STATE_ADDRESS:
+    state = StateClient(STATE_ADDRESS, state_authkey())
+    store = RemoteAccountStore(state)
+    txn = RemoteTransactionManager(state)
+    REPLAY = RemoteReplayCache(state)
+    SESSIONS = RemoteSessionRegistry(state)
+    VELOCITY = RemoteVelocityCheck(state) if VELOCITY_RULES.strip() else None
+else:
+    # User database: in-memory accounts + append-only journal (see utils/account_store.py);
+    # per-account activity lives in segmented history files
+    history = HistoryStore("history")
+    store = AccountStore(DATA_PATH, history=history)
+    VELOCITY = VelocityCheck.from_spec(VELOCITY_RULES, VELOCITY_WINDOW)
+    txn = TransactionManager(store, history, velocity=VELOCITY)
+
+    # Nonces of signed requests, checked before any RSA work (see utils/replay_cache.py)
+    REPLAY = ReplayCache(max_skew=int(os.environ.get("BANK_MAX_CLOCK_SKEW", 120)))
+    SESSIONS = SessionRegistry(SESSION_TTL, MAX_SESSIONS)
+
+
+# ------------------- METRICS ----------------------------
+# Per-stage latency histograms, exposed in Prometheus text format on /metrics.
+# Per-ATM labels can be turned off for very large fleets (BANK_METRICS_PER_ATM=0).
+METRICS = Registry()
+PER_ATM_METRICS = os.environ.get("BANK_METRICS_PER_ATM", "1") == "1"
+REQUEST_SECONDS = METRICS.histogram(
+    "bank_request_seconds", "End-to-end request latency", ("endpoint", "code"))
+STAGE_SECONDS = METRICS.histogram(
+    "bank_stage_seconds", "Latency of each request stage", ("stage", "endpoint", "sig_type", "atm"))
+OUTCOMES = METRICS.counter(
+    "bank_request_failures_total", "Requests rejected, by reason", ("endpoint", "reason"))
+METRICS.gauge("bank_crypto_queue_depth", "Crypto jobs queued or running", (),
+              lambda: {(): crypto.stats()["queue_depth"]})
+METRICS.gauge("bank_crypto_avg_service_ms", "Average crypto job service time", (),
+              lambda: {(): crypto.stats()["avg_service_ms"]})
+METRICS.gauge("bank_admission_in_flight", "Requests admitted to the crypto path", (),
+              lambda: {(): ADMISSION.stats()["in_flight"]})
+METRICS.gauge("bank_replay_cache_fill", "Fill ratio of the current nonce filter", (),
+              lambda: {(): REPLAY.stats()["current_fill"]})
+METRICS.gauge("bank_sessions", "Open login sessions", (), lambda: {(): SESSIONS.stats()["sessions"]})
+
+# Optional cProfile hook: BANK_PROFILE_SAMPLE=0.001 profiles 0.1% of requests;
+# BANK_PROFILE_ALLOW=1 lets a request force it with the X-Profile: 1 header.
+PROFILER = SamplingProfiler(
+    sample_rate=float(os.environ.get("BANK_PROFILE_SAMPLE", 0)),
+    allow_force=os.environ.get("BANK_PROFILE_ALLOW") == "1",
+)
+
+def stage(name):
+    # Time one stage of the current request, labelled from what the handler knows so far
+    return STAGE_SECONDS.time(name, request.endpoint, g.get("sig_type", ""),
+                              g.get("atm_id", "") if PER_ATM_METRICS else "")
+
+def lookup_atm(atm_id, sig_type):
+    # The ATM's public key, or None. Metric labels take the request's atm_id
+    # and sig_type only once they name a registered key, so unauthenticated
+    # requests cannot add label values (and series) to the registry.
+    with stage("key_lookup"):
+        atm_pub = ATM_KEYS.get(atm_id, sig_type) if sig_type in SIG_TYPES else None
+    g.atm_id, g.sig_type = (atm_id, sig_type) if atm_pub is not None else ("unknown", "unknown")
+    return atm_pub
+
+def fail(reason, message):
+    OUTCOMES.inc(request.endpoint, reason)
+    return jsonify({"status": "fail", "message": message})
+
+REPLAY_MESSAGES = {"stale": "Stale or missing timestamp", "replay": "Replayed request"}
+
+def check_replay(data):
+    # Cheap freshness check on the cleartext nonce/timestamp, before decrypting;
+    # the signature check later binds them to the message. Records nothing.
+    with stage("replay_check"):
+        reason = REPLAY.check(data["atm_id"], data.get("nonce"), data.get("timestamp"), record=False)
+    return fail(reason, REPLAY_MESSAGES[reason]) if reason else None
+
+def record_nonce(data):
+    # Once the signature has verified: remember the nonce, unless a request
+    # carrying it got there first.
+    with stage("replay_record"):
+        reason = REPLAY.check(data["atm_id"], data["nonce"], data["timestamp"])
+    return fail(reason, REPLAY_MESSAGES[reason]) if reason else None
+
+# Sizes a well-formed request stays within (RSA-4096 ciphertext, largest signature)
+MAX_FIELD_BYTES = {"encrypted": 512, "encrypted_key": 512, "signature": 1024, "command": 256}
+SHED_MESSAGES = {"atm_rate": ("Rate limit exceeded, retry later", 429),
+                 "global_rate": ("Bank busy, retry later", 503),
+                 "in_flight": ("Bank busy, retry later", 503)}
+
+def admit(data, fields):
+    # Runs once the ATM's key for the signature type is known to exist, before
+    # the replay check and any RSA work: field sizes, then the ATM's and the
+    # bank's rate limits and an in-flight slot.
+    for field in fields:
+        if not isinstance(data.get(field), (bytes, str)) or len(data[field]) > MAX_FIELD_BYTES[field]:
+            return fail("malformed", f"Malformed {field}")
+    with stage("admission"):
+        reason, retry_after = ADMISSION.admit(data["atm_id"])
+    if reason:
+        OUTCOMES.inc(request.endpoint, reason)
+        message, code = SHED_MESSAGES[reason]
+        response = jsonify({"status": "fail", "message": message, "retry_after_ms": int(retry_after * 1000)})
+        response.headers["Retry-After"] = str(int(retry_after) + 1)
+        return response, code
+    g.admitted = True
+    return None
+
+@app.teardown_request
+def release_admission(exc):
+    if g.pop("admitted", False):
+        ADMISSION.release()
+
+@app.before_request
+def start_request():
+    g.start = time.perf_counter()
+    if PROFILER.should_profile(request.headers.get("X-Profile") == "1"):
+        g.profiler = PROFILER.start()
+
+@app.after_request
+def finish_request(response):
+    REQUEST_SECONDS.observe(time.perf_counter() - g.start, request.endpoint, response.status_code)
+    if "profiler" in g:
+        response.headers["X-Profile-Path"] = PROFILER.stop(g.pop("profiler"), request.endpoint)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+# Request bodies arrive as JSON (hex-encoded bytes) or in the binary wire format
+BINARY_FIELDS = ("encrypted", "signature", "encrypted_key")
+# Account fields end up as journal and snapshot keys, so they must be strings
+TEXT_FIELDS = ("user_id", "password")
+
+def read_payload():
+    if request.mimetype == wire.CONTENT_TYPE:
+        data = wire.decode(request.get_data())
+    else:
+        data = request.json
+        for field in BINARY_FIELDS:
+            if field in data:
+                data[field] = bytes.fromhex(data[field])
+    for field in TEXT_FIELDS:
+        if field in data and not isinstance(data[field], str):
+            raise wire.WireError(f"{field} must be a string")
+    return data
+
+@app.after_request
+def negotiate_response(response):
+    # Answer binary requests in binary when the client accepts it
+    # (batch results are a list, which the wire format cannot carry)
+    if (request.mimetype == wire.CONTENT_TYPE and wire.CONTENT_TYPE in request.headers.get("Accept", "")
+            and response.is_json and request.endpoint != "action_batch"):
+        response.set_data(wire.encode(response.get_json()))
+        response.mimetype = wire.CONTENT_TYPE
+    return response
+
+@app.errorhandler(wire.WireError)
+def bad_wire_body(e):
+    return jsonify({"status": "fail", "message": "Malformed request body"}), 400
+
+# Crypto pool full: shed the request instead of queueing without bound
+@app.errorhandler(CryptoOverloaded)
+def crypto_overloaded(e):
+    return jsonify({"status": "fail", "message": "Bank busy, retry later"}), 503
+
+@app.route("/api/stats/crypto", methods=["GET"])
+def crypto_stats():
+    return jsonify(crypto.stats())
+
+@app.route("/api/stats/admission", methods=["GET"])
+def admission_stats():
+    return jsonify(ADMISSION.stats())
+
+# Administration endpoints, authorized by BANK_ADMIN_TOKEN
+def admin_authorized():
+    token = os.environ.get("BANK_ADMIN_TOKEN")
+    return bool(token and request.headers.get("X-Admin-Token") == token)
+
+@app.route("/api/admin/shards", methods=["GET", "POST"])
+def admin_shards():
+    if not admin_authorized():
+        return jsonify({"status": "fail", "message": "Forbidden"}), 403
+    if not SHARDS:
+        return jsonify({"status": "fail", "message": "Sharding not enabled"}), 404
+    if request.method == "POST":
+        # {"name": "s3", "spec": "127.0.0.1:1303"}: checked here, migrated in the background
+        data = request.json
+        name, spec = data.get("name"), data.get("spec")
+        if not isinstance(name, str) or not isinstance(spec, str) or not name or not spec:
+            return jsonify({"status": "fail", "message": "Shard name and spec are required"}), 400
+        if name in router.shards:
+            return jsonify({"status": "fail", "message": f"Shard {name} already exists"}), 409
+        try:
+            router.start_add_shard(open_shard(name, spec, VELOCITY))
+        except ValueError as e:
+            return jsonify({"status": "fail", "message": str(e)}), 409
+        return jsonify({"status": "ok", "message": f"Adding shard {name}"}), 202
+    return jsonify(router.status())
+
+@app.route("/api/admin/sessions", methods=["GET", "DELETE"])
+def admin_sessions():
+    # GET: table stats, plus ?atm_id=... for one ATM's session count.
+    # DELETE {"atm_id": ...} or {"session_id": ...}: forced logout.
+    if not admin_authorized():
+        return jsonify({"status": "fail", "message": "Forbidden"}), 403
+    if request.method == "DELETE":
+        data = request.json
+        if "atm_id" in data:
+            ended = SESSIONS.logout_atm(data["atm_id"])
+        else:
+            ended = int(SESSIONS.logout(data["session_id"]))
+        return jsonify({"status": "ok", "message": f"Ended {ended} sessions"})
+    stats = SESSIONS.stats()
+    if request.args.get("atm_id"):
+        stats["atm_sessions"] = SESSIONS.atm_count(request.args["atm_id"])
+    return jsonify(stats)
 
-def save_users(users):
-    with open(DATA_PATH, "w") as f:
-        json.dump(users, f, indent=4)
+@app.route("/api/admin/velocity", methods=["GET"])
+def admin_velocity():
+    # Rule counters and the most recent flagged withdrawals (?limit=N, default 100)
+    if not admin_authorized():
+        return jsonify({"status": "fail", "message": "Forbidden"}), 403
+    if VELOCITY is None:
+        return jsonify({"status": "fail", "message": "Velocity checks not enabled"}), 404
+    stats = VELOCITY.stats()
+    stats["recent_flags"] = VELOCITY.recent_flags(int(request.args.get("limit", 100)))
+    return jsonify(stats)
 
 # ---------------------- SIGNUP --------------------------
 @app.route("/api/signup", methods=["POST"])
 def signup():
-    data = request.json
+    data = read_payload()
     user_id = data.get("user_id")
     password = data.get("password")
-    users = load_users()
+    if not user_id or password is None:
+        return fail("malformed", "User ID and password are required")
 
-    if user_id in users:
-        return jsonify({"status": "fail", "message": "User ID already exists"})
+    with stage("store_write"):
+        created = store.create_user(user_id, password)
+    if not created:
+        return fail("duplicate_user", "User ID already exists")
 
-    users[user_id] = {
-        "password": password,
-        "balance": 0,
-        "activity": []
-    }
-    save_users(users)
     return jsonify({"status": "ok", "message": "User created"})
 
 # ---------------------- LOGIN ---------------------------
 @app.route("/api/login", methods=["POST"])
 def login():
-    data = request.json
+    with stage("parse"):
+        data = read_payload()
     atm_id = data["atm_id"]
-    encrypted = bytes.fromhex(data["encrypted"])
-    signature = bytes.fromhex(data["signature"])
+    encrypted = data["encrypted"]
+    signature = data["signature"]
     sig_type = data["signature_type"]
 
+    atm_pub = lookup_atm(atm_id, sig_type)
+    if atm_pub is None:
+        print(f"[ERROR] No {sig_type} public key registered for ATM {atm_id}")
+        return fail("unknown_atm", "ATM not registered")
+
+    rejected = admit(data, ("encrypted", "signature")) or check_replay(data)
+    if rejected:
+        return rejected
+
     try:
-        decrypted = rsa_decrypt(encrypted, BANK_PRIV_KEY).decode()
-        atm_check, user_id, password = decrypted.split(":")
+        with stage("decrypt"):
+            decrypted = crypto.decrypt(encrypted).decode()
+        # Session-capable ATMs append a hex AES key: atm:user:pass[:session_key]
+        atm_check, user_id, password, *session_key = decrypted.split(":")
+        session_key = bytes.fromhex(session_key[0]) if session_key else None
         print(f"[DEBUG] Decrypted: ATM={atm_check}, user_id={user_id}, pass={password}")
+    except CryptoOverloaded:
+        raise
     except Exception as e:
         print("[ERROR] Decryption failed:", e)
-        return jsonify({"status": "fail", "message": "Decryption error"})
-
-    pubkey_path = f"certs/{atm_id}_{sig_type}_public.pem"
-    if not os.path.exists(pubkey_path):
-        print("[ERROR] Missing ATM public key file:", pubkey_path)
-        return jsonify({"status": "fail", "message": "ATM not registered"})
+        return fail("decrypt", "Decryption error")
 
-    atm_pub = load_public_key(pubkey_path)
-
-    # Signature check
-    if sig_type == "rsa":
-        verified = rsa_verify(decrypted.encode(), signature, atm_pub)
-    else:
-        verified = dsa_verify(decrypted.encode(), signature, atm_pub)
+    # Signature check (covers the nonce and timestamp)
+    with stage("verify"):
+        signed = bind_freshness(decrypted.encode(), data["nonce"], data["timestamp"])
+        verified = crypto.verify(sig_type, signed, signature, atm_pub)
 
     if not verified:
         print("[ERROR] Signature verification failed")
-        return jsonify({"status": "fail", "message": "Signature verification failed"})
+        return fail("signature", "Signature verification failed")
+    rejected = record_nonce(data)
+    if rejected:
+        return rejected
 
     # Validate user
-    users = load_users()
     print(f"[DEBUG] Checking user DB for {user_id}")
-    if user_id not in users:
+    with stage("store_read"):
+        known, password_ok = store.exists(user_id), store.check_password(user_id, password)
+    if not known:
         print("[ERROR] User not found")
-        return jsonify({"status": "fail", "message": "Invalid credentials"})
-    if users[user_id]["password"] != password:
+        return fail("credentials", "Invalid credentials")
+    if not password_ok:
         print("[ERROR] Password mismatch")
-        return jsonify({"status": "fail", "message": "Invalid credentials"})
+        return fail("credentials", "Invalid credentials")
 
-    return jsonify({"status": "ok", "message": "Login successful"})
+    # Every login gets a session handle that later actions must present.
+    # If the ATM sent a session key (RSA-wrapped and ATM-signed) the session
+    # also gets an AEAD channel; channels live in one worker's memory, so a
+    # multi-process bank does not offer them and ATMs stay on signed commands.
+    session_id = new_session_id()
+    channel = None
+    if session_key is not None and not STATE_ADDRESS:
+        channel = SessionChannel(session_id, session_key, atm_id, user_id)
+    with stage("session_create"):
+        SESSIONS.create(session_id, atm_id, user_id, channel)
+    return jsonify({"status": "ok", "message": "Login successful", "session_id": session_id,
+                    "channel": channel is not None})
 
 
 # --------------------- ACTION ---------------------------
 @app.route("/api/action", methods=["POST"])
 def action():
-    data = request.json
+    with stage("parse"):
+        data = read_payload()
     atm_id = data["atm_id"]
-    user_id = data["user_id"]
     sig_type = data["signature_type"]
     command = data["command"]
-    encrypted = bytes.fromhex(data["encrypted"])
-    signature = bytes.fromhex(data["signature"])
+    encrypted = data["encrypted"]
+    signature = data["signature"]
+
+    # The account comes from the login session, not from the request
+    with stage("session_lookup"):
+        session = SESSIONS.get(str(data.get("session_id", "")), atm_id)
+    if session is None:
+        return fail("no_session", SESSION_EXPIRED)
+    user_id = session.user_id
+    if data.get("user_id", user_id) != user_id:
+        return fail("tampered", "Session belongs to another account")
+
+    atm_pub = lookup_atm(atm_id, sig_type)
+    if atm_pub is None:
+        return fail("unknown_atm", "ATM not registered")
+
+    rejected = admit(data, ("encrypted", "signature", "command")) or check_replay(data)
+    if rejected:
+        return rejected
 
     try:
-        decrypted = rsa_decrypt(encrypted, BANK_PRIV_KEY).decode()
+        with stage("decrypt"):
+            decrypted = crypto.decrypt(encrypted).decode()
+    except CryptoOverloaded:
+        raise
     except Exception:
-        return jsonify({"status": "fail", "message": "Decryption failed"})
+        return fail("decrypt", "Decryption failed")
 
     # Verify the command matches decrypted text
     if decrypted != command:
-        return jsonify({"status": "fail", "message": "Tampered command"})
+        return fail("tampered", "Tampered command")
 
-    atm_pub = load_public_key(f"certs/{atm_id}_{sig_type}_public.pem")
+    with stage("verify"):
+        # The signature also covers the session, so it cannot be replayed into another one
+        signed = bind_freshness(decrypted.encode(), data["nonce"], data["timestamp"], session.session_id)
+        verified = crypto.verify(sig_type, signed, signature, atm_pub)
 
-    if sig_type == "rsa":
-        verified = rsa_verify(decrypted.encode(), signature, atm_pub)
-    else:
-        verified = dsa_verify(decrypted.encode(), signature, atm_pub)
+    if not verified:
+        return fail("signature", "Signature invalid")
+    rejected = record_nonce(data)
+    if rejected:
+        return rejected
+
+    if not store.exists(user_id):
+        return fail("unknown_user", "User not found")
+
+    # --- Perform command (serialized per account) ---
+    with stage("execute"):
+        response = txn.execute(user_id, command, atm_id)
+    if command == "quit":
+        SESSIONS.logout(session.session_id)
+
+    return jsonify({"status": "ok", "message": response})
+
+# ------------------- BATCH ACTION -----------------------
+# Up to MAX_BATCH ordered commands from one ATM, signed once as a whole. The
+# signed body is JSON {"atm_id": ..., "commands": [{"user_id", "command"}, ...]},
+# sealed with a one-time AES-GCM key that travels RSA-encrypted, so the whole
+# batch costs one RSA decrypt and one signature verify. Each command may carry
+# the session_id of its account's login (see authorize_batch).
+MAX_BATCH = 10000
+
+def authorize_batch(atm_id, commands):
+    """
+    Return one denial message per (user_id, command, session_id), None where allowed.
+
+    As in /api/action, the session must belong to this ATM and account; items
+    without one are limited to UNATTENDED_COMMANDS unless atm_id is back-office.
+    """
+    sessions = {}
+    denials = []
+    for user_id, command, session_id in commands:
+        if atm_id in BACKOFFICE_ATMS or command in UNATTENDED_COMMANDS:
+            denials.append(None)
+            continue
+        if session_id not in sessions:
+            sessions[session_id] = SESSIONS.get(session_id, atm_id) if session_id else None
+        session = sessions[session_id]
+        denials.append(None if session is not None and session.user_id == user_id else SESSION_EXPIRED)
+    return denials
+
+
+@app.route("/api/actions/batch", methods=["POST"])
+def action_batch():
+    with stage("parse"):
+        data = read_payload()
+    atm_id = data["atm_id"]
+    sig_type = data["signature_type"]
+    signature = data["signature"]
+
+    atm_pub = lookup_atm(atm_id, sig_type)
+    if atm_pub is None:
+        return fail("unknown_atm", "ATM not registered")
+
+    rejected = admit(data, ("encrypted_key", "signature")) or check_replay(data)
+    if rejected:
+        return rejected
+
+    try:
+        with stage("decrypt"):
+            batch_key = crypto.decrypt(data["encrypted_key"])
+            body = open_blob(batch_key, data["encrypted"], atm_id.encode())
+    except CryptoOverloaded:
+        raise
+    except Exception:
+        return fail("decrypt", "Decryption failed")
+    if body is None:
+        return fail("decrypt", "Decryption failed")
 
+    with stage("verify"):
+        signed = bind_freshness(body, data["nonce"], data["timestamp"])
+        verified = crypto.verify(sig_type, signed, signature, atm_pub)
     if not verified:
-        return jsonify({"status": "fail", "message": "Signature invalid"})
-
-    users = load_users()
-    if user_id not in users:
-        return jsonify({"status": "fail", "message": "User not found"})
-
-    # --- Perform command ---
-    user = users[user_id]
-    response = ""
-    if command == "balance":
-        response = f"Balance: ${user['balance']}"
-    elif command == "deposit":
-        user["balance"] += 100  # Fixed deposit
-        user["activity"].append({"action": "deposit", "amount": 100})
-        response = "Deposited $100"
-    elif command == "withdraw":
-        if user["balance"] >= 50:
-            user["balance"] -= 50
-            user["activity"].append({"action": "withdraw", "amount": 50})
-            response = "Withdrew $50"
-        else:
-            response = "Insufficient balance"
-    elif command == "activity":
-        activity = user.get("activity", [])
-        if not activity:
-            response = "No recent activity"
-        else:
-            response = "\n".join([f"{a['action']}: ${a['amount']}" for a in activity])
-    elif command == "quit":
-        response = "Session ended"
-    else:
-        response = "Unknown command"
+        return fail("signature", "Signature invalid")
+    rejected = record_nonce(data)
+    if rejected:
+        return rejected
+
+    try:
+        batch = json.loads(body)
+        commands = [(c["user_id"], c["command"], c.get("session_id", "")) for c in batch["commands"]]
+        if not all(isinstance(v, str) for item in commands for v in item):
+            raise TypeError("batch fields must be strings")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return fail("malformed", "Malformed batch")
+    if batch.get("atm_id") != atm_id:
+        return fail("tampered", "Tampered batch")
+    if len(commands) > MAX_BATCH:
+        return fail("too_large", f"Batch exceeds {MAX_BATCH} commands")
+
+    with stage("session_lookup"):
+        denials = authorize_batch(atm_id, commands)
+    items = [(user_id, command) for (user_id, command, _), denied in zip(commands, denials) if denied is None]
+
+    # --- Apply in order; accounts locked and persisted together ---
+    # A batch_id lets a client retry after a lost response without re-applying;
+    # the key is journaled, so this holds across restarts for the last few
+    # batches of each ATM (see AccountStore.apply_batch)
+    batch_key = (atm_id, batch["batch_id"]) if batch.get("batch_id") else None
+    with stage("execute"):
+        results = iter(txn.execute_batch(items, batch_key, atm_id))
+    return jsonify({"status": "ok", "results": [
+        {"status": "ok" if ok else "fail", "message": message}
+        for ok, message in ((False, denied) if denied else next(results) for denied in denials)
+    ]})
+
+# ----------------- SESSION ACTION -----------------------
+@app.route("/api/session/action", methods=["POST"])
+def session_action():
+    with stage("parse"):
+        data = read_payload()
+    session_id, encrypted = data.get("session_id"), data.get("encrypted")
+    try:
+        counter = int(data.get("counter"))
+    except (TypeError, ValueError):
+        counter = -1
+    # The counter becomes a 64-bit GCM nonce field
+    if not isinstance(session_id, str) or not 0 <= counter < 1 << 64 or not isinstance(encrypted, bytes):
+        return fail("malformed", "Malformed session message")
+    session = SESSIONS.get(session_id)
+    channel = session.channel if session is not None else None
+    if channel is None:
+        return fail("unknown_session", "Unknown session")
+    g.atm_id, g.sig_type = channel.atm_id, "session"
+
+    # AES-GCM open: authenticates the ATM and rejects replays, no RSA needed
+    with stage("session_open"):
+        plaintext = channel.open(counter, encrypted)
+    if plaintext is None:
+        return fail("replay_or_forgery", "Invalid or replayed message")
+
+    try:
+        command = plaintext.decode()
+    except UnicodeDecodeError:
+        return fail("malformed", "Malformed session message")
+    if not store.exists(channel.user_id):
+        return fail("unknown_user", "User not found")
 
-    save_users(users)
+    with stage("execute"):
+        response = txn.execute(channel.user_id, command, channel.atm_id)
+    if command == "quit":
+        SESSIONS.logout(channel.session_id)
     return jsonify({"status": "ok", "message": response})
 
 # ------------------- MAIN ----------------------------
 if __name__ == "__main__":
-    app.run(port=1200, debug=True)
+    app.run(port=1200, debug=True, threaded=True)
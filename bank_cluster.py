@@ -0,0 +1,109 @@
+"""
+Run bank_api.py as several worker processes that share one account state.
+
+Starts the single-writer state process (utils/state_server.py), opens the
+HTTP listening socket once and forks N bank_api workers that all accept on
+it, so the kernel spreads connections across them. Each worker does its own
+request parsing, RSA decrypts and signature checks, which is the CPU-heavy
+part, and sends account operations to the state process. The state process
+and the workers share a random secret generated for this run.
+
+SIGTERM (as well as Ctrl-C) stops the workers and the state process too.
+
+    python bank_cluster.py --workers 4 --port 1200
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_worker(fd, host, port, state_address):
+    # The parent's handler is for the parent; terminate() should just end a worker
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.environ["BANK_STATE_ADDRESS"] = state_address
+    from werkzeug.serving import make_server
+    import bank_api
+    make_server(host, port, bank_api.app, threaded=True, fd=fd).serve_forever()
+
+
+def wait_for_port(host, port, proc, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"state process exited with code {proc.returncode}")
+            time.sleep(0.05)
+    raise RuntimeError("state process did not start listening")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process bank API")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1200)
+    parser.add_argument("--state-port", type=int, default=1201)
+    parser.add_argument("--data", default="user_db.json")
+    parser.add_argument("--history", default="history")
+    args = parser.parse_args()
+
+    # A fresh secret for the state connection, inherited by the state process and the workers
+    os.environ["BANK_STATE_AUTHKEY"] = os.urandom(32).hex()
+
+    # Turn SIGTERM into SystemExit so the cleanup below runs for it as well
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    state_address = f"127.0.0.1:{args.state_port}"
+    state, workers = None, []
+    try:
+        state = subprocess.Popen([sys.executable, "-m", "utils.state_server", "--address", state_address,
+                                  "--data", args.data, "--history", args.history],
+                                 env=dict(os.environ, PYTHONPATH=REPO_ROOT))
+        serve(args, state, state_address, workers)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        started = [w for w in workers if w.pid is not None]
+        for worker in started:
+            worker.terminate()
+        for worker in started:
+            worker.join()
+        if state is not None:
+            state.terminate()
+            state.wait()
+
+
+def serve(args, state, state_address, workers):
+    # Runs until a worker or the state process exits; main() cleans up
+    wait_for_port("127.0.0.1", args.state_port, state)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    ctx = multiprocessing.get_context("fork")
+    for i in range(args.workers):
+        worker = ctx.Process(target=run_worker, args=(sock.fileno(), args.host, args.port, state_address),
+                             name=f"bank-worker-{i}")
+        workers.append(worker)
+        worker.start()
+    print(f"[BANK CLUSTER] {args.workers} workers on {args.host}:{args.port}, state on {state_address}")
+
+    while all(w.is_alive() for w in workers) and state.poll() is None:
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    main()
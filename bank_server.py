@@ -1,73 +1,193 @@
 import socket
 import threading
+import asyncio
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
 from utils.crypto_utils import (
-    decrypt_message, verify_signature, verify_dsa_signature,
-    load_key, load_dsa_key
+    decrypt_message, verify_with, load_key, KeyRegistry, LazyKeyRegistry, SIG_TYPES
 )
+from utils.framing import (
+    read_frame, write_frame, unpack_fields, FrameError
+)
+from utils.account_table import AccountTable
+from utils.history_store import HistoryStore
+from utils.log_writer import LogWriter
+from utils.transactions import parse_page_options, format_page
+from utils.velocity import VelocityCheck
 import os
 from datetime import datetime
 
 HOST = '127.0.0.1'
 PORT = 1200
 
-# In-memory user database
-user_db = {
+# In-memory user database (compact table: see utils/account_table.py)
+user_db = AccountTable.from_dict({
     "124356": {
         "password": "pass123",
-        "balance": 1000,
-        "history": []
+        "balance": 1000
     },
     "654321": {
         "password": "abc321",
-        "balance": 2500,
-        "history": []
+        "balance": 2500
     }
-}
+})
 
-# Load bank's private RSA key
-bank_private_key = load_key("certs/bank_private.pem")
+# Keys and logs are set up by init_bank() when the server starts, so importing
+# this module touches no files:
+#   bank_private_key  bank's private RSA key
+#   atm_keys          ATM public keys (RSA, DSA, Ed25519, ECDSA) from certs/,
+#                     hot-reloaded; parsed on first use by default
+#   history           per-user history, segmented under logs/history
+#   history_thread    single thread running history appends and reads in async
+#                     mode, so the event loop never waits on those files; one
+#                     thread keeps them in order, so a session's "history"
+#                     sees its own earlier commands. None in threaded mode
+#   transaction_log   queued, group-committed, rotated log (utils/log_writer.py)
+#   velocity          velocity rules screening withdrawals (utils/velocity.py), or
+#                     None; off unless rules are given, since the bank_api
+#                     defaults assume its fixed $50 withdrawal
+bank_private_key = None
+atm_keys = None
+history = None
+history_thread = None
+transaction_log = None
+velocity = None
 
-# Load ATM public keys (RSA and DSA)
-atm_keys = {
-    "atm1": {
-        "rsa": load_key("certs/atm1_public.pem"),
-        "dsa": load_dsa_key("certs/atm1_dsa_public.pem", is_private=False)
-    },
-    "atm2": {
-        "rsa": load_key("certs/atm2_public.pem"),
-        "dsa": load_dsa_key("certs/atm2_dsa_public.pem", is_private=False)
-    }
-}
+def init_bank(certs_dir="certs", logs_dir="logs", users_path=None, eager_keys=False, key_cache=4096,
+              velocity_rules="", velocity_window=600.0, background_history=False):
+    """
+    Load the bank key, index the ATM keys and open the logs; called once by main().
+    """
+    global bank_private_key, atm_keys, history, history_thread, transaction_log, user_db, velocity
+    bank_private_key = load_key(os.path.join(certs_dir, "bank_private.pem"))
+    if eager_keys:
+        atm_keys = KeyRegistry(certs_dir)
+    else:
+        atm_keys = LazyKeyRegistry(certs_dir, max_cached=key_cache)
+
+    if users_path:
+        with open(users_path, "r", encoding="utf-8") as f:
+            users = json.load(f)
+        # Also accepts an AccountStore snapshot ({"seq": ..., "users": {...}})
+        user_db = AccountTable.from_dict(users["users"] if "seq" in users else users)
 
-# Create log directory
-os.makedirs("logs", exist_ok=True)
+    os.makedirs(logs_dir, exist_ok=True)
+    history = HistoryStore(os.path.join(logs_dir, "history"))
+    if background_history:
+        history_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+    transaction_log = LogWriter(os.path.join(logs_dir, "transactions.log"), echo=True)
+    velocity = VelocityCheck.from_spec(velocity_rules, velocity_window)
 
 def log_transaction(user_id, atm_id, action):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = f"[{timestamp}] {atm_id} {user_id}: {action}"
-    print(entry)
+    now = datetime.now()
+    entry = f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] {atm_id} {user_id}: {action}"
 
-    user_db[user_id]["history"].append(entry)
+    if history_thread is not None:
+        history_thread.submit(history.append, user_id, {"entry": entry}, now.timestamp())
+    else:
+        history.append(user_id, {"entry": entry}, now.timestamp())
+    transaction_log.write(entry, now.timestamp())
 
-    with open("logs/transactions.log", "a") as f:
-        f.write(entry + "\n")
+def authenticate(enc_credentials):
+    """
+    Decrypt the login message; returns (atm_id, user_id, error).
+    """
+    decrypted = decrypt_message(enc_credentials, bank_private_key).decode()
 
-def handle_client(conn, addr):
-    print(f"Connected: {addr}")
     try:
-        # Step 1: Receive encrypted login
-        enc_credentials = conn.recv(4096)
-        decrypted = decrypt_message(enc_credentials, bank_private_key).decode()
+        atm_id, user_id, password = decrypted.split(":")
+    except ValueError:
+        return None, None, "Invalid login format"
+
+    if not user_db.check_password(user_id, password):
+        return None, None, "Authentication failed"
+
+    return atm_id, user_id, None
+
+def parse_signature_type(raw):
+    # rsa, dsa, ed25519 or ecdsa; anything unrecognised falls back to RSA
+    sig_type = raw.decode(errors="replace").strip().lower()
+    return sig_type if sig_type in SIG_TYPES else "rsa"
+
+def open_command(atm_id, enc_command, signature, signature_type):
+    """
+    Decrypt a command and verify the ATM's signature; returns (command, error).
+    """
+    command = decrypt_message(enc_command, bank_private_key).decode()
+
+    pub_key = atm_keys.get(atm_id, signature_type)
+    if pub_key is None:
+        return None, "ATM not registered"
+
+    if not verify_with(signature_type, command.encode(), signature, pub_key):
+        return None, "ATM signature verification failed"
 
+    return command, None
+
+def parse_amount(command):
+    # "withdraw 120" -> 120; None unless the amount is a positive whole number
+    try:
+        amount = int(command.split()[1])
+    except (IndexError, ValueError):
+        return None
+    return amount if amount > 0 else None
+
+def process_command(user_id, atm_id, command):
+    """
+    Apply a verified command; returns (response, session_over).
+    """
+    if command == "balance":
+        response = f"Balance: ${user_db.balance(user_id)}"
+        log_transaction(user_id, atm_id, "Checked balance")
+    elif command.startswith("deposit"):
+        amount = parse_amount(command)
+        if amount is None:
+            response = "Invalid deposit amount"
+        else:
+            user_db.adjust(user_id, amount)
+            response = f"Deposited ${amount}"
+            log_transaction(user_id, atm_id, f"Deposited ${amount}")
+    elif command.startswith("withdraw"):
+        # Only positive amounts reach the balance check and the velocity screen
+        amount = parse_amount(command)
+        if amount is None:
+            response = "Invalid withdraw amount"
+        elif user_db.balance(user_id) < amount:
+            response = "Insufficient funds"
+        elif velocity is not None and velocity.screen(user_id, atm_id, amount)[0] == "reject":
+            response = "Withdrawal declined: unusual activity"
+            log_transaction(user_id, atm_id, f"Withdrawal of ${amount} declined")
+        else:
+            user_db.adjust(user_id, -amount)
+            response = f"Withdrew ${amount}"
+            log_transaction(user_id, atm_id, f"Withdrew ${amount}")
+    elif command.startswith("history"):
+        # history [limit=N] [after=CURSOR]: newest first, one page at a time
         try:
-            atm_id, user_id, password = decrypted.split(":")
+            limit, after = parse_page_options(command.split()[1:])
+            entries, next_cursor = history.page(user_id, limit, after)
+            lines = format_page([e["entry"] for e in entries], next_cursor)
+            response = f"Transaction History:\n{lines or 'No transactions yet'}"
         except ValueError:
-            conn.send(b"Invalid login format")
-            return
+            response = "Invalid history options"
+    elif command == "quit":
+        log_transaction(user_id, atm_id, "Session ended")
+        return "Session ended.", True
+    else:
+        response = "Unknown command"
+
+    return response, False
 
-        # Step 2: Authenticate user
-        if user_id not in user_db or user_db[user_id]["password"] != password:
-            conn.send(b"Authentication failed")
+# ---------------------- THREADED MODE -------------------
+def handle_client(conn, addr):
+    print(f"Connected: {addr}")
+    try:
+        # Step 1-2: Receive encrypted login and authenticate user
+        enc_credentials = conn.recv(4096)
+        atm_id, user_id, error = authenticate(enc_credentials)
+        if error:
+            conn.send(error.encode())
             return
 
         conn.send(b"Authenticated")
@@ -83,58 +203,18 @@ def handle_client(conn, addr):
             if not signature:
                 break
 
-            # Step 5: Decrypt command
-            command = decrypt_message(enc_command, bank_private_key).decode()
-
-            # Step 6: Verify ATM signature
-            signature_type = "dsa" if "dsa" in conn.recv(1024).decode().lower() else "rsa"
-            pub_key = atm_keys[atm_id][signature_type]
-
-            verified = (
-                verify_dsa_signature(command.encode(), signature, pub_key)
-                if signature_type == "dsa"
-                else verify_signature(command.encode(), signature, pub_key)
-            )
-
-            if not verified:
-                conn.send(b"ATM signature verification failed")
+            # Step 5-6: Decrypt command and verify ATM signature
+            signature_type = parse_signature_type(conn.recv(1024))
+            command, error = open_command(atm_id, enc_command, signature, signature_type)
+            if error:
+                conn.send(error.encode())
                 break
 
             # Step 7: Process command
-            if command == "balance":
-                response = f"Balance: ${user_db[user_id]['balance']}"
-                log_transaction(user_id, atm_id, "Checked balance")
-            elif command.startswith("deposit"):
-                try:
-                    amount = int(command.split()[1])
-                    user_db[user_id]['balance'] += amount
-                    response = f"Deposited ${amount}"
-                    log_transaction(user_id, atm_id, f"Deposited ${amount}")
-                except:
-                    response = "Invalid deposit amount"
-            elif command.startswith("withdraw"):
-                try:
-                    amount = int(command.split()[1])
-                    if user_db[user_id]['balance'] >= amount:
-                        user_db[user_id]['balance'] -= amount
-                        response = f"Withdrew ${amount}"
-                        log_transaction(user_id, atm_id, f"Withdrew ${amount}")
-                    else:
-                        response = "Insufficient funds"
-                except:
-                    response = "Invalid withdraw amount"
-            elif command == "history":
-                history = "\n".join(user_db[user_id]["history"]) or "No transactions yet"
-                response = f"Transaction History:\n{history}"
-            elif command == "quit":
-                response = "Session ended."
-                log_transaction(user_id, atm_id, "Session ended")
-                conn.send(response.encode())
-                break
-            else:
-                response = "Unknown command"
-
+            response, session_over = process_command(user_id, atm_id, command)
             conn.send(response.encode())
+            if session_over:
+                break
 
     except Exception as e:
         print(f"[ERROR] {e}")
@@ -142,12 +222,139 @@ def handle_client(conn, addr):
         conn.close()
         print(f"Disconnected: {addr}")
 
+def run_threaded_server(host=HOST, port=PORT):
+    # Legacy mode: one thread per connection, unframed recv() calls
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind((host, port))
+        server.listen()
+        print(f"[BANK SERVER] Listening on {host}:{port}...")
+
+        while True:
+            conn, addr = server.accept()
+            threading.Thread(target=handle_client, args=(conn, addr)).start()
+
+# ----------------------- ASYNC MODE ---------------------
+class AsyncBankServer:
+    """
+    asyncio bank server speaking the length-prefixed protocol (utils/framing.py).
+
+    The first frame is the encrypted login; every following frame packs
+    (encrypted command, signature, signature type) and gets exactly one
+    response frame, in order, so ATMs may pipeline commands. RSA work runs
+    in the default executor, and history files are touched only on the
+    history thread, so the event loop keeps serving other sessions.
+    """
+
+    def __init__(self, host=HOST, port=PORT, max_connections=20000, idle_timeout=300.0):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.active = 0
+
+    async def _read(self, reader):
+        return await asyncio.wait_for(read_frame(reader), self.idle_timeout)
+
+    async def handle(self, reader, writer):
+        if self.active >= self.max_connections:
+            write_frame(writer, b"Server busy")
+            writer.close()
+            return
+
+        self.active += 1
+        loop = asyncio.get_running_loop()
+        addr = writer.get_extra_info("peername")
+        try:
+            enc_credentials = await self._read(reader)
+            if enc_credentials is None:
+                return
+            atm_id, user_id, error = await loop.run_in_executor(None, authenticate, enc_credentials)
+            if error:
+                write_frame(writer, error.encode())
+                return
+            write_frame(writer, b"Authenticated")
+            await writer.drain()
+
+            while True:
+                frame = await self._read(reader)
+                if frame is None:
+                    break
+                try:
+                    enc_command, signature, signature_type = unpack_fields(frame)
+                except (FrameError, ValueError):
+                    write_frame(writer, b"Malformed command frame")
+                    break
+
+                signature_type = parse_signature_type(signature_type)
+                command, error = await loop.run_in_executor(
+                    None, open_command, atm_id, enc_command, signature, signature_type
+                )
+                if error:
+                    write_frame(writer, error.encode())
+                    break
+
+                if command.startswith("history") and history_thread is not None:
+                    # Read on the history thread, behind this session's queued appends
+                    response, session_over = await loop.run_in_executor(
+                        history_thread, process_command, user_id, atm_id, command
+                    )
+                else:
+                    response, session_over = process_command(user_id, atm_id, command)
+                write_frame(writer, response.encode())
+                if session_over:
+                    break
+                # Only wait on the socket when the peer is not keeping up.
+                if writer.transport.get_write_buffer_size() > 64 * 1024:
+                    await writer.drain()
+
+        except asyncio.TimeoutError:
+            pass  # idle session
+        except (FrameError, ConnectionError) as e:
+            print(f"[ERROR] {addr}: {e}")
+        except Exception as e:
+            print(f"[ERROR] {e}")
+        finally:
+            self.active -= 1
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port,
+                                            backlog=min(self.max_connections, 4096))
+        print(f"[BANK SERVER] (async) Listening on {self.host}:{self.port}...")
+        async with server:
+            await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw-socket bank server")
+    parser.add_argument("--mode", choices=["threaded", "async"], default="threaded")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-connections", type=int, default=20000)
+    parser.add_argument("--idle-timeout", type=float, default=300.0, help="seconds")
+    parser.add_argument("--certs", default="certs")
+    parser.add_argument("--logs", default="logs")
+    parser.add_argument("--users", help="JSON user table (user_db.json format) instead of the built-in one")
+    parser.add_argument("--eager-keys", action="store_true", help="parse every ATM key at startup")
+    parser.add_argument("--key-cache", type=int, default=4096, help="parsed ATM keys kept in memory")
+    parser.add_argument("--velocity-rules", default="",
+                        help='withdrawal velocity rules, e.g. "account_amount>5000:reject" (see utils/velocity.py); '
+                             'off by default')
+    parser.add_argument("--velocity-window", type=float, default=600.0, help="seconds")
+    args = parser.parse_args()
+
+    init_bank(args.certs, args.logs, args.users, args.eager_keys, args.key_cache,
+              args.velocity_rules, args.velocity_window, background_history=args.mode == "async")
+
+    if args.mode == "async":
+        server = AsyncBankServer(args.host, args.port, args.max_connections, args.idle_timeout)
+        asyncio.run(server.serve())
+    else:
+        run_threaded_server(args.host, args.port)
+
 # Start the concurrent server
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
-    server.bind((HOST, PORT))
-    server.listen()
-    print(f"[BANK SERVER] Listening on {HOST}:{PORT}...")
-
-    while True:
-        conn, addr = server.accept()
-        threading.Thread(target=handle_client, args=(conn, addr)).start()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Memory and speed of the account table at a million accounts.
+
+Builds --accounts accounts in each layout: the nested dicts bank_server and
+AccountStore used to keep ({"password", "balance"} per account, plus an
+"activity" list in legacy records) and the slot-based AccountTable. Reports
+bytes per account (tracemalloc, user IDs and passwords included) and times
+random balance reads and deposits through the same calls the command
+handlers make.
+
+    python benchmarks/account_table.py --accounts 1000000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Add the repository root to the module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.account_table import AccountTable
+
+
+def build_dicts(count, legacy=False):
+    users = {}
+    for i in range(count):
+        user = {"password": f"pw{i:08d}", "balance": 1000 + i}
+        if legacy:
+            user["activity"] = []
+        users[f"{100000 + i}"] = user
+    return users
+
+
+def build_table(count):
+    table = AccountTable()
+    for i in range(count):
+        table.add(f"{100000 + i}", f"pw{i:08d}", 1000 + i)
+    return table
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    users = build(count)
+    elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return users, memory, elapsed
+
+
+def time_dicts(users, ids):
+    start = time.perf_counter()
+    for user_id in ids:
+        users[user_id]["balance"]
+    reads = time.perf_counter() - start
+    start = time.perf_counter()
+    for user_id in ids:
+        users[user_id]["balance"] += 1
+    writes = time.perf_counter() - start
+    return reads, writes
+
+
+def time_table(table, ids):
+    start = time.perf_counter()
+    for user_id in ids:
+        table.balance(user_id)
+    reads = time.perf_counter() - start
+    start = time.perf_counter()
+    for user_id in ids:
+        table.adjust(user_id, 1)
+    writes = time.perf_counter() - start
+    return reads, writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=1000000)
+    parser.add_argument("--ops", type=int, default=1000000, help="random reads and deposits to time")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    ids = [f"{100000 + rng.randrange(args.accounts)}" for _ in range(args.ops)]
+    layouts = [
+        ("dict", lambda n: build_dicts(n), time_dicts),
+        ("dict+activity", lambda n: build_dicts(n, legacy=True), time_dicts),
+        ("AccountTable", build_table, time_table),
+    ]
+
+    print(f"{args.accounts:,} accounts, {args.ops:,} random ops")
+    print(f"{'layout':<14} {'MB':>7} {'B/acct':>7} {'build s':>8} {'reads/s':>11} {'deposits/s':>11}")
+    for name, build, timer in layouts:
+        users, memory, built = measure(build, args.accounts)
+        reads, writes = timer(users, ids)
+        print(f"{name:<14} {memory / 1e6:>7.0f} {memory / args.accounts:>7.0f} {built:>8.2f} "
+              f"{args.ops / reads:>11,.0f} {args.ops / writes:>11,.0f}")
+        del users
+
+
+if __name__ == "__main__":
+    main()
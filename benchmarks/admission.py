@@ -0,0 +1,101 @@
+"""
+Latency of a well-behaved ATM while another ATM floods the bank API.
+
+Starts a throwaway bank_api (same fixture as load_test.py) twice, with
+admission control off and on. Each time, --flood-threads threads send
+fresh signed balance queries from a "rogue" ATM as fast as they can, while
+a "good" ATM sends one every --interval seconds. Reports the good ATM's
+latency percentiles and success rate and how much of the flood was shed.
+
+    python benchmarks/admission.py --flood-threads 16 --duration 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# Add the repository root to the module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from load_test import USERS, build_fixture, free_port, start_bank
+from utils.bank_client import BankClient
+
+USER = next(iter(USERS))
+SETTINGS = {
+    "off": {"BANK_ATM_RATE": "0", "BANK_GLOBAL_RATE": "0", "BANK_MAX_IN_FLIGHT": "0"},
+    "on": {"BANK_ATM_RATE": "20", "BANK_ATM_BURST": "20", "BANK_GLOBAL_RATE": "0", "BANK_MAX_IN_FLIGHT": "16"},
+}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else float("nan")
+
+
+def run(workdir, mode, args):
+    os.environ.update(SETTINGS[mode])
+    port = free_port()
+    bank = start_bank("api", workdir, port)
+    certs = os.path.join(workdir, "certs")
+    stop = threading.Event()
+    flood = Counter()
+    lock = threading.Lock()
+
+    def flooder():
+        client = BankClient(f"http://127.0.0.1:{port}/api", certs_dir=certs, use_sessions=False)
+        client.login("rogue", USER, USERS[USER], args.sig_type)
+        seen = Counter()
+        while not stop.is_set():
+            reply = client.send_command("rogue", USER, "balance", args.sig_type)
+            seen["ok" if reply.get("status") == "ok" else reply.get("message")] += 1
+        with lock:
+            flood.update(seen)
+
+    try:
+        threads = [threading.Thread(target=flooder) for _ in range(args.flood_threads)]
+        for t in threads:
+            t.start()
+        good = BankClient(f"http://127.0.0.1:{port}/api", certs_dir=certs, use_sessions=False)
+        good.login("good", USER, USERS[USER], args.sig_type)
+        latencies, ok = [], 0
+        deadline = time.perf_counter() + args.duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            reply = good.send_command("good", USER, "balance", args.sig_type)
+            latencies.append(time.perf_counter() - start)
+            ok += reply.get("status") == "ok"
+            time.sleep(max(0.0, args.interval - latencies[-1]))
+        stop.set()
+        for t in threads:
+            t.join()
+    finally:
+        bank.terminate()
+        bank.wait()
+
+    total = sum(flood.values())
+    print(f"admission {mode}:")
+    print(f"  good ATM:  {ok}/{len(latencies)} ok, p50 {1000 * percentile(latencies, 50):.1f} ms, "
+          f"p99 {1000 * percentile(latencies, 99):.1f} ms, max {1000 * max(latencies):.1f} ms")
+    print(f"  rogue ATM: {total / args.duration:.0f} req/s sent, {flood['ok']} served, "
+          f"{total - flood['ok']} shed ({dict((k, v) for k, v in flood.items() if k != 'ok')})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--flood-threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between good-ATM requests")
+    parser.add_argument("--sig-type", default="ed25519")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        build_fixture(workdir, ["good", "rogue"])
+        for mode in ("off", "on"):
+            run(workdir, mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Per-command /api/action calls vs. one signed /api/actions/batch request.
+
+Starts a throwaway bank_api (same fixture as load_test.py) and pushes the
+same deposit/withdraw/balance workload both ways, reporting commands/s.
+
+    python benchmarks/batch_actions.py --commands 2000 --batch-size 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add the repository root to the module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from load_test import USERS, build_fixture, free_port, start_bank
+from utils.bank_client import BankClient
+
+
+def workload(count):
+    commands = ("deposit", "withdraw", "balance")
+    users = list(USERS)
+    return [(users[i % len(users)], commands[i % len(commands)]) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--commands", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--sig-type", default="ed25519")
+    args = parser.parse_args()
+
+    items = workload(args.commands)
+    with tempfile.TemporaryDirectory() as workdir:
+        build_fixture(workdir, ["batchatm"])
+        port = free_port()
+        bank = start_bank("api", workdir, port)
+        try:
+            client = BankClient(f"http://127.0.0.1:{port}/api", certs_dir=os.path.join(workdir, "certs"),
+                                use_sessions=False)
+
+            for user_id in USERS:
+                assert client.login("batchatm", user_id, USERS[user_id], args.sig_type)["status"] == "ok"
+            start = time.perf_counter()
+            for user_id, command in items:
+                assert client.send_command("batchatm", user_id, command, args.sig_type)["status"] == "ok"
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(0, len(items), args.batch_size):
+                result = client.send_batch("batchatm", items[i:i + args.batch_size], args.sig_type)
+                assert result["status"] == "ok", result
+            batched = time.perf_counter() - start
+        finally:
+            bank.terminate()
+            bank.wait()
+
+    print(f"{'mode':<10} {'seconds':>8} {'cmds/s':>9}")
+    print(f"{'single':<10} {single:>8.2f} {len(items) / single:>9.0f}")
+    print(f"{'batch':<10} {batched:>8.2f} {len(items) / batched:>9.0f}")
+    print(f"speedup: {single / batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
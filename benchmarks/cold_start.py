@@ -0,0 +1,113 @@
+"""
+Cold-start time of bank_server.py with a large registered ATM fleet.
+
+Builds a certs/ directory with --atms registered ATMs (one RSA and one DSA
+public key each, plus certs/index.json as written by provision_fleet.py),
+then measures for eager and lazy key loading:
+
+  * import: `import bank_server` in a fresh interpreter
+  * listen: process start until the async server accepts connections
+  * first command: login + one signed command from an ATM, which in lazy
+    mode includes parsing that ATM's key
+
+Keys are copies of a few generated keypairs, which is all the registry
+cares about; provisioning 10k real keys is what provision_fleet.py is for.
+
+    python benchmarks/cold_start.py --atms 10000
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the repository root to the module search path
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_ROOT)
+
+from cryptography.hazmat.primitives import serialization
+from load_test import USERS, ServerATM, build_fixture, free_port
+from utils.crypto_utils import KEY_INDEX, private_key_path, public_key_path
+
+
+def register_fleet(certs, template_atm, atms):
+    # Copy the template ATM's keys to `atms` identities and index them.
+    entries = []
+    for sig_type in ("rsa", "dsa"):
+        with open(public_key_path(certs, template_atm, sig_type), "rb") as f:
+            pem = f.read()
+        fingerprint = hashlib.sha256(serialization.load_pem_public_key(pem).public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)).hexdigest()
+        for i in range(atms):
+            atm_id = f"fleet{i}"
+            public_path = public_key_path(certs, atm_id, sig_type)
+            with open(public_path, "wb") as f:
+                f.write(pem)
+            shutil.copyfile(private_key_path(certs, template_atm, sig_type), private_key_path(certs, atm_id, sig_type))
+            entries.append({"atm_id": atm_id, "sig_type": sig_type, "public": os.path.basename(public_path),
+                            "private": os.path.basename(private_key_path(certs, atm_id, sig_type)),
+                            "fingerprint": fingerprint})
+    with open(os.path.join(certs, KEY_INDEX), "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "keys": entries}, f)
+
+
+def time_import(workdir, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import bank_server"], cwd=workdir, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def time_listen(workdir, env, port, extra):
+    cmd = [sys.executable, os.path.join(REPO_ROOT, "bank_server.py"), "--mode", "async", "--port", str(port)] + extra
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc, time.perf_counter() - start
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"bank_server exited with code {proc.returncode}")
+            time.sleep(0.005)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--atms", type=int, default=10000)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, PYTHONUNBUFFERED="1")
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"Registering {args.atms} ATMs...")
+        build_fixture(workdir, ["template"])
+        certs = os.path.join(workdir, "certs")
+        register_fleet(certs, "template", args.atms)
+        import_s = time_import(workdir, env)
+
+        print(f"\n{'mode':<6} {'import ms':>10} {'listen ms':>10} {'first cmd ms':>13} {'RSS MB':>7}")
+        for mode, extra in (("eager", ["--eager-keys"]), ("lazy", [])):
+            port = free_port()
+            proc, listen_s = time_listen(workdir, env, port, extra)
+            try:
+                atm = ServerATM(f"fleet{args.atms // 2}", "dsa", next(iter(USERS)), port, certs, False)
+                start = time.perf_counter()
+                assert atm.run("login") and atm.run("balance")
+                first_s = time.perf_counter() - start
+                try:
+                    with open(f"/proc/{proc.pid}/status") as f:
+                        rss = next((int(l.split()[1]) / 1024 for l in f if l.startswith("VmRSS")), 0.0)
+                except OSError:
+                    rss = 0.0  # no procfs
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(f"{mode:<6} {1000 * import_s:>10.0f} {1000 * listen_s:>10.0f} {1000 * first_s:>13.1f} {rss:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Load generator simulating an ATM fleet against a locally started bank.
+
+Spins up a throwaway bank (bank_api.py or the async bank_server.py) in a
+temporary directory with freshly generated keys, then drives it with N
+simulated ATMs. Each ATM signs and encrypts with the real helpers from
+utils/crypto_utils.py, cycling through RSA, DSA, Ed25519 and ECDSA
+signatures, and issues a configurable mix of login/balance/deposit/
+withdraw/activity traffic.
+Throughput and p50/p95/p99 latency per endpoint are printed and written as
+JSON so runs can be compared across commits.
+
+    python benchmarks/load_test.py --target api --atms 16 --duration 20 \\
+        --mix login=1,balance=5,deposit=2,withdraw=1,activity=1 --output bench.json
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+# Add the repository root to the module search path
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_ROOT)
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, dsa, ec, ed25519
+from utils.crypto_utils import (
+    load_public_key, load_key, encrypt_message, sign_with, private_key_path
+)
+from utils.bank_client import BankClient
+from utils.framing import send_frame, recv_frame, pack_fields
+
+# Users hard-coded in bank_server.py; bank_api gets the same ones seeded
+USERS = {"124356": "pass123", "654321": "abc321"}
+
+
+# ------------------------- FIXTURE ----------------------------
+def write_keypair(certs, name, key):
+    with open(os.path.join(certs, f"{name}_private.pem"), "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    with open(os.path.join(certs, f"{name}_public.pem"), "wb") as f:
+        f.write(key.public_key().public_bytes(serialization.Encoding.PEM,
+                                              serialization.PublicFormat.SubjectPublicKeyInfo))
+
+
+def build_fixture(workdir, atms):
+    certs = os.path.join(workdir, "certs")
+    os.makedirs(certs)
+    write_keypair(certs, "bank", rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    # One set of DSA domain parameters for the whole simulated fleet
+    params = dsa.generate_parameters(key_size=2048)
+    for atm_id in atms:
+        write_keypair(certs, atm_id, rsa.generate_private_key(public_exponent=65537, key_size=2048))
+        write_keypair(certs, f"{atm_id}_dsa", params.generate_private_key())
+        write_keypair(certs, f"{atm_id}_ed25519", ed25519.Ed25519PrivateKey.generate())
+        write_keypair(certs, f"{atm_id}_ecdsa", ec.generate_private_key(ec.SECP256R1()))
+    with open(os.path.join(workdir, "user_db.json"), "w") as f:
+        json.dump({u: {"password": p, "balance": 1000000} for u, p in USERS.items()}, f)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_bank(target, workdir, port):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, PYTHONUNBUFFERED="1")
+    # Simulated ATMs send flat out; keep the per-ATM rate limit and the
+    # withdrawal velocity rules out of the measurement
+    env.setdefault("BANK_ATM_RATE", "0")
+    env.setdefault("BANK_VELOCITY_RULES", "")
+    if target == "api":
+        cmd = [sys.executable, "-c",
+               f"import bank_api; bank_api.app.run(port={port}, threaded=True)"]
+    else:
+        cmd = [sys.executable, os.path.join(REPO_ROOT, "bank_server.py"), "--mode", "async", "--port", str(port),
+               "--velocity-rules", env["BANK_VELOCITY_RULES"]]
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"bank exited with code {proc.returncode}")
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("bank did not start listening")
+
+
+# --------------------------- ATMS -----------------------------
+class ApiATM:
+    """Simulated ATM talking to bank_api over HTTP through BankClient."""
+
+    def __init__(self, atm_id, sig_type, user_id, port, certs, sessions):
+        self.atm_id, self.sig_type, self.user_id = atm_id, sig_type, user_id
+        self.client = BankClient(f"http://127.0.0.1:{port}/api", certs_dir=certs, use_sessions=sessions)
+
+    def run(self, op):
+        if op == "login":
+            result = self.client.login(self.atm_id, self.user_id, USERS[self.user_id], self.sig_type)
+        else:
+            command = "activity limit=20" if op == "activity" else op
+            result = self.client.send_command(self.atm_id, self.user_id, command, self.sig_type)
+        return result.get("status") == "ok"
+
+
+class ServerATM:
+    """Simulated ATM talking to the async bank_server over framed TCP."""
+
+    COMMANDS = {"balance": "balance", "deposit": "deposit 10", "withdraw": "withdraw 5",
+                "activity": "history limit=20"}
+
+    def __init__(self, atm_id, sig_type, user_id, port, certs, sessions):
+        self.atm_id, self.sig_type, self.user_id, self.port = atm_id, sig_type, user_id, port
+        self.bank_pub = load_public_key(os.path.join(certs, "bank_public.pem"))
+        key = load_key(private_key_path(certs, atm_id, sig_type))
+        self.sign = lambda m: sign_with(sig_type, m, key)
+        self.sock = None
+
+    def run(self, op):
+        if op == "login" or self.sock is None:
+            if self.sock:
+                self.sock.close()
+            self.sock = socket.create_connection(("127.0.0.1", self.port))
+            login = f"{self.atm_id}:{self.user_id}:{USERS[self.user_id]}".encode()
+            send_frame(self.sock, encrypt_message(login, self.bank_pub))
+            ok = recv_frame(self.sock) == b"Authenticated"
+            if op == "login":
+                return ok
+        message = self.COMMANDS[op].encode()
+        send_frame(self.sock, pack_fields(encrypt_message(message, self.bank_pub), self.sign(message),
+                                          self.sig_type.encode()))
+        reply = recv_frame(self.sock)
+        return reply is not None and "failed" not in reply.decode()
+
+
+# -------------------------- DRIVER ----------------------------
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def drive(atm, mix, deadline, latencies, errors, lock, seed):
+    rng = random.Random(seed)
+    ops, weights = list(mix), list(mix.values())
+    local = defaultdict(list)
+    local_errors = defaultdict(int)
+    atm.run("login")
+    while time.perf_counter() < deadline:
+        op = rng.choices(ops, weights)[0]
+        start = time.perf_counter()
+        try:
+            ok = atm.run(op)
+        except Exception:
+            ok = False
+        local[op].append(time.perf_counter() - start)
+        if not ok:
+            local_errors[op] += 1
+    with lock:
+        for op, values in local.items():
+            latencies[op].extend(values)
+        for op, count in local_errors.items():
+            errors[op] += count
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", choices=["api", "server"], default="api")
+    parser.add_argument("--atms", type=int, default=8, help="simulated ATMs (one thread each)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of measured load")
+    parser.add_argument("--mix", default="login=1,balance=5,deposit=2,withdraw=1,activity=1")
+    parser.add_argument("--sig-types", default="rsa,dsa,ed25519,ecdsa",
+                        help="signature types, assigned round-robin")
+    parser.add_argument("--sessions", action="store_true", help="use the AES session channel (api target)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    sig_types = args.sig_types.split(",")
+    atm_ids = [f"simatm{i}" for i in range(args.atms)]
+    user_ids = list(USERS)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"Generating keys for {args.atms} ATMs...")
+        build_fixture(workdir, atm_ids)
+        port = free_port()
+        bank = start_bank(args.target, workdir, port)
+        try:
+            atm_class = ApiATM if args.target == "api" else ServerATM
+            certs = os.path.join(workdir, "certs")
+            atms = [atm_class(atm_id, sig_types[i % len(sig_types)], user_ids[i % len(user_ids)],
+                              port, certs, args.sessions)
+                    for i, atm_id in enumerate(atm_ids)]
+
+            latencies, errors, lock = defaultdict(list), defaultdict(int), threading.Lock()
+            deadline = time.perf_counter() + args.duration
+            threads = [threading.Thread(target=drive, args=(atm, mix, deadline, latencies, errors, lock, i))
+                       for i, atm in enumerate(atms)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            bank.terminate()
+            bank.wait()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "config": vars(args),
+        "elapsed_s": elapsed,
+        "endpoints": {},
+    }
+    total = 0
+    print(f"\n{'endpoint':<10} {'count':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for op in mix:
+        values = sorted(latencies.get(op, []))
+        total += len(values)
+        stats = {
+            "count": len(values),
+            "errors": errors.get(op, 0),
+            "throughput_rps": len(values) / elapsed,
+            "p50_ms": 1000 * percentile(values, 50),
+            "p95_ms": 1000 * percentile(values, 95),
+            "p99_ms": 1000 * percentile(values, 99),
+        }
+        results["endpoints"][op] = stats
+        print(f"{op:<10} {stats['count']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+    results["total_rps"] = total / elapsed
+    print(f"{'total':<10} {total:>7} {sum(errors.values()):>5} {results['total_rps']:>8.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Throughput and memory of reconcile.py as the transaction log grows.
+
+Writes a synthetic bank_server transaction log (rotated segments plus an
+active file, --accounts accounts over --atms ATMs) and matching balances,
+then runs reconcile.py on it in a fresh process: once from scratch, and
+once more after appending --append entries to check the incremental run.
+Repeats for each size in --lines and reports MB/s and peak RSS, which
+should stay flat as the log grows.
+
+    python benchmarks/reconcile.py --lines 500000,2000000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SEGMENT_LINES = 250000
+
+# Run reconcile.py in this process and report its peak RSS (KiB) on the last line
+RUNNER = """
+import resource, runpy, sys
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+except SystemExit:
+    pass
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def write_log(path, lines, accounts, atms, balances, rng):
+    with open(path, "a", encoding="utf-8") as f:
+        for _ in range(lines):
+            user_id = f"{100000 + rng.randrange(accounts)}"
+            atm_id = f"atm{rng.randrange(atms)}"
+            if rng.random() < 0.5:
+                amount = rng.randrange(1, 500)
+                balances[user_id] += amount
+                f.write(f"[2026-10-18 12:00:00] {atm_id} {user_id}: Deposited ${amount}\n")
+            elif rng.random() < 0.6:
+                amount = rng.randrange(1, 300)
+                balances[user_id] -= amount
+                f.write(f"[2026-10-18 12:00:00] {atm_id} {user_id}: Withdrew ${amount}\n")
+            else:
+                f.write(f"[2026-10-18 12:00:00] {atm_id} {user_id}: Checked balance\n")
+
+
+def write_balances(path, balances):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({u: {"password": "pw", "balance": b} for u, b in balances.items()}, f)
+
+
+def reconcile(workdir):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", RUNNER, os.path.join(REPO_ROOT, "reconcile.py"),
+                             "--log", "logs/transactions.log", "--opening", "opening.json"],
+                            cwd=workdir, env=dict(os.environ, PYTHONPATH=REPO_ROOT),
+                            capture_output=True, text=True, check=True)
+    *report, rss_kib = result.stdout.strip().splitlines()
+    return time.perf_counter() - start, int(rss_kib) / 1024, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", default="500000,2000000", help="log sizes to test (entries)")
+    parser.add_argument("--accounts", type=int, default=10000)
+    parser.add_argument("--atms", type=int, default=200)
+    parser.add_argument("--append", type=int, default=10000, help="entries added before the incremental run")
+    args = parser.parse_args()
+
+    print(f"{'entries':>10} {'log MB':>8} {'full s':>8} {'MB/s':>7} {'peak MB':>8} "
+          f"{'incr s':>8} {'incr MB':>8}  result")
+    for lines in (int(n) for n in args.lines.split(",")):
+        rng = random.Random(lines)
+        with tempfile.TemporaryDirectory() as workdir:
+            logs = os.path.join(workdir, "logs")
+            os.makedirs(logs)
+            balances = {f"{100000 + i}": 1000 for i in range(args.accounts)}
+            write_balances(os.path.join(workdir, "opening.json"), balances)
+            # Closed segments as LogWriter names them, then the active file
+            for n in range(0, lines, SEGMENT_LINES):
+                name = "transactions.log" if n + SEGMENT_LINES >= lines else f"transactions.20261018-{n:06d}.log"
+                write_log(os.path.join(logs, name), min(SEGMENT_LINES, lines - n), args.accounts, args.atms,
+                          balances, rng)
+            write_balances(os.path.join(workdir, "user_db.json"), balances)
+            size_mb = sum(os.path.getsize(os.path.join(logs, n)) for n in os.listdir(logs)) / 1e6
+
+            full_s, full_rss, report = reconcile(workdir)
+            write_log(os.path.join(logs, "transactions.log"), args.append, args.accounts, args.atms, balances, rng)
+            write_balances(os.path.join(workdir, "user_db.json"), balances)
+            incr_s, incr_rss, incr_report = reconcile(workdir)
+            print(f"{lines:>10} {size_mb:>8.1f} {full_s:>8.2f} {size_mb / full_s:>7.1f} {full_rss:>8.1f} "
+                  f"{incr_s:>8.2f} {incr_rss:>8.1f}  {report[-1].split(': ', 1)[1]}")
+
+
+if __name__ == "__main__":
+    main()
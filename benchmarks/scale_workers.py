@@ -0,0 +1,98 @@
+"""
+Throughput of the multi-process bank (bank_cluster.py) from 1 to N workers.
+
+For each worker count, starts a fresh cluster on the load_test.py fixture
+and drives it with the same simulated ATM fleet. Signed commands are used
+throughout (the RSA decrypt and signature verify are what the extra worker
+processes parallelize). Run the load generator on other cores than the bank
+for meaningful numbers.
+
+    python benchmarks/scale_workers.py --max-workers 8 --atms 32 --duration 10
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+# Add the repository root to the module search path
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_ROOT)
+
+from load_test import USERS, ApiATM, build_fixture, drive, free_port, parse_mix, percentile
+
+
+def start_cluster(workdir, workers, port, state_port):
+    cmd = [sys.executable, os.path.join(REPO_ROOT, "bank_cluster.py"), "--workers", str(workers),
+           "--port", str(port), "--state-port", str(state_port)]
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    env.setdefault("BANK_VELOCITY_RULES", "")   # as in load_test.start_bank
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError(f"cluster exited with code {proc.returncode}")
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("cluster did not start listening")
+
+
+def measure(workdir, workers, atm_ids, mix, duration, sig_types):
+    port, state_port = free_port(), free_port()
+    cluster = start_cluster(workdir, workers, port, state_port)
+    try:
+        certs = os.path.join(workdir, "certs")
+        users = list(USERS)
+        atms = [ApiATM(atm_id, sig_types[i % len(sig_types)], users[i % len(users)], port, certs, False)
+                for i, atm_id in enumerate(atm_ids)]
+        latencies, errors, lock = defaultdict(list), defaultdict(int), threading.Lock()
+        deadline = time.perf_counter() + duration
+        threads = [threading.Thread(target=drive, args=(atm, mix, deadline, latencies, errors, lock, i))
+                   for i, atm in enumerate(atms)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        cluster.terminate()
+        cluster.wait()
+    values = sorted(v for op in latencies.values() for v in op)
+    return len(values) / elapsed, sum(errors.values()), percentile(values, 50), percentile(values, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--atms", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--mix", default="login=1,balance=5,deposit=2,withdraw=1,activity=1")
+    parser.add_argument("--sig-types", default="rsa,ecdsa")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    atm_ids = [f"simatm{i}" for i in range(args.atms)]
+    counts = sorted({1, 2, 4, 8, 16, args.max_workers} & set(range(1, args.max_workers + 1)))
+    print(f"{'workers':>7} {'req/s':>8} {'errors':>7} {'p50 ms':>7} {'p99 ms':>7} {'scaling':>8}")
+    base = None
+    for workers in counts:
+        # Fresh accounts per run so every point starts from the same state
+        with tempfile.TemporaryDirectory() as workdir:
+            build_fixture(workdir, atm_ids)
+            rps, errors, p50, p99 = measure(workdir, workers, atm_ids, mix, args.duration,
+                                            args.sig_types.split(","))
+        base = base or rps
+        print(f"{workers:>7} {rps:>8.1f} {errors:>7} {1000 * p50:>7.2f} {1000 * p99:>7.2f} {rps / base:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+SessionRegistry throughput and memory at hundreds of thousands of sessions.
+
+Fills a registry with --sessions logins spread over --atms ATMs and
+measures its memory, then times lookups of random live handles, forced
+logout of one ATM, and expiry of the whole table once its idle TTL has
+passed (driven by lookups, as in the bank).
+
+    python benchmarks/session_registry.py --sessions 500000 --atms 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Add the repository root to the module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.session_crypto import new_session_id
+from utils.session_registry import SessionRegistry
+
+
+def rate(count, seconds):
+    return f"{count / seconds:>12,.0f}/s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=500000)
+    parser.add_argument("--atms", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=500000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    handles = [new_session_id() for _ in range(args.sessions)]
+    registry = SessionRegistry(ttl=900.0, max_sessions=args.sessions)
+    now = 0.0
+
+    start = time.perf_counter()
+    for i, handle in enumerate(handles):
+        registry.create(handle, f"atm{i % args.atms}", f"{100000 + i}", now=now)
+    created = time.perf_counter() - start
+
+    # Memory of a second, identical table, handles and IDs included
+    tracemalloc.start()
+    sized = SessionRegistry(ttl=900.0, max_sessions=args.sessions)
+    for i in range(args.sessions):
+        sized.create(new_session_id(), f"atm{i % args.atms}", f"{100000 + i}", now=now)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del sized
+
+    probes = [(i, handles[i]) for i in (rng.randrange(args.sessions) for _ in range(args.lookups))]
+    start = time.perf_counter()
+    for i, handle in probes:
+        assert registry.get(handle, f"atm{i % args.atms}", now=now + 1) is not None
+    looked_up = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ended = registry.logout_atm("atm0")
+    logout_ms = 1000 * (time.perf_counter() - start)
+
+    # Everything is idle past its TTL; lookups sweep the table from the front
+    later = now + 2 * registry.ttl
+    start = time.perf_counter()
+    misses = 0
+    while len(registry):
+        misses += registry.get(new_session_id(), now=later) is None
+    expired = time.perf_counter() - start
+
+    print(f"{args.sessions:,} sessions over {args.atms:,} ATMs, "
+          f"{memory / args.sessions:.0f} bytes/session ({memory / 1e6:.0f} MB)")
+    print(f"create      {rate(args.sessions, created)}")
+    print(f"lookup      {rate(args.lookups, looked_up)}")
+    print(f"logout ATM  {ended} sessions in {logout_ms:.2f} ms")
+    print(f"expiry      {args.sessions - ended:,} sessions swept by {misses:,} lookups in {expired:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
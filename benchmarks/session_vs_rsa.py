@@ -0,0 +1,85 @@
+"""
+Server-side cost of one ATM command: RSA-per-command vs. the AES-GCM session channel.
+
+The RSA path is what /api/action does for every command (RSA-OAEP private-key
+decrypt plus an RSA-PSS or DSA signature verify). The session path is what
+/api/session/action does (one AES-GCM open with replay check).
+
+    python benchmarks/session_vs_rsa.py --seconds 2
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the repository root to the module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from cryptography.hazmat.primitives.asymmetric import rsa, dsa
+from utils.crypto_utils import (
+    encrypt_message, rsa_decrypt, sign_message, rsa_verify, sign_dsa, dsa_verify
+)
+from utils.session_crypto import SessionChannel, new_session_key, new_session_id
+
+
+def measure(fn, seconds):
+    # Run fn repeatedly for roughly `seconds`; return operations per second.
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def measure_session(command, seconds, chunk=50_000):
+    # Every open() needs a fresh counter, so seal in chunks outside the timer
+    # and time only the bank-side opens.
+    key, session_id = new_session_key(), new_session_id()
+    atm_side = SessionChannel(session_id, key)
+    bank_side = SessionChannel(session_id, key)
+    count, elapsed = 0, 0.0
+    while elapsed < seconds:
+        sealed = [atm_side.seal(command) for _ in range(chunk)]
+        start = time.perf_counter()
+        for counter, ciphertext in sealed:
+            assert bank_side.open(counter, ciphertext) == command
+        elapsed += time.perf_counter() - start
+        count += chunk
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2.0, help="time budget per case")
+    args = parser.parse_args()
+
+    command = b"deposit"
+    bank_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    atm_rsa = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    atm_dsa = dsa.generate_private_key(key_size=2048)
+
+    encrypted = encrypt_message(command, bank_key.public_key())
+    rsa_sig = sign_message(command, atm_rsa)
+    dsa_sig = sign_dsa(command, atm_dsa)
+
+    def rsa_per_command_rsa():
+        rsa_verify(rsa_decrypt(encrypted, bank_key), rsa_sig, atm_rsa.public_key())
+
+    def rsa_per_command_dsa():
+        dsa_verify(rsa_decrypt(encrypted, bank_key), dsa_sig, atm_dsa.public_key())
+
+    results = {
+        "rsa decrypt + rsa verify": measure(rsa_per_command_rsa, args.seconds),
+        "rsa decrypt + dsa verify": measure(rsa_per_command_dsa, args.seconds),
+        "aes-gcm session channel": measure_session(command, args.seconds),
+    }
+    baseline = results["rsa decrypt + rsa verify"]
+    print(f"{'path':<28} {'cmds/s/core':>12} {'vs rsa':>8}")
+    for name, rate in results.items():
+        print(f"{name:<28} {rate:>12.0f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Consistent-hash sharding with online migration, on local shard processes.
+
+Starts --shards state processes (utils/state_server.py), creates --accounts
+accounts through ShardRouter and keeps deposit traffic running while one
+more shard process is added. Then it checks that:
+
+  * every account lives on exactly one shard, the one the ring names
+  * no deposit was lost or applied twice during the move
+  * only about 1/(N+1) of the accounts moved
+
+and reports the migration time and throughput before/during the move.
+
+    python benchmarks/sharding.py --shards 2 --accounts 5000 --threads 8
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# Add the repository root to the module search path
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_ROOT)
+
+from load_test import free_port
+from utils.sharding import ShardRouter, open_shard
+from utils.transactions import DEPOSIT_AMOUNT
+
+
+# Shard state processes and the router share one random secret for this run
+os.environ.setdefault("BANK_STATE_AUTHKEY", os.urandom(32).hex())
+
+
+def start_shard(root, name):
+    port = free_port()
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    proc = subprocess.Popen([sys.executable, "-m", "utils.state_server", "--address", f"127.0.0.1:{port}",
+                             "--data", os.path.join(path, "user_db.json"), "--history", os.path.join(path, "history")],
+                            env=dict(os.environ, PYTHONPATH=REPO_ROOT), stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc, open_shard(name, f"127.0.0.1:{port}")
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"shard {name} did not start")
+
+
+def parallel(fn, items, threads):
+    chunks = [items[i::threads] for i in range(threads)]
+    pool = [threading.Thread(target=lambda c=c: [fn(x) for x in c]) for c in chunks]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shards", type=int, default=2, help="initial shard processes")
+    parser.add_argument("--accounts", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8, help="client threads sending deposits")
+    args = parser.parse_args()
+
+    procs = []
+    with tempfile.TemporaryDirectory() as root:
+        try:
+            shards = []
+            for i in range(args.shards):
+                proc, shard = start_shard(root, f"s{i + 1}")
+                procs.append(proc)
+                shards.append(shard)
+            router = ShardRouter(shards)
+
+            user_ids = [f"{100000 + i}" for i in range(args.accounts)]
+            start = time.perf_counter()
+            parallel(lambda u: router.create_user(u, "pw"), user_ids, 32)
+            print(f"Created {args.accounts} accounts in {time.perf_counter() - start:.1f}s")
+
+            deposits = Counter()
+            counts = [0] * args.threads   # deposits sent, per thread
+            stop = threading.Event()
+            lock = threading.Lock()
+
+            def traffic(index):
+                rng = random.Random(index)
+                local = Counter()
+                while not stop.is_set():
+                    user_id = rng.choice(user_ids)
+                    assert router.execute(user_id, "deposit") == f"Deposited ${DEPOSIT_AMOUNT}"
+                    local[user_id] += 1
+                    counts[index] += 1
+                with lock:
+                    deposits.update(local)
+
+            workers = [threading.Thread(target=traffic, args=(i,)) for i in range(args.threads)]
+            for t in workers:
+                t.start()
+            proc, new_shard = start_shard(root, f"s{args.shards + 1}")
+            procs.append(proc)
+            warm = sum(counts)
+            time.sleep(2.0)
+            before_rate = (sum(counts) - warm) / 2.0
+
+            start_ops = sum(counts)
+            start = time.perf_counter()
+            moved = router.add_shard(new_shard, progress_every=0)
+            migration_s = time.perf_counter() - start
+            during_rate = (sum(counts) - start_ops) / migration_s
+            stop.set()
+            for t in workers:
+                t.join()
+
+            # --- checks ---
+            placement = Counter()
+            bad = 0
+            for user_id in user_ids:
+                holders = [name for name, shard in router.shards.items() if shard.store.exists(user_id)]
+                placement.update(holders)
+                if holders != [router.ring.owner(user_id)]:
+                    bad += 1
+                elif router.balance(user_id) != deposits[user_id] * DEPOSIT_AMOUNT:
+                    bad += 1
+            print(f"Added shard in {migration_s:.2f}s, moved {moved} accounts "
+                  f"({moved / args.accounts:.1%}; ideal {1 / (args.shards + 1):.1%})")
+            print(f"Deposits: {before_rate:.0f} ops/s before, {during_rate:.0f} ops/s during the move; "
+                  f"{sum(deposits.values())} in total")
+            print(f"Accounts per shard: {dict(sorted(placement.items()))}")
+            print("Consistency: " + ("OK" if bad == 0 else f"{bad} accounts wrong"))
+        finally:
+            for proc in procs:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    main()
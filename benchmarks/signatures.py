@@ -0,0 +1,55 @@
+"""
+Sign and verify throughput for every signature type in utils/crypto_utils.py.
+
+    python benchmarks/signatures.py --seconds 1
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the repository root to the module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from cryptography.hazmat.primitives.asymmetric import rsa, dsa, ec, ed25519
+from utils.crypto_utils import SIG_TYPES, sign_with, verify_with
+
+KEY_FACTORIES = {
+    "rsa": lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    "dsa": lambda: dsa.generate_private_key(key_size=2048),
+    "ed25519": ed25519.Ed25519PrivateKey.generate,
+    "ecdsa": lambda: ec.generate_private_key(ec.SECP256R1()),
+}
+
+
+def measure(fn, seconds):
+    # Run fn repeatedly for roughly `seconds`; return operations per second.
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget per measurement")
+    args = parser.parse_args()
+
+    message = b"deposit"
+    print(f"{'sig_type':<8} {'sign/s':>9} {'verify/s':>9} {'sig bytes':>9}")
+    for sig_type in SIG_TYPES:
+        private_key = KEY_FACTORIES[sig_type]()
+        public_key = private_key.public_key()
+        signature = sign_with(sig_type, message, private_key)
+        assert verify_with(sig_type, message, signature, public_key)
+
+        sign_rate = measure(lambda: sign_with(sig_type, message, private_key), args.seconds)
+        verify_rate = measure(lambda: verify_with(sig_type, message, signature, public_key), args.seconds)
+        print(f"{sig_type:<8} {sign_rate:>9.0f} {verify_rate:>9.0f} {len(signature):>9}")
+
+
+if __name__ == "__main__":
+    main()
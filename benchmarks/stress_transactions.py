@@ -0,0 +1,91 @@
+"""
+Stress test for the bank API transaction layer.
+
+Runs many threads of deposits/withdrawals through TransactionManager against
+a fresh AccountStore, checks that no update was lost, and reports throughput
+as the number of distinct accounts grows.
+
+    python benchmarks/stress_transactions.py --threads 32 --ops 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the repository root to the module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.account_store import AccountStore
+from utils.history_store import HistoryStore
+from utils.transactions import TransactionManager, DEPOSIT_AMOUNT, WITHDRAW_AMOUNT
+
+
+def run(accounts, threads, ops):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AccountStore(os.path.join(tmp, "user_db.json"))
+        txn = TransactionManager(store, HistoryStore(os.path.join(tmp, "history")))
+        user_ids = [f"{100000 + i}" for i in range(accounts)]
+        for user_id in user_ids:
+            store.create_user(user_id, "pw")
+
+        expected = {user_id: 0 for user_id in user_ids}
+        expected_lock = threading.Lock()
+
+        def worker(n):
+            user_id = user_ids[n % accounts]
+            net = 0
+            for i in range(ops):
+                # Two deposits per withdrawal keeps every withdrawal funded.
+                if i % 3 == 2:
+                    assert txn.execute(user_id, "withdraw").startswith("Withdrew")
+                    net -= WITHDRAW_AMOUNT
+                else:
+                    txn.execute(user_id, "deposit")
+                    net += DEPOSIT_AMOUNT
+            with expected_lock:
+                expected[user_id] += net
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        lost = {u: (store.balance(u), expected[u]) for u in user_ids if store.balance(u) != expected[u]}
+        store.close()
+
+        # Recovery must reproduce the same balances from snapshot + journal.
+        recovered = AccountStore(os.path.join(tmp, "user_db.json"))
+        lost.update({u: (recovered.balance(u), expected[u]) for u in user_ids
+                     if recovered.balance(u) != expected[u]})
+        recovered.close()
+
+    return threads * ops / elapsed, lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=200, help="operations per thread")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    baseline = None
+    failed = False
+    print(f"{'accounts':>8} {'ops/s':>10} {'speedup':>8}  result")
+    for accounts in args.accounts:
+        throughput, lost = run(accounts, args.threads, args.ops)
+        baseline = baseline or throughput
+        status = "ok" if not lost else f"LOST UPDATES {lost}"
+        failed = failed or bool(lost)
+        print(f"{accounts:>8} {throughput:>10.0f} {throughput / baseline:>7.1f}x  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
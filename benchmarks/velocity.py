@@ -0,0 +1,139 @@
+"""
+Cost of the withdrawal velocity checks as transaction history grows.
+
+Feeds the same stream of withdrawals (--accounts accounts over --atms ATMs,
+--rate per second of simulated time) to VelocityCheck and to a naive check
+that scans each account's and ATM's full withdrawal history for the window,
+and reports checks per second after every --history more withdrawals: the
+ring counters should stay flat while the scan slows down. Then reports
+memory per tracked account and TransactionManager withdrawal throughput
+with the checks off and on.
+
+    python benchmarks/velocity.py --history 20000,100000,500000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the repository root to the module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.account_store import AccountStore
+from utils.history_store import HistoryStore
+from utils.transactions import TransactionManager
+from utils.velocity import VelocityCheck, DEFAULT_RULES, parse_rules
+
+
+class ScanCheck:
+    """Same rules evaluated by scanning stored history (what the ring counters replace)."""
+
+    def __init__(self, rules, window):
+        self.rules, self.window = rules, window
+        self.accounts, self.atms = {}, {}
+
+    def screen(self, user_id, atm_id, amount, now):
+        since = now - self.window
+        account = [e for e in self.accounts.get(user_id, ()) if e[0] > since]
+        atm = [e for e in self.atms.get(atm_id, ()) if e[0] > since]
+        stats = {
+            "account_amount": sum(e[1] for e in account) + amount,
+            "account_count": len(account) + 1,
+            "account_atms": len({e[2] for e in account} | {atm_id}),
+            "atm_amount": sum(e[1] for e in atm) + amount,
+            "atm_count": len(atm) + 1,
+        }
+        verdict = None
+        for rule in self.rules:
+            if rule.exceeded(stats):
+                verdict = rule.action
+                if verdict == "reject":
+                    return verdict, rule.name
+        self.record(user_id, atm_id, amount, now)
+        return verdict, None
+
+    def record(self, user_id, atm_id, amount, now):
+        entry = (now, amount, atm_id)
+        self.accounts.setdefault(user_id, []).append(entry)
+        self.atms.setdefault(atm_id, []).append(entry)
+
+
+def stream(count, accounts, atms, rate, rng, start=0.0):
+    return [(f"{100000 + rng.randrange(accounts)}", f"atm{rng.randrange(atms)}", 50, start + i / rate)
+            for i in range(count)]
+
+
+def screened_per_second(check, events):
+    start = time.perf_counter()
+    for user_id, atm_id, amount, now in events:
+        check.screen(user_id, atm_id, amount, now)
+    return len(events) / (time.perf_counter() - start)
+
+
+def withdrawals_per_second(velocity, count, accounts):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AccountStore(os.path.join(tmp, "user_db.json"), durable=False)
+        history = HistoryStore(os.path.join(tmp, "history"))
+        for i in range(accounts):
+            store.import_user(f"{100000 + i}", "pw", 10 ** 9)
+        txn = TransactionManager(store, history, velocity=velocity)
+        rng = random.Random(2)
+        start = time.perf_counter()
+        for _ in range(count):
+            txn.execute(f"{100000 + rng.randrange(accounts)}", "withdraw", f"atm{rng.randrange(100)}")
+        elapsed = time.perf_counter() - start
+        store.close()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--history", default="20000,100000,500000",
+                        help="total withdrawals seen before each measurement")
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--atms", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=200.0, help="withdrawals per simulated second")
+    parser.add_argument("--probe", type=int, default=10000, help="checks timed at each history size")
+    parser.add_argument("--window", type=float, default=600.0)
+    parser.add_argument("--rules", default=DEFAULT_RULES)
+    args = parser.parse_args()
+
+    rules = parse_rules(args.rules.replace("reject", "flag"))   # count every withdrawal in the window
+    rng = random.Random(1)
+    ring, scan = VelocityCheck(rules, args.window), ScanCheck(rules, args.window)
+
+    print(f"{args.accounts} accounts, {args.atms} ATMs, {args.rate:.0f} withdrawals/s, "
+          f"{args.window:.0f}s window ({int(args.rate * args.window):,} withdrawals in it)")
+    print(f"{'history':>10} {'ring checks/s':>14} {'scan checks/s':>14}")
+    seen = 0
+    for target in (int(n) for n in args.history.split(",")):
+        # Both see every withdrawal; the scan's history is appended without checking to save time
+        events = stream(target - seen, args.accounts, args.atms, args.rate, rng, seen / args.rate)
+        for user_id, atm_id, amount, now in events:
+            ring.screen(user_id, atm_id, amount, now)
+            scan.record(user_id, atm_id, amount, now)
+        seen = target
+        probe = stream(args.probe, args.accounts, args.atms, args.rate, rng, seen / args.rate)
+        print(f"{target:>10,} {screened_per_second(ring, probe):>14,.0f} {screened_per_second(scan, probe):>14,.0f}")
+        seen += args.probe
+
+    # Memory of the counters for one window's worth of distinct accounts
+    tracemalloc.start()
+    sized = VelocityCheck(rules, args.window)
+    for i, (user_id, atm_id, amount, now) in enumerate(stream(100000, 100000, args.atms, 1000.0, random.Random(3))):
+        sized.screen(f"{100000 + i}", atm_id, amount, now)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"memory: {memory / 100000:.0f} bytes per tracked account (100,000 accounts)")
+
+    off = withdrawals_per_second(None, 20000, args.accounts)
+    on = withdrawals_per_second(VelocityCheck(rules, args.window), 20000, args.accounts)
+    print(f"TransactionManager withdrawals: {off:,.0f}/s without checks, {on:,.0f}/s with "
+          f"({100 * (off - on) / off:.0f}% overhead)")
+
+
+if __name__ == "__main__":
+    main()
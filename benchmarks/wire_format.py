@@ -0,0 +1,78 @@
+"""
+Bytes on the wire and server-side parse time: JSON+hex vs. the binary wire format.
+
+Builds real login and action request bodies (RSA-2048 ciphertext, RSA-PSS
+and DSA signatures) and measures body size and the cost of turning each body
+back into raw fields, which is what bank_api.read_payload() does.
+
+    python benchmarks/wire_format.py --iterations 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add the repository root to the module search path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from cryptography.hazmat.primitives.asymmetric import rsa, dsa
+from utils.crypto_utils import encrypt_message, sign_message, sign_dsa
+from utils.replay_cache import new_nonce
+from utils import wire
+
+
+def json_body(payload):
+    return json.dumps({k: v.hex() if isinstance(v, bytes) else v for k, v in payload.items()}).encode()
+
+
+def parse_json(body):
+    data = json.loads(body)
+    for field in ("encrypted", "signature"):
+        data[field] = bytes.fromhex(data[field])
+    return data
+
+
+def time_per_call(fn, body, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(body)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args()
+
+    bank_pub = rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()
+    atm_rsa = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    atm_dsa = dsa.generate_private_key(key_size=2048)
+
+    login = b"atm1:124356:testpass"
+    requests = {}
+    for sig_type, sign, key in (("rsa", sign_message, atm_rsa), ("dsa", sign_dsa, atm_dsa)):
+        requests[f"login/{sig_type}"] = {
+            "atm_id": "atm1", "user_id": "124356", "signature_type": sig_type,
+            "nonce": new_nonce(), "timestamp": int(time.time()),
+            "encrypted": encrypt_message(login, bank_pub), "signature": sign(login, key),
+        }
+        requests[f"action/{sig_type}"] = {
+            "atm_id": "atm1", "session_id": os.urandom(16).hex(), "user_id": "124356",
+            "signature_type": sig_type, "command": "deposit",
+            "nonce": new_nonce(), "timestamp": int(time.time()),
+            "encrypted": encrypt_message(b"deposit", bank_pub), "signature": sign(b"deposit", key),
+        }
+
+    print(f"{'request':<12} {'json B':>7} {'bin B':>6} {'saved':>6} {'json us':>8} {'bin us':>7} {'speedup':>8}")
+    for name, payload in requests.items():
+        j, b = json_body(payload), wire.encode(payload)
+        assert wire.decode(b) == parse_json(j)
+        tj = time_per_call(parse_json, j, args.iterations)
+        tb = time_per_call(wire.decode, b, args.iterations)
+        print(f"{name:<12} {len(j):>7} {len(b):>6} {1 - len(b) / len(j):>6.0%} "
+              f"{tj:>8.2f} {tb:>7.2f} {tj / tb:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,14 @@ from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import dsa
 import os
 
+# One set of domain parameters for every key; generating them is the slow part
+_params = None
+
 def generate_dsa_keypair(name):
-    private_key = dsa.generate_private_key(key_size=2048)
+    global _params
+    if _params is None:
+        _params = dsa.generate_parameters(key_size=2048)
+    private_key = _params.generate_private_key()
     public_key = private_key.public_key()
 
     with open(f"certs/{name}_dsa_private.pem", "wb") as f:
@@ -0,0 +1,32 @@
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+import os
+
+def write_keypair(name, private_key):
+    public_key = private_key.public_key()
+
+    with open(f"certs/{name}_private.pem", "wb") as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+
+    with open(f"certs/{name}_public.pem", "wb") as f:
+        f.write(public_key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
+
+def generate_ed25519_keypair(name):
+    write_keypair(f"{name}_ed25519", ed25519.Ed25519PrivateKey.generate())
+
+def generate_ecdsa_keypair(name):
+    write_keypair(f"{name}_ecdsa", ec.generate_private_key(ec.SECP256R1()))
+
+if __name__ == "__main__":
+    os.makedirs("certs", exist_ok=True)
+    for name in ["atm1", "atm2"]:
+        generate_ed25519_keypair(name)
+        generate_ecdsa_keypair(name)
+    print("✅ Ed25519 and ECDSA P-256 keypairs generated for atm1 and atm2.")
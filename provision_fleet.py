@@ -0,0 +1,211 @@
+"""
+Provision signing keys for a whole ATM fleet.
+
+Reads a fleet manifest, generates the missing keypairs on a process pool and
+writes them into certs/ together with certs/index.json, which the bank's
+KeyRegistry reads. The manifest is JSON:
+
+    {"sig_types": ["rsa", "dsa"],
+     "atms": ["atm1", "atm2", {"id": "atm3", "sig_types": ["ed25519"]}]}
+
+All DSA keys share one set of 2048-bit domain parameters (generating the
+parameters is what makes DSA keygen slow). They are created once and kept in
+certs/dsa_params.json so later runs extend the same fleet. Every key file is
+written to a temporary name and renamed into place, so the bank never sees a
+partial key. Existing keys are kept unless --force is given.
+
+    python provision_fleet.py fleet.json --workers 8
+    python provision_fleet.py --count 5000 --prefix atm --sig-types rsa,dsa
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, dsa, ec, ed25519
+from utils.crypto_utils import SIG_TYPES, KEY_INDEX, private_key_path, public_key_path
+
+DSA_PARAMS = "dsa_params.json"
+
+# ------------------------ WORKERS -----------------------
+_certs_dir = None
+_dsa_params = None
+
+
+def _init_worker(certs_dir, dsa_params):
+    global _certs_dir, _dsa_params
+    _certs_dir = certs_dir
+    if dsa_params:
+        _dsa_params = dsa.DSAParameterNumbers(**{k: int(v, 16) for k, v in dsa_params.items()}).parameters()
+
+
+def _generate(sig_type):
+    if sig_type == "rsa":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if sig_type == "dsa":
+        return _dsa_params.generate_private_key()
+    if sig_type == "ed25519":
+        return ed25519.Ed25519PrivateKey.generate()
+    if sig_type == "ecdsa":
+        return ec.generate_private_key(ec.SECP256R1())
+    raise ValueError(f"Unknown signature type: {sig_type}")
+
+
+def _write_atomic(path, data, mode=0o644):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _provision(job):
+    # Generate and store one keypair; returns its index entry.
+    atm_id, sig_type = job
+    private_key = _generate(sig_type)
+    private_path = private_key_path(_certs_dir, atm_id, sig_type)
+    public_path = public_key_path(_certs_dir, atm_id, sig_type)
+    public_key = private_key.public_key()
+    public_der = public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+    _write_atomic(private_path, private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ), mode=0o600)
+    _write_atomic(public_path, public_key.public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo))
+    return index_entry(atm_id, sig_type, private_path, public_path, public_der)
+
+
+def index_entry(atm_id, sig_type, private_path, public_path, public_der):
+    return {
+        "atm_id": atm_id,
+        "sig_type": sig_type,
+        "public": os.path.basename(public_path),
+        "private": os.path.basename(private_path),
+        "fingerprint": hashlib.sha256(public_der).hexdigest(),
+    }
+
+
+# ------------------------ MANIFEST ----------------------
+def load_manifest(path):
+    """Return the (atm_id, sig_type) pairs a manifest asks for, in order."""
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    default_types = manifest.get("sig_types", ["rsa", "dsa"])
+    jobs = []
+    for atm in manifest["atms"]:
+        if isinstance(atm, str):
+            atm_id, sig_types = atm, default_types
+        else:
+            atm_id, sig_types = atm["id"], atm.get("sig_types", default_types)
+        for sig_type in sig_types:
+            if sig_type not in SIG_TYPES:
+                raise ValueError(f"{atm_id}: unknown signature type {sig_type}")
+            jobs.append((atm_id, sig_type))
+    return jobs
+
+
+def load_index(certs_dir):
+    try:
+        with open(os.path.join(certs_dir, KEY_INDEX), "r", encoding="utf-8") as f:
+            return {(e["atm_id"], e["sig_type"]): e for e in json.load(f)["keys"]}
+    except FileNotFoundError:
+        return {}
+
+
+def existing_entry(certs_dir, atm_id, sig_type):
+    # Index entry for a keypair already on disk (e.g. from generate_dsa_keys.py), or None.
+    private_path = private_key_path(certs_dir, atm_id, sig_type)
+    public_path = public_key_path(certs_dir, atm_id, sig_type)
+    if not (os.path.exists(private_path) and os.path.exists(public_path)):
+        return None
+    with open(public_path, "rb") as f:
+        public_der = serialization.load_pem_public_key(f.read()).public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return index_entry(atm_id, sig_type, private_path, public_path, public_der)
+
+
+def shared_dsa_params(certs_dir):
+    """The fleet's DSA domain parameters as hex {p, q, g}, generated on first use."""
+    path = os.path.join(certs_dir, DSA_PARAMS)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    numbers = dsa.generate_parameters(key_size=2048).parameter_numbers()
+    params = {"p": hex(numbers.p), "q": hex(numbers.q), "g": hex(numbers.g)}
+    _write_atomic(path, json.dumps(params, indent=1).encode())
+    return params
+
+
+def write_index(certs_dir, entries):
+    keys = sorted(entries.values(), key=lambda e: (e["atm_id"], e["sig_type"]))
+    _write_atomic(os.path.join(certs_dir, KEY_INDEX),
+                  json.dumps({"version": 1, "keys": keys}, indent=1).encode())
+
+
+def provision(jobs, certs_dir="certs", workers=None, force=False):
+    """Generate missing keys for jobs; returns (keys generated, seconds)."""
+    os.makedirs(certs_dir, exist_ok=True)
+    entries = load_index(certs_dir)
+    todo = []
+    for atm_id, sig_type in dict.fromkeys(jobs):
+        entry = None if force else entries.get((atm_id, sig_type)) or existing_entry(certs_dir, atm_id, sig_type)
+        if entry is None:
+            todo.append((atm_id, sig_type))
+        else:
+            entries[(atm_id, sig_type)] = entry
+
+    start = time.perf_counter()
+    params = shared_dsa_params(certs_dir) if any(sig == "dsa" for _, sig in todo) else None
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(certs_dir, params)) as pool:
+            chunksize = max(1, min(64, len(todo) // (workers * 4)))
+            for entry in pool.map(_provision, todo, chunksize=chunksize):
+                entries[(entry["atm_id"], entry["sig_type"])] = entry
+    # The index is rewritten once, after every key file is in place.
+    write_index(certs_dir, entries)
+    return len(todo), time.perf_counter() - start
+
+
+def sig_type_list(text):
+    """argparse type for --sig-types: "rsa,dsa" -> ["rsa", "dsa"], known types only."""
+    sig_types = [sig.strip() for sig in text.split(",") if sig.strip()]
+    unknown = [sig for sig in sig_types if sig not in SIG_TYPES]
+    if unknown or not sig_types:
+        raise argparse.ArgumentTypeError(
+            f"unknown signature type(s) {', '.join(unknown) or '(none given)'}; choose from {', '.join(SIG_TYPES)}")
+    return sig_types
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision ATM fleet keys into certs/")
+    parser.add_argument("manifest", nargs="?", help="fleet manifest (JSON)")
+    parser.add_argument("--count", type=int, help="provision COUNT ATMs named PREFIX1..PREFIXn instead of a manifest")
+    parser.add_argument("--prefix", default="atm")
+    parser.add_argument("--sig-types", type=sig_type_list, default="rsa,dsa",
+                        help=f"signature types for --count, comma-separated ({', '.join(SIG_TYPES)})")
+    parser.add_argument("--certs", default="certs")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="regenerate keys that already exist")
+    args = parser.parse_args()
+
+    if args.manifest:
+        jobs = load_manifest(args.manifest)
+    elif args.count:
+        jobs = [(f"{args.prefix}{i}", sig) for i in range(1, args.count + 1) for sig in args.sig_types]
+    else:
+        parser.error("give a manifest or --count")
+
+    generated, elapsed = provision(jobs, args.certs, args.workers, args.force)
+    rate = generated / elapsed if elapsed else 0.0
+    print(f"Generated {generated} keys ({len(jobs) - generated} already present) "
+          f"in {elapsed:.1f}s: {rate:.1f} keys/s")
+    print(f"Index written to {os.path.join(args.certs, KEY_INDEX)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+End-of-day statement and reconciliation over the bank's transaction records.
+
+Streams the transaction records, adds up deposits, withdrawals and net per
+account and per ATM, and checks every stored balance against its opening
+balance plus the net of all activity seen so far. Exactly one source is
+read, and it must be the ledger of the bank whose balances are checked:
+
+  --log      bank_server's transaction log (logs/transactions.log plus the
+             segments it was rotated into); lines name the ATM and account
+  --history  bank_api's per-account history (utils/history_store.py, under
+             history/ next to its user_db.json); entries name the account only
+
+Files are memory-mapped and scanned a fixed-size chunk at a time, so memory
+use depends on the number of accounts and ATMs, not on the amount of log.
+A checkpoint keeps the running totals and how far the source has been read,
+so a nightly run only reads what was appended since. Log files are
+recognised by inode, so a log segment rotated since the last run is picked
+up where the active file was left. History is only ever appended to the
+newest segment of an account, so each account keeps a high-water mark
+(segment, offset) instead: older segments are skipped without being opened.
+The first run takes opening balances from --opening (a user_db.json-style
+file); accounts missing from it open at 0.
+
+    python reconcile.py --log logs/transactions.log --balances user_db.json \\
+        --opening user_db.start.json --statement statement.csv
+    python reconcile.py --history history --balances user_db.json --opening user_db.start.json
+"""
+import argparse
+import csv
+import json
+import mmap
+import os
+import re
+import sys
+import time
+
+from utils.account_store import AccountStore
+
+CHUNK_BYTES = 4 * 1024 * 1024
+
+# "[2025-01-31 12:00:00] atm1 124356: Deposited $100" (bank_server.log_transaction)
+_LOG_ENTRY = re.compile(rb"^\[[^\]\n]*\] (\S+) (\S+): (Deposited|Withdrew) \$(\d+)\r?$", re.M)
+# {"seq":1,"ts":1700000000.0,"action":"deposit","amount":100} (TransactionManager)
+_HISTORY_ENTRY = re.compile(rb'"ts":([^,]+),"action":"(deposit|withdraw)","amount":(\d+)')
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+_HEAD_BYTES = 64
+
+
+def scan(path, start, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield (chunk, end) over the complete lines of a file from byte offset
+    `start`, about chunk_bytes at a time through a read-only memory map; `end`
+    is the offset just past the chunk. A partial last line is left for the
+    next run.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= start:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            pos = start
+            while True:
+                cut = mm.rfind(b"\n", pos, min(pos + chunk_bytes, size))
+                if cut < 0:
+                    cut = mm.find(b"\n", pos + chunk_bytes, size)   # a line longer than a chunk
+                    if cut < 0:
+                        return
+                yield mm[pos:cut + 1], cut + 1
+                pos = cut + 1
+
+
+def file_identity(path):
+    # (inode key, first bytes): survives the rename when a log is rotated
+    st = os.stat(path)
+    with open(path, "rb") as f:
+        head = f.read(_HEAD_BYTES).hex()
+    return f"{st.st_dev}:{st.st_ino}", head
+
+
+def log_files(path):
+    """The active transaction log and its rotated segments, oldest first."""
+    directory = os.path.dirname(path) or "."
+    base, ext = os.path.splitext(os.path.basename(path))
+    try:
+        names = sorted(n for n in os.listdir(directory)
+                       if n.startswith(base + ".") and n.endswith(ext) and n != base + ext)
+    except FileNotFoundError:
+        return []
+    files = [os.path.join(directory, n) for n in names]
+    return files + [path] if os.path.exists(path) else files
+
+
+def history_accounts(root):
+    """(account, directory) of every account under a HistoryStore root."""
+    try:
+        dirs = sorted(os.listdir(root))
+    except FileNotFoundError:
+        return
+    for name in dirs:
+        account = name
+        if name.startswith("x"):
+            # HistoryStore keeps IDs with unsafe characters as "x" + hex
+            try:
+                decoded = bytes.fromhex(name[1:]).decode()
+                if not _SAFE_ID.match(decoded):
+                    account = decoded
+            except ValueError:
+                pass
+        directory = os.path.join(root, name)
+        if os.path.isdir(directory):
+            yield account, directory
+
+
+def history_segments(directory, since=0):
+    """Bucket numbers of an account's segments from bucket `since` on, oldest first."""
+    return sorted(b for b in (int(n[:-6]) for n in os.listdir(directory) if n.endswith(".jsonl")) if b >= since)
+
+
+class Reconciler:
+    """
+    Running per-account and per-ATM totals with per-file read offsets (log)
+    or per-account high-water marks (history), persisted together in a
+    checkpoint file.
+    """
+
+    def __init__(self, checkpoint_path, full=False):
+        self.checkpoint_path = checkpoint_path
+        state = {}
+        if not full and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") != 2:
+                raise ValueError(f"{checkpoint_path} is from an older version; rerun with --full")
+        self.source = state.get("source")
+        self.previous_files = state.get("files", {})
+        self.files = {}
+        # account -> [segment bucket, offset] read up to in its history
+        self.history = state.get("history", {})
+        # name -> [deposits, withdrawals], since the first run
+        self.accounts = state.get("accounts", {})
+        self.atms = state.get("atms", {})
+        self.opening = state.get("opening")
+        self.runs = state.get("runs", 0)
+        # This run's new activity; byte keys while scanning, decoded once at the end
+        self.run_accounts = {}
+        self.run_atms = {}
+        self.bytes_read = 0
+        self.entries = 0
+
+    def _start(self, path):
+        # Offset to resume a file from, if the checkpoint has seen this file
+        key, head = file_identity(path)
+        seen = self.previous_files.get(key)
+        offset = 0
+        if seen and seen["head"] == head[:len(seen["head"])] and seen["offset"] <= os.path.getsize(path):
+            offset = seen["offset"]
+        return key, offset
+
+    def _done(self, path, key, offset):
+        self.files[key] = {"file": os.path.relpath(path), "offset": offset,
+                           "head": file_identity(path)[1]}
+
+    @staticmethod
+    def _add(table, key, column, amount):
+        totals = table.get(key)
+        if totals is None:
+            totals = table[key] = [0, 0]
+        totals[column] += amount
+
+    def scan_log(self, path):
+        key, offset = self._start(path)
+        run_accounts, run_atms = self.run_accounts, self.run_atms
+        for chunk, offset in scan(path, offset):
+            self.bytes_read += len(chunk)
+            for atm_id, user_id, action, amount in _LOG_ENTRY.findall(chunk):
+                column = 0 if action == b"Deposited" else 1
+                self._add(run_accounts, user_id, column, int(amount))
+                self._add(run_atms, atm_id, column, int(amount))
+                self.entries += 1
+        self._done(path, key, offset)
+
+    def scan_history(self, account, directory):
+        mark_bucket, mark_offset = self.history.get(account, (0, 0))
+        user_id = account.encode()
+        run_accounts = self.run_accounts
+        for bucket in history_segments(directory, mark_bucket):
+            path = os.path.join(directory, f"{bucket}.jsonl")
+            offset = mark_offset if bucket == mark_bucket else 0
+            if offset > os.path.getsize(path):
+                offset = 0   # rewritten since (e.g. the account moved shards and back)
+            for chunk, offset in scan(path, offset):
+                self.bytes_read += len(chunk)
+                for ts, action, amount in _HISTORY_ENTRY.findall(chunk):
+                    if ts == b"0":
+                        continue   # legacy activity imported at ts 0: already in opening balances
+                    self._add(run_accounts, user_id, 0 if action == b"deposit" else 1, int(amount))
+                    self.entries += 1
+            mark_bucket, mark_offset = bucket, offset
+        self.history[account] = [mark_bucket, mark_offset]
+
+    def finish_scan(self):
+        # Decode this run's keys and fold them into the running totals.
+        self.run_accounts = {k.decode(): v for k, v in self.run_accounts.items()}
+        self.run_atms = {k.decode(): v for k, v in self.run_atms.items()}
+        for run, total in ((self.run_accounts, self.accounts), (self.run_atms, self.atms)):
+            for name, (deposits, withdrawals) in run.items():
+                totals = total.setdefault(name, [0, 0])
+                totals[0] += deposits
+                totals[1] += withdrawals
+
+    def reconcile(self, balances):
+        """
+        Yield (account, opening, expected, balance) for every account with a
+        stored balance or any activity; balance is None if it has no record.
+        """
+        opening = self.opening or {}
+        for user_id, balance in balances.balances():
+            deposits, withdrawals = self.accounts.get(user_id, (0, 0))
+            start = opening.get(user_id, 0)
+            yield user_id, start, start + deposits - withdrawals, balance
+        for user_id, (deposits, withdrawals) in self.accounts.items():
+            if user_id not in balances:
+                start = opening.get(user_id, 0)
+                yield user_id, start, start + deposits - withdrawals, None
+
+    def save(self):
+        state = {"version": 2, "source": self.source, "runs": self.runs + 1, "saved": time.time(),
+                 "opening": self.opening, "files": self.files, "history": self.history,
+                 "accounts": self.accounts, "atms": self.atms}
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+def write_statement(path, reconciler, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        out = csv.writer(f)
+        out.writerow(["kind", "id", "deposits_today", "withdrawals_today", "net_today",
+                      "deposits_total", "withdrawals_total", "net_total", "opening", "expected", "balance", "status"])
+        for user_id, start, expected, balance in rows:
+            today = reconciler.run_accounts.get(user_id, (0, 0))
+            total = reconciler.accounts.get(user_id, (0, 0))
+            status = "missing" if balance is None else "ok" if balance == expected else "mismatch"
+            out.writerow(["account", user_id, today[0], today[1], today[0] - today[1],
+                          total[0], total[1], total[0] - total[1], start, expected,
+                          "" if balance is None else balance, status])
+        for atm_id, total in sorted(reconciler.atms.items()):
+            today = reconciler.run_atms.get(atm_id, (0, 0))
+            out.writerow(["atm", atm_id, today[0], today[1], today[0] - today[1],
+                          total[0], total[1], total[0] - total[1], "", "", "", ""])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-of-day statement and balance reconciliation")
+    # No default source: bank_server's log and bank_api's history belong to different banks
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log", help="bank_server transaction log, e.g. logs/transactions.log")
+    source.add_argument("--history", help="bank_api history root, e.g. history")
+    parser.add_argument("--balances", default="user_db.json", help="account snapshot (journal read alongside)")
+    parser.add_argument("--opening", help="opening balances for the first run (user_db.json format)")
+    parser.add_argument("--checkpoint", default="reconcile_checkpoint.json")
+    parser.add_argument("--statement", help="write per-account and per-ATM totals to this CSV")
+    parser.add_argument("--full", action="store_true", help="ignore the checkpoint and read everything")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        reconciler = Reconciler(args.checkpoint, full=args.full)
+    except ValueError as e:
+        parser.error(str(e))
+    source = "log" if args.log else "history"
+    if reconciler.source not in (None, source):
+        parser.error(f"{args.checkpoint} holds totals from --{reconciler.source}; "
+                     f"use another --checkpoint or --full to start over")
+    reconciler.source = source
+    if reconciler.opening is None:
+        reconciler.opening = dict(AccountStore.read_users(args.opening).balances()) if args.opening else {}
+
+    if args.log:
+        for path in log_files(args.log):
+            reconciler.scan_log(path)
+    else:
+        for account, directory in history_accounts(args.history):
+            reconciler.scan_history(account, directory)
+    reconciler.finish_scan()
+    elapsed = time.perf_counter() - start
+
+    balances = AccountStore.read_users(args.balances)
+    if args.statement:
+        write_statement(args.statement, reconciler, reconciler.reconcile(balances))
+    checked = mismatched = missing = 0
+    for user_id, _, expected, balance in reconciler.reconcile(balances):
+        checked += 1
+        if balance is None:
+            missing += 1
+        elif balance != expected:
+            mismatched += 1
+            if mismatched <= 20:
+                print(f"[MISMATCH] {user_id}: stored ${balance}, expected ${expected}")
+    reconciler.save()
+
+    deposits = sum(d for d, _ in reconciler.run_accounts.values())
+    withdrawals = sum(w for _, w in reconciler.run_accounts.values())
+    rate = reconciler.bytes_read / elapsed / 1e6 if elapsed else 0.0
+    print(f"Read {reconciler.bytes_read / 1e6:.1f} MB ({reconciler.entries} entries) "
+          f"in {elapsed:.2f}s: {rate:.0f} MB/s")
+    print(f"Today: deposits ${deposits}, withdrawals ${withdrawals}, net ${deposits - withdrawals}; "
+          f"{len(reconciler.run_accounts)} accounts, {len(reconciler.run_atms)} ATMs active")
+    print(f"Checked {checked} accounts: {mismatched} mismatched, {missing} without a stored balance")
+    return 1 if mismatched or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Let the tests import the repository's modules however pytest is started
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
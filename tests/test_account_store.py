@@ -0,0 +1,25 @@
+import pytest
+
+from utils.account_store import AccountStore
+
+
+def test_non_string_ids_rejected(tmp_path):
+    store = AccountStore(str(tmp_path / "user_db.json"))
+    for user_id, password in ((5, "pw"), (None, "pw"), ("100001", 1234)):
+        with pytest.raises(ValueError):
+            store.create_user(user_id, password)
+    store.close()
+
+
+def test_snapshot_reopens(tmp_path):
+    path = str(tmp_path / "user_db.json")
+    store = AccountStore(path)
+    store.create_user("100001", "pw")
+    store.create_user('odd "id"', "pw")
+    store.deposit("100001", 70)
+    store.snapshot()
+    store.close()
+    reopened = AccountStore(path)
+    assert reopened.balance("100001") == 70
+    assert reopened.exists('odd "id"')
+    reopened.close()
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from benchmarks.load_test import USERS, build_fixture, free_port, start_bank
+from utils.bank_client import BankClient
+from utils.session_registry import SESSION_EXPIRED
+
+USER = next(iter(USERS))
+OPENING = 1000000   # build_fixture's balance for every account
+
+
+@pytest.fixture(scope="module")
+def bank(tmp_path_factory):
+    workdir = str(tmp_path_factory.mktemp("bank"))
+    build_fixture(workdir, ["atm1", "ops1"])
+    port = free_port()
+    os.environ["BANK_BACKOFFICE_ATMS"] = "ops1"
+    try:
+        proc = start_bank("api", workdir, port)
+    finally:
+        del os.environ["BANK_BACKOFFICE_ATMS"]
+    yield f"http://127.0.0.1:{port}/api", os.path.join(workdir, "certs")
+    proc.terminate()
+    proc.wait()
+
+
+def balance(url, certs):
+    client = BankClient(url, certs_dir=certs, use_sessions=False)
+    assert client.login("atm1", USER, USERS[USER], "ed25519")["status"] == "ok"
+    message = client.send_command("atm1", USER, "balance", "ed25519")["message"]
+    client.send_command("atm1", USER, "quit", "ed25519")
+    return int(message.split("$")[1])
+
+
+def test_batch_without_session_may_only_deposit(bank):
+    url, certs = bank
+    client = BankClient(url, certs_dir=certs)
+    before = balance(url, certs)
+    reply = client.send_batch("atm1", [(USER, "withdraw"), (USER, "deposit"), (USER, "balance")], "ed25519")
+    assert reply["status"] == "ok"
+    assert reply["results"] == [{"status": "fail", "message": SESSION_EXPIRED},
+                                {"status": "ok", "message": "Deposited $100"},
+                                {"status": "fail", "message": SESSION_EXPIRED}]
+    assert balance(url, certs) == before + 100
+
+
+def test_batch_runs_under_the_accounts_session(bank):
+    url, certs = bank
+    client = BankClient(url, certs_dir=certs, use_sessions=False)
+    before = balance(url, certs)
+    assert client.login("atm1", USER, USERS[USER], "ed25519")["status"] == "ok"
+    reply = client.send_batch("atm1", [(USER, "withdraw")], "ed25519")
+    assert reply["results"] == [{"status": "ok", "message": "Withdrew $50"}]
+    # A handle stops working once its session ends
+    handle = client._handles[("atm1", USER)]
+    client.send_command("atm1", USER, "quit", "ed25519")
+    client._handles[("atm1", USER)] = handle
+    reply = client.send_batch("atm1", [(USER, "withdraw")], "ed25519")
+    assert reply["results"] == [{"status": "fail", "message": SESSION_EXPIRED}]
+    assert balance(url, certs) == before - 50
+
+
+def test_backoffice_atm_needs_no_session(bank):
+    url, certs = bank
+    client = BankClient(url, certs_dir=certs)
+    before = balance(url, certs)
+    reply = client.send_batch("ops1", [(USER, "withdraw")], "ed25519")
+    assert reply["results"] == [{"status": "ok", "message": "Withdrew $50"}]
+    assert balance(url, certs) == before - 50
@@ -0,0 +1,84 @@
+import pytest
+
+from utils.account_store import AccountStore
+from utils.history_store import HistoryStore
+from utils.transactions import TransactionManager, DEPOSIT_AMOUNT
+
+USERS = [f"{100000 + i}" for i in range(8)]
+
+
+def open_bank(tmp_path, **store_options):
+    history = HistoryStore(str(tmp_path / "history"))
+    store = AccountStore(str(tmp_path / "user_db.json"), history=history, **store_options)
+    return store, TransactionManager(store, history, stripes=4)
+
+
+@pytest.fixture
+def bank(tmp_path):
+    store, txn = open_bank(tmp_path)
+    for user_id in USERS:
+        store.create_user(user_id, "pw")
+    yield store, txn
+    store.close()
+
+
+def test_batch_is_all_or_nothing(bank):
+    store, txn = bank
+    store.deposit(USERS[0], 100)
+    with pytest.raises(ValueError):
+        store.apply_batch([{"op": "deposit", "user_id": USERS[1], "amount": 500},
+                           {"op": "withdraw", "user_id": USERS[0], "amount": 150}])
+    assert store.balance(USERS[0]) == 100
+    assert store.balance(USERS[1]) == 0
+
+    results = txn.execute_batch([(USERS[0], "deposit"), ("999999", "deposit"), (USERS[0], "withdraw")])
+    assert results == [(True, "Deposited $100"), (False, "User not found"), (True, "Withdrew $50")]
+    assert store.balance(USERS[0]) == 150
+
+
+def test_torn_batch_record_is_not_replayed(tmp_path, bank):
+    store, txn = bank
+    txn.execute_batch([(USERS[0], "deposit"), (USERS[1], "deposit")])
+    store.close()
+    with open(store.journal_path, "rb+") as f:
+        f.truncate(f.seek(0, 2) - 10)   # crash in the middle of writing the batch record
+    reopened, _ = open_bank(tmp_path)
+    assert (reopened.balance(USERS[0]), reopened.balance(USERS[1])) == (0, 0)
+    reopened.close()
+
+
+def test_keyed_batch_is_applied_once(bank):
+    store, txn = bank
+    items = [(USERS[0], "deposit"), (USERS[1], "deposit")]
+    first = txn.execute_batch(items, ("atm1", "b1"), "atm1")
+    assert txn.execute_batch(items, ("atm1", "b1"), "atm1") == first
+    # The same batch id from another ATM is another batch
+    txn.execute_batch(items, ("atm2", "b1"), "atm2")
+    assert store.balance(USERS[0]) == 2 * DEPOSIT_AMOUNT
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_batch_dedup_survives_restart(tmp_path, bank, compact):
+    store, txn = bank
+    items = [(USERS[0], "deposit")]
+    first = txn.execute_batch(items, ("atm1", "b1"), "atm1")
+    if compact:
+        store.snapshot()   # the key must travel in the snapshot, not only the journal
+    store.close()
+
+    reopened, txn = open_bank(tmp_path)
+    assert txn.execute_batch(items, ("atm1", "b1"), "atm1") == first
+    assert reopened.balance(USERS[0]) == DEPOSIT_AMOUNT
+    reopened.close()
+
+
+def test_batch_keys_are_remembered_per_atm(tmp_path):
+    store, txn = open_bank(tmp_path, batches_per_atm=2)
+    store.create_user(USERS[0], "pw")
+    txn.execute_batch([(USERS[0], "deposit")], ("atm1", "b1"), "atm1")
+    # Other ATMs' traffic does not push out atm1's key
+    for n in range(5):
+        txn.execute_batch([(USERS[0], "deposit")], ("atm2", f"b{n}"), "atm2")
+    assert store.batch_results(("atm1", "b1")) is not None
+    assert store.batch_results(("atm2", "b0")) is None
+    store.close()
@@ -0,0 +1,48 @@
+from utils.replay_cache import ReplayCache, new_nonce, bind_freshness
+
+NOW = 1_700_000_000
+
+
+def test_fresh_nonce_accepted_once():
+    cache = ReplayCache(max_skew=120, capacity=1000)
+    nonce = new_nonce()
+    assert cache.check("atm1", nonce, NOW, now=NOW) is None
+    assert cache.check("atm1", nonce, NOW, now=NOW + 1) == "replay"
+    # Nonces are per ATM
+    assert cache.check("atm2", nonce, NOW, now=NOW + 1) is None
+
+
+def test_stale_or_malformed_requests_rejected():
+    cache = ReplayCache(max_skew=120, capacity=1000)
+    assert cache.check("atm1", new_nonce(), NOW - 121, now=NOW) == "stale"
+    assert cache.check("atm1", new_nonce(), NOW + 121, now=NOW) == "stale"
+    assert cache.check("atm1", None, NOW, now=NOW) == "stale"
+    assert cache.check("atm1", "not-hex" * 5, NOW, now=NOW) == "stale"
+    assert cache.check("atm1", new_nonce(), "soon", now=NOW) == "stale"
+
+
+def test_nonce_remembered_while_its_timestamp_is_acceptable():
+    cache = ReplayCache(max_skew=120, capacity=1000)
+    cache._rotated_at = NOW
+    nonce = new_nonce()
+    assert cache.check("atm1", nonce, NOW, now=NOW) is None
+    # Still a replay at the edge of the skew window, after rotations
+    assert cache.check("atm1", nonce, NOW, now=NOW + 120) == "replay"
+    assert cache.check("atm1", nonce, NOW + 240, now=NOW + 240) == "replay"
+    # Long after, the timestamp alone rejects it
+    assert cache.check("atm1", nonce, NOW, now=NOW + 1000) == "stale"
+
+
+def test_bound_message_covers_session():
+    assert bind_freshness(b"deposit", "n", 1, "s1") != bind_freshness(b"deposit", "n", 1, "s2")
+    assert bind_freshness(b"deposit", "n", 1) == b"deposit|n|1"
+
+
+def test_lookup_without_record_leaves_nonce_fresh():
+    cache = ReplayCache(max_skew=120, capacity=1000)
+    nonce = new_nonce()
+    # Requests rejected before their signature verified never record the nonce
+    for _ in range(3):
+        assert cache.check("atm1", nonce, NOW, now=NOW, record=False) is None
+    assert cache.check("atm1", nonce, NOW, now=NOW) is None
+    assert cache.check("atm1", nonce, NOW, now=NOW, record=False) == "replay"
@@ -0,0 +1,36 @@
+from utils.session_crypto import SessionChannel, new_session_key, REPLAY_WINDOW
+
+
+def channel_pair():
+    key = new_session_key()
+    return SessionChannel("s1", key), SessionChannel("s1", key)
+
+
+def test_replayed_latest_message_rejected():
+    atm, bank = channel_pair()
+    counter, sealed = atm.seal(b"balance")
+    assert bank.open(counter, sealed) == b"balance"
+    assert bank.open(counter, sealed) is None
+
+
+def test_out_of_order_within_window_accepted_once():
+    atm, bank = channel_pair()
+    messages = [atm.seal(f"m{i}".encode()) for i in range(5)]
+    for counter, sealed in (messages[4], messages[1], messages[3]):
+        assert bank.open(counter, sealed) is not None
+    assert bank.open(*messages[1]) is None
+    assert bank.open(*messages[3]) is None
+    assert bank.open(*messages[0]) == b"m0"
+
+
+def test_stale_forged_or_foreign_messages_rejected():
+    atm, bank = channel_pair()
+    old = atm.seal(b"old")
+    for _ in range(REPLAY_WINDOW):
+        bank.open(*atm.seal(b"x"))
+    assert bank.open(*old) is None
+    counter, sealed = atm.seal(b"deposit")
+    assert bank.open(counter, sealed[:-1] + bytes([sealed[-1] ^ 1])) is None
+    other = SessionChannel("s2", new_session_key())
+    assert bank.open(*other.seal(b"deposit")) is None
+    assert bank.open(0, sealed) is None
@@ -0,0 +1,46 @@
+from utils.session_registry import SessionRegistry
+
+
+def test_idle_ttl_slides_on_use():
+    sessions = SessionRegistry(ttl=10)
+    sessions.create("s1", "atm1", "100001", now=0)
+    assert sessions.get("s1", now=9).user_id == "100001"
+    assert sessions.get("s1", now=18) is not None   # renewed at 9
+    assert sessions.get("s1", now=28.5) is None
+    assert len(sessions) == 0
+
+
+def test_expired_sessions_swept_from_the_front():
+    sessions = SessionRegistry(ttl=10, sweep_batch=2)
+    for i in range(5):
+        sessions.create(f"s{i}", "atm1", "100001", now=i)
+    # Each call drops at most sweep_batch of them
+    sessions.create("late", "atm2", "100002", now=30)
+    assert len(sessions) == 4
+    sessions.get("late", now=30)
+    assert len(sessions) == 2
+    sessions.get("late", now=30)
+    assert len(sessions) == 1
+    assert sessions.atm_count("atm1") == 0
+
+
+def test_least_recently_used_evicted_when_full():
+    sessions = SessionRegistry(ttl=100, max_sessions=2)
+    sessions.create("s1", "atm1", "100001", now=0)
+    sessions.create("s2", "atm1", "100002", now=1)
+    sessions.get("s1", now=2)
+    sessions.create("s3", "atm1", "100003", now=3)
+    assert sessions.get("s2", now=3) is None
+    assert sessions.get("s1", now=3) is not None
+    assert sessions.stats()["evicted"] == 1
+
+
+def test_session_bound_to_its_atm_and_logout():
+    sessions = SessionRegistry(ttl=100)
+    sessions.create("s1", "atm1", "100001", now=0)
+    sessions.create("s2", "atm1", "100002", now=0)
+    assert sessions.get("s1", "atm2", now=1) is None
+    assert sessions.get("s1", "atm1", now=1) is not None
+    assert sessions.logout("s1") and not sessions.logout("s1")
+    assert sessions.logout_atm("atm1") == 1
+    assert sessions.get("s2", now=1) is None
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from utils.sharding import ShardRouter, open_shard, load_state
+
+USERS = [f"{100000 + i}" for i in range(150)]
+
+
+def close(router):
+    for shard in router.shards.values():
+        shard.store.close()
+
+
+def populated(tmp_path):
+    state_path = str(tmp_path / "shard_state.json")
+    specs = {"s1": str(tmp_path / "s1"), "s2": str(tmp_path / "s2")}
+    router = ShardRouter.restore(state_path, specs, open_shard)
+    for i, user_id in enumerate(USERS):
+        assert router.create_user(user_id, "pw")
+        for _ in range(i % 3):
+            router.execute(user_id, "deposit")
+    return router, state_path, specs
+
+
+def expected_balances(router):
+    return {user_id: router.balance(user_id) for user_id in USERS}
+
+
+def assert_consistent(router, balances):
+    for user_id in USERS:
+        holders = [name for name, shard in router.shards.items() if shard.store.exists(user_id)]
+        assert holders == [router.ring.owner(user_id)], user_id
+        assert router.balance(user_id) == balances[user_id], user_id
+
+
+def test_add_shard_moves_only_new_owner_accounts(tmp_path):
+    router, state_path, _ = populated(tmp_path)
+    balances = expected_balances(router)
+    moved = router.add_shard(open_shard("s3", str(tmp_path / "s3")), progress_every=0)
+    assert 0 < moved < len(USERS)
+    assert_consistent(router, balances)
+    state = load_state(state_path)
+    assert sorted(state["shards"]) == ["s1", "s2", "s3"]
+    assert state["migration"]["done"]
+    close(router)
+
+
+@pytest.mark.parametrize("fail_in", ["import_account", "drop_account"])
+def test_interrupted_migration_is_finished_on_restart(tmp_path, fail_in):
+    router, state_path, specs = populated(tmp_path)
+    balances = expected_balances(router)
+    target = open_shard("s3", str(tmp_path / "s3"))
+
+    # Crash partway through the move, after a few accounts: between the
+    # export and the import, or between the import and the drop
+    calls = []
+
+    def crash(original):
+        def call(user_id, *args):
+            calls.append(user_id)
+            if len(calls) == 10:
+                raise RuntimeError("crash")
+            return original(user_id, *args)
+        return call
+
+    if fail_in == "import_account":
+        target.txn.import_account = crash(target.txn.import_account)
+    else:
+        for shard in router.shards.values():
+            shard.txn.drop_account = crash(shard.txn.drop_account)
+    with pytest.raises(RuntimeError):
+        router.add_shard(target, progress_every=0)
+    assert not load_state(state_path)["migration"]["done"]
+    close(router)
+    target.store.close()
+
+    restored = ShardRouter.restore(state_path, specs, open_shard)
+    assert sorted(restored.shards) == ["s1", "s2", "s3"]
+    assert restored.status()["migration"]["done"]
+    assert_consistent(restored, balances)
+    assert sorted(load_state(state_path)["shards"]) == ["s1", "s2", "s3"]
+    close(restored)
+
+
+def test_batch_retry_after_migration_is_not_applied_again(tmp_path):
+    router, _, _ = populated(tmp_path)
+    items = [(user_id, "deposit") for user_id in USERS]
+    first = router.execute_batch(items, ("atm1", "b1"), "atm1")
+    balances = expected_balances(router)
+
+    router.add_shard(open_shard("s3", str(tmp_path / "s3")), progress_every=0)
+    assert router.execute_batch(items, ("atm1", "b1"), "atm1") == first
+    assert_consistent(router, balances)
+    close(router)
+
+
+def test_start_add_shard_checks_before_starting(tmp_path):
+    router, _, _ = populated(tmp_path)
+    taken = open_shard("s2", str(tmp_path / "s2b"))
+    with pytest.raises(ValueError):
+        router.start_add_shard(taken)
+    taken.store.close()
+
+    release = threading.Event()
+    target = open_shard("s3", str(tmp_path / "s3"))
+    import_account = target.txn.import_account
+
+    def slow_import(user_id, account):
+        release.wait()
+        return import_account(user_id, account)
+
+    target.txn.import_account = slow_import
+    router.start_add_shard(target, progress_every=0)
+    # A second shard cannot start while the first is still moving accounts
+    busy = open_shard("s4", str(tmp_path / "s4"))
+    with pytest.raises(ValueError):
+        router.start_add_shard(busy)
+    busy.store.close()
+    release.set()
+    while not router.status()["migration"]["done"]:
+        time.sleep(0.01)
+    assert router.ring.shards() == ["s1", "s2", "s3"]
+    close(router)
@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+from utils.account_store import AccountStore
+from utils.history_store import HistoryStore
+from utils.transactions import TransactionManager, StripedLock, DEPOSIT_AMOUNT, WITHDRAW_AMOUNT
+
+USERS = [f"{100000 + i}" for i in range(8)]
+
+
+def open_bank(tmp_path, **store_options):
+    history = HistoryStore(str(tmp_path / "history"))
+    store = AccountStore(str(tmp_path / "user_db.json"), history=history, **store_options)
+    return store, TransactionManager(store, history, stripes=4)
+
+
+@pytest.fixture
+def bank(tmp_path):
+    store, txn = open_bank(tmp_path)
+    for user_id in USERS:
+        store.create_user(user_id, "pw")
+    yield store, txn
+    store.close()
+
+
+def run_threads(target, count):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_striped_lock_multi_key_holders_do_not_deadlock():
+    locks = StripedLock(4)
+    # Two holders taking the same keys in opposite orders must not deadlock
+    def hold(i):
+        keys = ("a", "b", "c") if i % 2 else ("c", "b", "a")
+        for _ in range(2000):
+            with locks.hold(*keys):
+                pass
+    run_threads(hold, 4)
+
+
+def test_concurrent_commands_lose_no_updates(tmp_path, bank):
+    store, txn = bank
+    rounds = 80
+
+    def work(i):
+        for n in range(rounds):
+            user_id = USERS[(i + n) % len(USERS)]
+            txn.execute(user_id, "deposit")
+            txn.execute(user_id, "deposit")
+            txn.execute(user_id, "withdraw")
+
+    run_threads(work, 8)
+    per_account = 8 * rounds // len(USERS) * (2 * DEPOSIT_AMOUNT - WITHDRAW_AMOUNT)
+    assert [store.balance(u) for u in USERS] == [per_account] * len(USERS)
+
+    # The journal replays to the same balances
+    store.close()
+    reopened, _ = open_bank(tmp_path)
+    assert [reopened.balance(u) for u in USERS] == [per_account] * len(USERS)
+    reopened.close()
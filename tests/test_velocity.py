@@ -0,0 +1,44 @@
+import pytest
+
+from utils.velocity import VelocityCheck, parse_rules
+
+
+def check(spec, window=600.0):
+    return VelocityCheck(parse_rules(spec), window=window, buckets=10)
+
+
+def test_amount_limit_rejects_within_window_and_recovers_after():
+    velocity = check("account_amount>100:reject")
+    assert velocity.screen("u1", "atm1", 50, now=0) == (None, None)
+    assert velocity.screen("u1", "atm1", 50, now=10) == (None, None)
+    assert velocity.screen("u1", "atm1", 50, now=20) == ("reject", "account_amount>100")
+    # A rejected withdrawal is not counted; other accounts are separate
+    assert velocity.screen("u2", "atm1", 50, now=20) == (None, None)
+    # Once the first withdrawals slide out of the window, the account may withdraw again
+    assert velocity.screen("u1", "atm1", 50, now=615) == (None, None)
+
+
+def test_count_and_distinct_atm_rules():
+    velocity = check("account_count>2:flag,account_atms>2:reject")
+    assert velocity.screen("u1", "atm1", 10, now=0)[0] is None
+    assert velocity.screen("u1", "atm2", 10, now=1)[0] is None
+    assert velocity.screen("u1", "atm3", 10, now=2) == ("reject", "account_atms>2")
+    assert velocity.screen("u1", "atm1", 10, now=3) == ("flag", "account_count>2")
+    assert velocity.recent_flags()[0]["rule"] == "account_count>2"
+    assert velocity.stats()["rejected"] == {"account_atms>2": 1}
+
+
+def test_atm_window_across_accounts():
+    velocity = check("atm_count>3:reject", window=60.0)
+    for i in range(3):
+        assert velocity.screen(f"u{i}", "atm1", 10, now=i)[0] is None
+    assert velocity.screen("u9", "atm1", 10, now=5)[0] == "reject"
+    assert velocity.screen("u9", "atm1", 10, now=70)[0] is None
+
+
+def test_non_positive_amount_and_empty_spec():
+    with pytest.raises(ValueError):
+        check("account_amount>100").screen("u1", "atm1", 0, now=0)
+    assert VelocityCheck.from_spec("  ") is None
+    with pytest.raises(ValueError):
+        parse_rules("account_amount100")
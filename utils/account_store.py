@@ -0,0 +1,398 @@
+import os
+import json
+import copy
+import threading
+import time
+from collections import OrderedDict
+from utils.account_table import AccountTable
+
+# Account storage engine for the bank API.
+#
+# Accounts live in memory in a compact AccountTable (utils/account_table.py)
+# and snapshots are streamed from a copy of it. Every mutation is appended to a JSON-lines journal
+# and made durable by a background flusher that fsyncs once per batch (group
+# commit). Periodically the in-memory state is written out as a snapshot and
+# the journal is compacted. On startup the state is rebuilt from the snapshot
+# plus the journal tail. Reads never touch the disk.
+#
+# Transaction history is not part of the account record; it lives in a
+# HistoryStore (utils/history_store.py). Legacy records that still carry an
+# unbounded "activity" list keep it beside the table until it is moved into
+# the history store on startup.
+#
+# Batches sent with a key (ATM id, batch id) carry the key and their results
+# in their journal record, and the last few keys of every ATM are kept with
+# the snapshot, so a batch resent after a lost response is recognized across
+# restarts and compactions. Keys are remembered per ATM so that traffic from
+# other ATMs cannot push out a key whose ATM is still retrying.
+
+
+class AccountStore:
+    """
+    In-memory account table backed by a snapshot file and an append-only journal.
+    """
+
+    def __init__(self, snapshot_path, journal_path=None, sync_interval=0.005,
+                 snapshot_every=10000, durable=True, history=None, batches_per_atm=8):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.sync_interval = sync_interval
+        self.snapshot_every = snapshot_every
+        self.durable = durable
+        self.batches_per_atm = batches_per_atm
+
+        self.users = AccountTable()
+        self._batches = {}           # atm_id -> OrderedDict(batch key -> [(user_id, ok, message)]), oldest first
+        self._batch_keys = {}        # user_id -> keys in self._batches with results for the account
+        self._legacy_activity = {}   # user_id -> activity list not yet in the history store
+        self._seq = 0            # last journal sequence number assigned
+        self._synced_seq = 0     # last sequence number known to be on disk
+        self._since_snapshot = 0
+
+        self._lock = threading.Lock()              # guards users + journal writes
+        self._io_lock = threading.Lock()           # serializes fsync and journal rotation
+        self._synced = threading.Condition(self._lock)
+        self._pending = threading.Event()
+        self._snapshotting = False
+        self._closed = False
+
+        self._recover()
+        if history is not None:
+            self._migrate_activity(history)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="account-store-flusher", daemon=True)
+        self._flusher.start()
+
+    # ---------------------- RECOVERY ------------------------
+    @classmethod
+    def read_users(cls, snapshot_path, journal_path=None):
+        """
+        Account table as of the last journal record, read without opening the
+        store for writing (for offline tools such as reconcile.py).
+        """
+        store = cls.__new__(cls)
+        store.snapshot_path = snapshot_path
+        store.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        store.users, store._legacy_activity, store._since_snapshot = AccountTable(), {}, 0
+        store._batches, store._batch_keys, store.batches_per_atm = {}, {}, 0
+        store._load()
+        return store.users
+
+    def _recover(self):
+        self._load()
+        self._synced_seq = self._seq
+
+        if os.path.exists(self.journal_path + ".old"):
+            self._write_snapshot(self.users.copy(), self._seq, copy.deepcopy(self._legacy_activity),
+                                 self._recent_batches())
+            os.remove(self.journal_path + ".old")
+
+    def _load(self):
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # Snapshots written by the store carry their journal position;
+            # a plain user dict (legacy user_db.json) is treated as seq 0.
+            if "users" in data and "seq" in data:
+                for key, results in data.get("batches", ()):
+                    self._remember_batch(key, results)
+                data, snapshot_seq = data["users"], data["seq"]
+            self._legacy_activity = {u: user["activity"] for u, user in data.items() if "activity" in user}
+            self.users = AccountTable.from_dict(data)
+
+        self._seq = snapshot_seq
+        # A crash during compaction can leave the previous journal behind.
+        for path in (self.journal_path + ".old", self.journal_path):
+            self._replay(path, snapshot_seq)
+
+    def _migrate_activity(self, history):
+        # Move legacy per-user activity lists out of the account records; the
+        # next snapshot drops them from disk.
+        migrated = self._legacy_activity
+        self._legacy_activity = {}
+        for user_id, activity in migrated.items():
+            history.import_legacy(user_id, activity)
+        if migrated:
+            self._write_snapshot(self.users.copy(), self._seq, batches=self._recent_batches())
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+
+    def _replay(self, path, after_seq):
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn write at the tail of the journal
+                if record["seq"] <= after_seq:
+                    continue
+                self._apply(record)
+                self._seq = record["seq"]
+                self._since_snapshot += 1
+
+    # ---------------------- MUTATIONS -----------------------
+    def _apply(self, record):
+        op = record["op"]
+        if op == "batch":
+            for sub in record["records"]:
+                self._apply(sub)
+            if "key" in record:
+                self._remember_batch(record["key"], record["results"])
+            return
+        user_id = record["user_id"]
+        if op == "signup":
+            self.users.add(user_id, record["password"])
+        elif op == "import":
+            self.users.add(user_id, record["password"], record["balance"])
+            self._forget_batches(user_id)
+            for key, results in record.get("batches", ()):
+                self._remember_batch(key, results)
+        elif op == "delete":
+            self.users.remove(user_id)
+            self._forget_batches(user_id)
+            self._legacy_activity.pop(user_id, None)
+        elif op in ("deposit", "withdraw"):
+            self.users.adjust(user_id, record["amount"] if op == "deposit" else -record["amount"])
+            if user_id in self._legacy_activity:  # not yet migrated to the history store
+                self._legacy_activity[user_id].append({"action": op, "amount": record["amount"]})
+        else:
+            raise ValueError(f"Unknown journal op: {op}")
+
+    def _remember_batch(self, key, results):
+        # Caller holds self._lock (or is recovering). Keys and results come
+        # back from JSON as lists. Results are (user_id, ok, message); a key
+        # seen again adds the results of more accounts (another part of the
+        # same batch, or accounts moved here from another shard).
+        key = tuple(key)
+        if self.batches_per_atm <= 0:
+            return
+        recent = self._batches.setdefault(key[0], OrderedDict())
+        recent.setdefault(key, []).extend(tuple(result) for result in results)
+        recent.move_to_end(key)
+        for result in results:
+            self._batch_keys.setdefault(result[0], set()).add(key)
+        while len(recent) > self.batches_per_atm:
+            old_key, old_results = recent.popitem(last=False)
+            for user_id in {result[0] for result in old_results}:
+                self._batch_keys[user_id].discard(old_key)
+                if not self._batch_keys[user_id]:
+                    del self._batch_keys[user_id]
+
+    def _forget_batches(self, user_id):
+        # Caller holds self._lock (or is recovering)
+        for key in self._batch_keys.pop(user_id, ()):
+            recent = self._batches[key[0]]
+            recent[key] = [result for result in recent[key] if result[0] != user_id]
+
+    def _recent_batches(self):
+        # Caller holds self._lock. [[key, results], ...] for the snapshot.
+        return [[list(key), results] for recent in self._batches.values() for key, results in recent.items()]
+
+    def _commit(self, record):
+        # Caller holds self._lock. Applies the record in memory and appends it
+        # to the journal; returns the sequence number to wait on.
+        self._seq += 1
+        record["seq"] = self._seq
+        self._apply(record)
+        self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._since_snapshot += 1
+        self._pending.set()
+        return self._seq
+
+    def _wait_durable(self, seq):
+        if not self.durable:
+            return
+        with self._synced:
+            while self._synced_seq < seq and not self._closed:
+                self._synced.wait()
+
+    def create_user(self, user_id, password):
+        """Create an account; returns False if the user ID is taken."""
+        if not isinstance(user_id, str) or not isinstance(password, str):
+            raise ValueError("User ID and password must be strings")
+        with self._lock:
+            if user_id in self.users:
+                return False
+            seq = self._commit({"op": "signup", "user_id": user_id, "password": password})
+        self._wait_durable(seq)
+        return True
+
+    def deposit(self, user_id, amount):
+        """Credit an account and return the new balance."""
+        with self._lock:
+            seq = self._commit({"op": "deposit", "user_id": user_id, "amount": amount})
+            balance = self.users.balance(user_id)
+        self._wait_durable(seq)
+        return balance
+
+    def withdraw(self, user_id, amount):
+        """Debit an account; returns the new balance, or None if funds are insufficient."""
+        with self._lock:
+            if self.users.balance(user_id) < amount:
+                return None
+            seq = self._commit({"op": "withdraw", "user_id": user_id, "amount": amount})
+            balance = self.users.balance(user_id)
+        self._wait_durable(seq)
+        return balance
+
+    def apply_batch(self, records, batch_key=None, results=None):
+        """
+        Apply deposit/withdraw records all-or-nothing as one journal entry.
+
+        The batch is checked against current balances first; if any withdrawal
+        would overdraw its account, nothing is applied and ValueError is raised.
+        Waits for durability once for the whole batch. With a batch_key
+        ((atm_id, batch_id)), the key and the batch's results, one
+        (user_id, ok, message) per command, are journaled with it and
+        batch_results(batch_key) returns them from then on.
+        """
+        with self._lock:
+            balances = {}
+            for record in records:
+                user_id = record["user_id"]
+                if record["op"] not in ("deposit", "withdraw") or user_id not in self.users:
+                    raise ValueError(f"Invalid batch record: {record}")
+                balance = balances.get(user_id, self.users.balance(user_id))
+                balance += record["amount"] if record["op"] == "deposit" else -record["amount"]
+                if balance < 0:
+                    raise ValueError(f"Insufficient funds for {user_id}")
+                balances[user_id] = balance
+            record = {"op": "batch", "records": records}
+            if batch_key is not None:
+                record["key"], record["results"] = list(batch_key), results
+            seq = self._commit(record)
+        self._wait_durable(seq)
+        return balances
+
+    def import_user(self, user_id, password, balance, batches=()):
+        """
+        Create or overwrite an account with a given balance (shard migration).
+        batches are the account's keyed-batch results from its old shard
+        (see account_batches), so a retried batch is not applied again here.
+        """
+        with self._lock:
+            record = {"op": "import", "user_id": user_id, "password": password, "balance": balance}
+            if batches:
+                record["batches"] = batches
+            seq = self._commit(record)
+        self._wait_durable(seq)
+
+    def remove_user(self, user_id):
+        """Delete an account; returns False if it did not exist."""
+        with self._lock:
+            if user_id not in self.users:
+                return False
+            seq = self._commit({"op": "delete", "user_id": user_id})
+        self._wait_durable(seq)
+        return True
+
+    # ------------------------ READS -------------------------
+    def exists(self, user_id):
+        return user_id in self.users
+
+    def get_user(self, user_id):
+        """Return a copy of the account record, or None."""
+        with self._lock:
+            return self.users.get(user_id)
+
+    def check_password(self, user_id, password):
+        return self.users.check_password(user_id, password)
+
+    def balance(self, user_id):
+        return self.users.balance(user_id)
+
+    def user_ids(self):
+        with self._lock:
+            return list(self.users)
+
+    def batch_results(self, batch_key):
+        """[(user_id, ok, message)] of an applied keyed batch, or None if the key is not remembered."""
+        with self._lock:
+            results = self._batches.get(batch_key[0], {}).get(tuple(batch_key))
+            return None if results is None else list(results)
+
+    def account_batches(self, user_id):
+        """[[batch key, results]] of the remembered keyed batches that touched an account."""
+        with self._lock:
+            return [[list(key), [result for result in self._batches[key[0]][key] if result[0] == user_id]]
+                    for key in self._batch_keys.get(user_id, ())]
+
+    # ------------------ FLUSH & SNAPSHOT --------------------
+    def _flush_loop(self):
+        while not self._closed:
+            self._pending.wait()
+            # Let concurrent writers pile into the same batch.
+            if self.sync_interval:
+                time.sleep(self.sync_interval)
+            self._pending.clear()
+            self.flush()
+            if self._since_snapshot >= self.snapshot_every:
+                self.snapshot()
+
+    def flush(self):
+        """Write buffered journal records and fsync them as one batch."""
+        with self._io_lock:
+            with self._lock:
+                if self._closed or self._synced_seq == self._seq:
+                    return
+                seq = self._seq
+                self._journal.flush()
+                journal = self._journal
+            os.fsync(journal.fileno())
+        with self._synced:
+            self._synced_seq = max(self._synced_seq, seq)
+            self._synced.notify_all()
+
+    def snapshot(self):
+        """Write the current state to the snapshot file and compact the journal."""
+        with self._io_lock, self._lock:
+            if self._snapshotting:
+                return
+            self._snapshotting = True
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal.close()
+            os.replace(self.journal_path, self.journal_path + ".old")
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+            state, activity, seq = self.users.copy(), copy.deepcopy(self._legacy_activity), self._seq
+            batches = self._recent_batches()
+            self._synced_seq = seq
+            self._since_snapshot = 0
+            self._synced.notify_all()
+        try:
+            self._write_snapshot(state, seq, activity, batches)
+            os.remove(self.journal_path + ".old")
+        finally:
+            self._snapshotting = False
+
+    def _write_snapshot(self, users, seq, activity=None, batches=None):
+        # Streams the table one record at a time rather than building a dict of
+        # every account; the file is the same {"seq", "users"} JSON as before,
+        # plus the remembered batch keys.
+        activity = activity or {}
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write('{"seq": %d, "batches": %s, "users": {' % (seq, json.dumps(batches or [])))
+            separator = ""
+            for user_id, password, balance in users.records():
+                record = {"password": password, "balance": balance}
+                if user_id in activity:
+                    record["activity"] = activity[user_id]
+                f.write(f"{separator}{json.dumps(str(user_id))}: {json.dumps(record)}")
+                separator = ", "
+            f.write("}}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def close(self):
+        self.flush()
+        with self._io_lock, self._synced:
+            self._closed = True
+            self._synced.notify_all()
+            self._journal.close()
+        self._pending.set()
@@ -0,0 +1,112 @@
+from array import array
+
+# Compact in-memory account table.
+#
+# A dict of per-account dicts ({"password": ..., "balance": ...}) costs a few
+# hundred bytes per account, most of it dict and int object overhead. Here
+# each account is a slot number: the index maps user_id -> slot, passwords are
+# kept in a list by slot and balances in a signed 64-bit array by slot, so an
+# account costs one index entry, one password string and eight bytes of
+# balance. Slots freed by removed accounts are reused. Transaction history is
+# not part of the record (see utils/history_store.py).
+#
+# The table does no locking of its own; like the dict it replaces, callers
+# serialize writers (AccountStore holds its lock around every mutation).
+
+
+class AccountTable:
+    """
+    Accounts as slots in parallel columns: user_id -> slot index, password and balance by slot.
+    """
+
+    def __init__(self):
+        self._index = {}                # user_id -> slot
+        self._passwords = []            # slot -> password
+        self._balances = array("q")     # slot -> balance
+        self._free = []                 # reusable slots
+
+    @classmethod
+    def from_dict(cls, users):
+        """Build a table from a {user_id: {"password", "balance"}} dict (user_db.json format)."""
+        table = cls()
+        for user_id, user in users.items():
+            table.add(user_id, user["password"], user.get("balance", 0))
+        return table
+
+    # ----------------------- MUTATIONS ----------------------
+    def add(self, user_id, password, balance=0):
+        """Create or overwrite an account."""
+        slot = self._index.get(user_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._passwords)
+                self._passwords.append(None)
+                self._balances.append(0)
+            self._index[user_id] = slot
+        self._passwords[slot] = password
+        self._balances[slot] = balance
+
+    def remove(self, user_id):
+        """Delete an account; returns False if it did not exist."""
+        slot = self._index.pop(user_id, None)
+        if slot is None:
+            return False
+        self._passwords[slot] = None
+        self._balances[slot] = 0
+        self._free.append(slot)
+        return True
+
+    def adjust(self, user_id, amount):
+        """Add amount (negative to debit) to a balance and return the new balance."""
+        slot = self._index[user_id]
+        self._balances[slot] += amount
+        return self._balances[slot]
+
+    # ------------------------- READS ------------------------
+    def __contains__(self, user_id):
+        return user_id in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def balance(self, user_id):
+        return self._balances[self._index[user_id]]
+
+    def check_password(self, user_id, password):
+        slot = self._index.get(user_id)
+        return slot is not None and self._passwords[slot] == password
+
+    def get(self, user_id):
+        """Return the account as a {"password", "balance"} dict, or None."""
+        slot = self._index.get(user_id)
+        if slot is None:
+            return None
+        return {"password": self._passwords[slot], "balance": self._balances[slot]}
+
+    def balances(self):
+        """Yield (user_id, balance) for every account."""
+        for user_id, slot in self._index.items():
+            yield user_id, self._balances[slot]
+
+    def records(self):
+        """Yield (user_id, password, balance) for every account."""
+        for user_id, slot in self._index.items():
+            yield user_id, self._passwords[slot], self._balances[slot]
+
+    def copy(self):
+        """Independent copy of the table (columns are copied, strings shared)."""
+        table = AccountTable()
+        table._index = dict(self._index)
+        table._passwords = list(self._passwords)
+        table._balances = array("q", self._balances)
+        table._free = list(self._free)
+        return table
+
+    def to_dict(self):
+        return {user_id: {"password": password, "balance": balance}
+                for user_id, password, balance in self.records()}
@@ -0,0 +1,100 @@
+import time
+import threading
+
+# Admission control in front of the bank API's crypto path.
+#
+# A signed request costs the bank an RSA private-key decrypt and a signature
+# verify before it can tell whether the request is any good, so one
+# misbehaving ATM could use up the whole crypto pool. Requests therefore pass
+# three gates first: a token bucket per ATM, a token bucket for the whole
+# bank, and a cap on requests in flight in the crypto path. Every gate answers
+# at once; a request that is not admitted is shed with a retry-later reply
+# instead of waiting in a queue, so admitted requests keep a bounded wait.
+#
+# A limit of 0 turns that gate off. Limits are per process: with several
+# bank_api workers each one enforces them on its own share of the traffic.
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, holding at most `burst`; take() never blocks.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def take(self, now):
+        """Take a token; returns 0.0 if granted, else seconds until one is due."""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """
+    Per-ATM and global request rate limits plus an in-flight cap.
+    """
+
+    def __init__(self, atm_rate=100.0, atm_burst=200, global_rate=2000.0, global_burst=4000,
+                 max_in_flight=64):
+        self.atm_rate, self.atm_burst = atm_rate, atm_burst
+        self.max_in_flight = max_in_flight
+        now = time.monotonic()
+        self._global = TokenBucket(global_rate, global_burst, now) if global_rate else None
+        # One bucket per ATM that got past the registered-key check, so the
+        # table is bounded by the fleet
+        self._atms = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._rejected = {"atm_rate": 0, "global_rate": 0, "in_flight": 0}
+
+    def admit(self, atm_id, now=None):
+        """
+        Try to admit one request from atm_id. Returns (None, 0.0) and takes an
+        in-flight slot, to be given back with release(); or (reason, retry_after)
+        with reason "atm_rate", "global_rate" or "in_flight".
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.atm_rate:
+                bucket = self._atms.get(atm_id)
+                if bucket is None:
+                    bucket = self._atms[atm_id] = TokenBucket(self.atm_rate, self.atm_burst, now)
+                wait = bucket.take(now)
+                if wait:
+                    return self._reject("atm_rate", wait)
+            if self._global is not None:
+                wait = self._global.take(now)
+                if wait:
+                    return self._reject("global_rate", wait)
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                return self._reject("in_flight", 0.1)
+            self._in_flight += 1
+            self._admitted += 1
+            return None, 0.0
+
+    def _reject(self, reason, retry_after):
+        self._rejected[reason] += 1
+        return reason, retry_after
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "admitted": self._admitted,
+                "rejected": dict(self._rejected),
+                "atms": len(self._atms),
+            }
@@ -0,0 +1,209 @@
+import json
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.crypto_utils import (
+    load_public_key, load_key, encrypt_message, sign_with, private_key_path
+)
+from utils.session_crypto import SessionChannel, new_session_key, seal_blob
+from utils.replay_cache import new_nonce, bind_freshness
+from utils import wire
+
+# Shared ATM-side client for the bank REST API, used by both atm_client.py
+# and atm_web_ui.py. Signing keys are parsed once per (atm_id, sig_type) and
+# requests go over a pooled keep-alive session. Login returns a session
+# handle that every later command carries; commands travel over the AES-GCM
+# session channel (utils/session_crypto.py) when the bank offers one.
+
+DEFAULT_BANK_URL = "http://127.0.0.1:1200/api"
+
+
+class BankClient:
+    """
+    Signs, encrypts and sends ATM requests to the bank over a reused HTTP session.
+    """
+
+    def __init__(self, base_url=DEFAULT_BANK_URL, certs_dir="certs",
+                 timeout=(3.05, 10), retries=3, pool_size=10, use_sessions=True,
+                 wire_format="json"):
+        self.base_url = base_url
+        self.wire_format = wire_format
+        self.certs_dir = certs_dir
+        self.timeout = timeout
+        self.use_sessions = use_sessions
+
+        # Only connection failures are retried: the request never reached the
+        # bank, so re-sending a deposit or withdrawal cannot apply it twice.
+        retry = Retry(total=retries, connect=retries, read=0, status=0, backoff_factor=0.2)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.http = requests.Session()
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+
+        self._bank_pub_key = None
+        self._signing_keys = {}
+        self._handles = {}    # (atm_id, user_id) -> session handle from login
+        self._sessions = {}   # (atm_id, user_id) -> SessionChannel
+        self._lock = threading.Lock()
+
+    # ------------------------- KEYS -------------------------
+    @property
+    def bank_pub_key(self):
+        if self._bank_pub_key is None:
+            self._bank_pub_key = load_public_key(f"{self.certs_dir}/bank_public.pem")
+        return self._bank_pub_key
+
+    def signing_key(self, atm_id, sig_type):
+        """Return the ATM's parsed private key, loading it from PEM on first use."""
+        key = self._signing_keys.get((atm_id, sig_type))
+        if key is None:
+            with self._lock:
+                key = self._signing_keys.get((atm_id, sig_type))
+                if key is None:
+                    key = load_key(private_key_path(self.certs_dir, atm_id, sig_type))
+                    self._signing_keys[(atm_id, sig_type)] = key
+        return key
+
+    def sign(self, atm_id, sig_type, message):
+        return sign_with(sig_type, message, self.signing_key(atm_id, sig_type))
+
+    def sign_fresh(self, atm_id, sig_type, message, session_id=None):
+        """
+        Sign a message bound to a new nonce and the current time, so the bank
+        can reject replays, and to session_id if given, so the signature is
+        only good in that session; returns (nonce, timestamp, signature).
+        """
+        nonce, timestamp = new_nonce(), int(time.time())
+        return nonce, timestamp, self.sign(atm_id, sig_type, bind_freshness(message, nonce, timestamp, session_id))
+
+    # ----------------------- REQUESTS -----------------------
+    def _post(self, endpoint, payload):
+        # Payload byte fields are raw; JSON carries them hex-encoded.
+        url = f"{self.base_url}/{endpoint}"
+        if self.wire_format == "binary":
+            response = self.http.post(url, data=wire.encode(payload), timeout=self.timeout, headers={
+                "Content-Type": wire.CONTENT_TYPE, "Accept": wire.CONTENT_TYPE
+            })
+            if response.headers.get("Content-Type", "").startswith(wire.CONTENT_TYPE):
+                return wire.decode(response.content)
+            return response.json()
+
+        payload = {k: v.hex() if isinstance(v, bytes) else v for k, v in payload.items()}
+        return self.http.post(url, json=payload, timeout=self.timeout).json()
+
+    def signup(self, user_id, password):
+        return self._post("signup", {"user_id": user_id, "password": password})
+
+    def login(self, atm_id, user_id, password, sig_type):
+        """
+        Send encrypted and signed login request to the bank.
+
+        With use_sessions, a fresh AES key rides inside the RSA-encrypted,
+        signed login message; later commands use that symmetric channel.
+        """
+        message = f"{atm_id}:{user_id}:{password}"
+        session_key = new_session_key() if self.use_sessions else None
+        if session_key:
+            message += f":{session_key.hex()}"
+        message = message.encode()
+        encrypted = encrypt_message(message, self.bank_pub_key)
+        nonce, timestamp, signature = self.sign_fresh(atm_id, sig_type, message)
+
+        result = self._post("login", {
+            "atm_id": atm_id,
+            "user_id": user_id,
+            "signature_type": sig_type,
+            "nonce": nonce,
+            "timestamp": timestamp,
+            "encrypted": encrypted,
+            "signature": signature
+        })
+        if result.get("session_id"):
+            self._handles[(atm_id, user_id)] = result["session_id"]
+            if session_key and result.get("channel"):
+                self._sessions[(atm_id, user_id)] = SessionChannel(result["session_id"], session_key,
+                                                                   atm_id, user_id)
+        return result
+
+    def send_command(self, atm_id, user_id, command, sig_type):
+        """
+        Send encrypted and signed banking action command to the bank.
+        """
+        channel = self._sessions.get((atm_id, user_id))
+        if channel is not None:
+            result = self._send_session_command(channel, command)
+            if command == "quit" or result.get("message") == "Unknown session":
+                self._sessions.pop((atm_id, user_id), None)
+            if command == "quit":
+                self._handles.pop((atm_id, user_id), None)
+            if result.get("message") != "Unknown session":
+                return result
+            # The bank lost the channel: fall back to a signed command
+
+        message = command.encode()
+        session_id = self._handles.get((atm_id, user_id), "")
+        encrypted = encrypt_message(message, self.bank_pub_key)
+        nonce, timestamp, signature = self.sign_fresh(atm_id, sig_type, message, session_id)
+
+        result = self._post("action", {
+            "atm_id": atm_id,
+            "session_id": session_id,
+            "user_id": user_id,
+            "signature_type": sig_type,
+            "nonce": nonce,
+            "timestamp": timestamp,
+            "command": command,
+            "encrypted": encrypted,
+            "signature": signature
+        })
+        if command == "quit":
+            self._handles.pop((atm_id, user_id), None)
+        return result
+
+    def _send_session_command(self, channel, command):
+        counter, encrypted = channel.seal(command.encode())
+        return self._post("session/action", {
+            "session_id": channel.session_id,
+            "counter": counter,
+            "encrypted": encrypted
+        })
+
+    def send_batch(self, atm_id, commands, sig_type, batch_id=None):
+        """
+        Send many (user_id, command) pairs as one signed batch.
+
+        The bank applies them in order, persists them together and returns one
+        result per command. Resending with the same batch_id returns the
+        recorded results instead of applying the batch again, also after the
+        bank restarts, as long as the ATM has not sent more than a few newer
+        keyed batches since (AccountStore.batches_per_atm; the outbox sends
+        one at a time). Batches always travel as JSON.
+
+        Each command carries the account's session handle from login(), if
+        any; without one the bank only accepts deposits (unless the ATM is
+        back-office, see BANK_BACKOFFICE_ATMS).
+        """
+        batch = {
+            "atm_id": atm_id,
+            "commands": [{"user_id": user_id, "command": command,
+                          "session_id": self._handles.get((atm_id, user_id), "")}
+                         for user_id, command in commands]
+        }
+        if batch_id is not None:
+            batch["batch_id"] = batch_id
+        body = json.dumps(batch, separators=(",", ":")).encode()
+        batch_key = new_session_key()
+        nonce, timestamp, signature = self.sign_fresh(atm_id, sig_type, body)
+        payload = {
+            "atm_id": atm_id,
+            "signature_type": sig_type,
+            "nonce": nonce,
+            "timestamp": timestamp,
+            "encrypted_key": encrypt_message(batch_key, self.bank_pub_key).hex(),
+            "encrypted": seal_blob(batch_key, body, atm_id.encode()).hex(),
+            "signature": signature.hex()
+        }
+        return self.http.post(f"{self.base_url}/actions/batch", json=payload, timeout=self.timeout).json()
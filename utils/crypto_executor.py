@@ -0,0 +1,237 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+from cryptography.hazmat.primitives import serialization
+from utils.crypto_utils import load_private_key, rsa_decrypt, VERIFIERS
+
+# Crypto offload service for the bank API.
+#
+# Request threads hand RSA decrypts and signature verifications to a pool of
+# crypto workers instead of running them inline. Admission into the pool is
+# bounded. With a process pool, pending verifications are micro-batched so
+# the pool pays one IPC round trip per batch rather than per signature; a
+# thread pool has no round trip to save, so each verify goes straight to a
+# worker. Queue depth and service times are tracked for monitoring.
+
+
+class CryptoOverloaded(Exception):
+    """Raised when the crypto queue is full and a job could not be admitted in time."""
+
+
+# ------------------- WORKER-SIDE STATE ---------------------
+# Process workers load the bank key once and cache up to _worker_max_keys
+# parsed ATM public keys, least recently used dropped first.
+_worker_private_key = None
+_worker_public_keys = OrderedDict()
+_worker_max_keys = 4096
+
+
+def _init_worker(private_key_path, max_keys=4096):
+    global _worker_private_key, _worker_max_keys
+    _worker_private_key = load_private_key(private_key_path)
+    _worker_max_keys = max_keys
+
+
+def _decrypt_job(ciphertext, private_key=None):
+    start = time.perf_counter()
+    plaintext = rsa_decrypt(ciphertext, private_key or _worker_private_key)
+    return plaintext, time.perf_counter() - start
+
+
+def _public_key(key):
+    # Process jobs carry DER bytes; threads pass the key object through.
+    if not isinstance(key, bytes):
+        return key
+    parsed = _worker_public_keys.get(key)
+    if parsed is None:
+        parsed = _worker_public_keys[key] = serialization.load_der_public_key(key)
+        while len(_worker_public_keys) > _worker_max_keys:
+            _worker_public_keys.popitem(last=False)
+    else:
+        _worker_public_keys.move_to_end(key)
+    return parsed
+
+
+def _verify_batch_job(jobs):
+    start = time.perf_counter()
+    results = [VERIFIERS[sig_type](message, signature, _public_key(key))
+               for sig_type, message, signature, key in jobs]
+    return results, time.perf_counter() - start
+
+
+class CryptoExecutor:
+    """
+    Bounded thread or process pool for the bank's private-key and verify operations.
+    """
+
+    def __init__(self, private_key_path, workers=None, mode="thread", max_queue=256,
+                 queue_timeout=1.0, batch_size=32, batch_window=0.001, max_cached_keys=4096):
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_timeout = queue_timeout
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_cached_keys = max_cached_keys
+
+        if mode == "process":
+            self._private_key = None
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                             initargs=(private_key_path, max_cached_keys))
+        elif mode == "thread":
+            self._private_key = load_private_key(private_key_path)
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="crypto")
+        else:
+            raise ValueError(f"Unknown crypto executor mode: {mode}")
+
+        # Every queued or running job holds one slot.
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._verify_queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._completed = 0
+        self._batches = 0
+        self._service_time = 0.0
+        self._wait_time = 0.0
+        self._der_cache = OrderedDict()   # id(public key) -> (key, DER), least recently used first
+        self._der_lock = threading.Lock()
+
+        if mode == "process":
+            threading.Thread(target=self._batch_loop, name="crypto-batcher", daemon=True).start()
+
+    # ------------------------ ADMISSION ---------------------
+    def _admit(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise CryptoOverloaded("crypto queue full")
+        with self._stats_lock:
+            self._queued += 1
+
+    def _record(self, jobs, service_time, waited):
+        with self._stats_lock:
+            self._queued -= jobs
+            self._completed += jobs
+            self._service_time += service_time
+            self._wait_time += waited
+        for _ in range(jobs):
+            self._slots.release()
+
+    # ------------------------- DECRYPT ----------------------
+    def decrypt(self, ciphertext):
+        """RSA-OAEP decrypt with the bank key on a crypto worker; blocks for the result."""
+        self._admit()
+        submitted = time.perf_counter()
+        try:
+            future = self._pool.submit(_decrypt_job, ciphertext, self._private_key)
+        except Exception:
+            self._record(1, 0.0, 0.0)
+            raise
+        try:
+            plaintext, service_time = future.result()
+        except Exception:
+            self._record(1, 0.0, time.perf_counter() - submitted)
+            raise
+        self._record(1, service_time, time.perf_counter() - submitted - service_time)
+        return plaintext
+
+    # ------------------------- VERIFY -----------------------
+    def verify(self, sig_type, message, signature, public_key):
+        """
+        Verify a signature on a crypto worker; blocks for the result. In
+        process mode it is queued and sent in a micro-batch with other
+        pending verifies.
+        """
+        if sig_type not in VERIFIERS:
+            return False
+        self._admit()
+        job = (sig_type, message, signature, public_key)
+        if self.mode == "thread":
+            submitted = time.perf_counter()
+            try:
+                future = self._pool.submit(_verify_batch_job, [job])
+            except Exception:
+                self._record(1, 0.0, 0.0)
+                raise
+            try:
+                (result,), service_time = future.result()
+            except Exception:
+                self._record(1, 0.0, time.perf_counter() - submitted)
+                raise
+            self._record(1, service_time, time.perf_counter() - submitted - service_time)
+            return result
+        future = Future()
+        job = (sig_type, message, signature, self._der(public_key))
+        self._verify_queue.put((job, future, time.perf_counter()))
+        return future.result()
+
+    def _der(self, public_key):
+        with self._der_lock:
+            der = self._der_cache.get(id(public_key))
+            if der is not None and der[0] is public_key:
+                self._der_cache.move_to_end(id(public_key))
+                return der[1]
+        der = (public_key, public_key.public_bytes(serialization.Encoding.DER,
+                                                   serialization.PublicFormat.SubjectPublicKeyInfo))
+        with self._der_lock:
+            self._der_cache[id(public_key)] = der
+            self._der_cache.move_to_end(id(public_key))
+            while len(self._der_cache) > self.max_cached_keys:
+                self._der_cache.popitem(last=False)
+        return der[1]
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._verify_queue.get()]
+            deadline = time.perf_counter() + self.batch_window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._verify_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                future = self._pool.submit(_verify_batch_job, [job for job, _, _ in batch])
+            except Exception as e:
+                self._fail_batch(batch, e)
+                continue
+            future.add_done_callback(lambda f, batch=batch: self._finish_batch(batch, f))
+
+    def _finish_batch(self, batch, future):
+        try:
+            results, service_time = future.result()
+        except Exception as e:
+            self._fail_batch(batch, e)
+            return
+        now = time.perf_counter()
+        waited = sum(now - submitted for _, _, submitted in batch) - service_time * len(batch)
+        with self._stats_lock:
+            self._batches += 1
+        self._record(len(batch), service_time, max(waited, 0.0))
+        for (_, waiter, _), result in zip(batch, results):
+            waiter.set_result(result)
+
+    def _fail_batch(self, batch, error):
+        self._record(len(batch), 0.0, 0.0)
+        for _, waiter, _ in batch:
+            waiter.set_exception(error)
+
+    # -------------------------- STATS -----------------------
+    def stats(self):
+        with self._stats_lock:
+            completed = self._completed
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "queue_depth": self._queued,
+                "completed": completed,
+                "batches": self._batches,
+                "avg_service_ms": 1000 * self._service_time / completed if completed else 0.0,
+                "avg_wait_ms": 1000 * self._wait_time / completed if completed else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
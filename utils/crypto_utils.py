@@ -1,5 +1,10 @@
+import os
+import json
+import threading
+import time
+from collections import OrderedDict
 from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, dsa, padding
+from cryptography.hazmat.primitives.asymmetric import rsa, dsa, ec, padding
 from cryptography.hazmat.primitives.asymmetric import utils as dsa_utils
 from cryptography.exceptions import InvalidSignature
 
@@ -81,3 +86,296 @@ def dsa_verify(message, signature, public_key):
         return True
     except InvalidSignature:
         return False
+
+# Sign a message using Ed25519 private key
+def sign_ed25519(message, private_key):
+    return private_key.sign(message)
+
+# Verify an Ed25519 signature using public key
+def ed25519_verify(message, signature, public_key):
+    try:
+        public_key.verify(signature, message)
+        return True
+    except InvalidSignature:
+        return False
+
+# Sign a message using ECDSA (P-256) private key
+def sign_ecdsa(message, private_key):
+    return private_key.sign(message, ec.ECDSA(hashes.SHA256()))
+
+# Verify an ECDSA (P-256) signature using public key
+def ecdsa_verify(message, signature, public_key):
+    try:
+        public_key.verify(signature, message, ec.ECDSA(hashes.SHA256()))
+        return True
+    except InvalidSignature:
+        return False
+
+# Signing and verification dispatch by signature type
+SIGNERS = {
+    "rsa": sign_message,
+    "dsa": sign_dsa,
+    "ed25519": sign_ed25519,
+    "ecdsa": sign_ecdsa,
+}
+VERIFIERS = {
+    "rsa": rsa_verify,
+    "dsa": dsa_verify,
+    "ed25519": ed25519_verify,
+    "ecdsa": ecdsa_verify,
+}
+
+# Signature types an ATM can register keys for
+SIG_TYPES = tuple(SIGNERS)
+
+def sign_with(sig_type, message, private_key):
+    return SIGNERS[sig_type](message, private_key)
+
+def verify_with(sig_type, message, signature, public_key):
+    verifier = VERIFIERS.get(sig_type)
+    return verifier is not None and verifier(message, signature, public_key)
+
+# Private key file of an ATM for a signature type (RSA keeps the legacy name)
+def private_key_path(certs_dir, atm_id, sig_type):
+    if sig_type == "rsa":
+        return os.path.join(certs_dir, f"{atm_id}_private.pem")
+    return os.path.join(certs_dir, f"{atm_id}_{sig_type}_private.pem")
+
+def public_key_path(certs_dir, atm_id, sig_type):
+    if sig_type == "rsa":
+        return os.path.join(certs_dir, f"{atm_id}_public.pem")
+    return os.path.join(certs_dir, f"{atm_id}_{sig_type}_public.pem")
+
+# Fleet key index written by provision_fleet.py: one entry per public key with
+# its owner, signature type and SHA-256 fingerprint
+KEY_INDEX = "index.json"
+
+def read_key_index(certs_dir):
+    """Return {public key filename: ((atm_id, sig_type), fingerprint)} from certs/index.json."""
+    try:
+        with open(os.path.join(certs_dir, KEY_INDEX), "r", encoding="utf-8") as f:
+            entries = json.load(f)["keys"]
+    except FileNotFoundError:
+        return {}
+    return {e["public"]: ((e["atm_id"], e["sig_type"]), e["fingerprint"]) for e in entries}
+
+# Aliases for the names older bank_server.py code imported
+decrypt_message = rsa_decrypt
+verify_signature = rsa_verify
+verify_dsa_signature = dsa_verify
+
+class KeyRegistry:
+    """
+    In-memory index of ATM public keys found in a certs directory.
+
+    Keys are parsed once and looked up by (atm_id, sig_type) with a dict hit.
+    A background thread rescans the directory and re-parses only files whose
+    mtime or size changed, so ATMs added to the fleet are picked up without a
+    restart. Both naming schemes used in this repo are understood:
+    `{atm}_{sig}_public.pem` (sig = rsa, dsa, ed25519, ecdsa) and the legacy
+    `{atm}_public.pem` (RSA). Files listed in a provisioning index
+    (certs/index.json) take their identity and change stamp from the index
+    instead of the filename and a stat() call.
+    """
+
+    def __init__(self, certs_dir="certs", poll_interval=5.0, miss_rescan_interval=1.0):
+        self.certs_dir = certs_dir
+        self.poll_interval = poll_interval
+        self.miss_rescan_interval = miss_rescan_interval
+        self._keys = {}    # (atm_id, sig_type) -> public key
+        self._files = {}   # filename -> (stamp, (atm_id, sig_type), explicit, key)
+        self._index = ({}, None)   # (parsed index, index file stamp)
+        self._lock = threading.Lock()
+        self._last_scan = 0.0
+        self.refresh()
+        if poll_interval:
+            threading.Thread(target=self._poll_loop, name="key-registry", daemon=True).start()
+
+    @staticmethod
+    def parse_filename(name):
+        # Map a public key filename to ((atm_id, sig_type), explicit), or None.
+        # bank_* files are the bank's own keys, never an ATM's.
+        if not name.endswith("_public.pem") or name.startswith("bank_"):
+            return None
+        stem = name[:-len("_public.pem")]
+        for sig_type in SIG_TYPES:
+            if stem.endswith("_" + sig_type):
+                return (stem[:-len(sig_type) - 1], sig_type), True
+        return (stem, "rsa"), False
+
+    def refresh(self):
+        """Rescan the certs directory, loading new or changed keys and dropping removed ones."""
+        with self._lock:
+            self._last_scan = time.monotonic()
+            try:
+                entries = list(os.scandir(self.certs_dir))
+            except FileNotFoundError:
+                entries = []
+            index = self._read_index(entries)
+
+            files = {}
+            for entry in entries:
+                if entry.name in index:
+                    ident, fingerprint = index[entry.name]
+                    parsed, stamp = (ident, True), fingerprint
+                else:
+                    parsed = self.parse_filename(entry.name)
+                    if parsed is None:
+                        continue
+                    st = entry.stat()
+                    stamp = (st.st_mtime_ns, st.st_size)
+                known = self._files.get(entry.name)
+                if known and known[0] == stamp:
+                    files[entry.name] = known
+                    continue
+                try:
+                    key = load_public_key(entry.path)
+                except (OSError, ValueError) as e:
+                    print(f"[WARN] Could not load ATM key {entry.path}: {e}")
+                    continue
+                files[entry.name] = (stamp, parsed[0], parsed[1], key)
+
+            # Explicit `{atm}_{sig}_public.pem` files win over legacy names.
+            keys = {}
+            for _, ident, explicit, key in sorted(files.values(), key=lambda f: f[2]):
+                keys[ident] = key
+            self._files = files
+            self._keys = keys
+
+    def _read_index(self, entries):
+        # Re-read certs/index.json only when the file itself changed.
+        for entry in entries:
+            if entry.name == KEY_INDEX:
+                st = entry.stat()
+                stamp = (st.st_mtime_ns, st.st_size)
+                if stamp != self._index[1]:
+                    try:
+                        self._index = (read_key_index(self.certs_dir), stamp)
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"[WARN] Could not read key index: {e}")
+                        self._index = ({}, stamp)
+                return self._index[0]
+        self._index = ({}, None)
+        return {}
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.refresh()
+
+    def get(self, atm_id, sig_type):
+        """Return the ATM's public key for sig_type, or None if not registered."""
+        key = self._keys.get((atm_id, sig_type))
+        if key is None and time.monotonic() - self._last_scan >= self.miss_rescan_interval:
+            # Unknown ATM: rescan now (rate limited) in case it was just provisioned.
+            self.refresh()
+            key = self._keys.get((atm_id, sig_type))
+        return key
+
+    def atm_ids(self):
+        return sorted({atm_id for atm_id, _ in self._keys})
+
+
+class LazyKeyRegistry:
+    """
+    Key registry for large fleets that parses keys on first use.
+
+    Startup and rescans only build an index of which (atm_id, sig_type) keys
+    exist: certs/index.json when present, else the filenames, with no stat()
+    or PEM parsing. A key is parsed the first time it is needed and kept in
+    an LRU cache of at most `max_cached` keys. Same interface as KeyRegistry.
+    """
+
+    def __init__(self, certs_dir="certs", max_cached=4096, poll_interval=5.0, miss_rescan_interval=1.0):
+        self.certs_dir = certs_dir
+        self.max_cached = max_cached
+        self.poll_interval = poll_interval
+        self.miss_rescan_interval = miss_rescan_interval
+        self._paths = {}             # (atm_id, sig_type) -> (filename, fingerprint or None)
+        self._cache = OrderedDict()  # (atm_id, sig_type) -> (filename, stamp, key), oldest first
+        self._lock = threading.Lock()
+        self._last_scan = 0.0
+        self.refresh()
+        if poll_interval:
+            threading.Thread(target=self._poll_loop, name="key-registry", daemon=True).start()
+
+    def refresh(self):
+        """Re-index the certs directory and drop cached keys whose file changed or vanished."""
+        self._last_scan = time.monotonic()
+        try:
+            names = os.listdir(self.certs_dir)
+        except FileNotFoundError:
+            names = []
+        try:
+            index = read_key_index(self.certs_dir)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] Could not read key index: {e}")
+            index = {}
+
+        legacy, explicit = {}, {}
+        for name in names:
+            if name in index:
+                ident, fingerprint = index[name]
+                explicit[ident] = (name, fingerprint)
+                continue
+            parsed = KeyRegistry.parse_filename(name)
+            if parsed is not None:
+                (explicit if parsed[1] else legacy)[parsed[0]] = (name, None)
+        # Explicit `{atm}_{sig}_public.pem` files win over legacy names.
+        legacy.update(explicit)
+
+        with self._lock:
+            self._paths = legacy
+            cached = list(self._cache.items())
+        for ident, (name, stamp, _) in cached:
+            if self._stamp(legacy.get(ident), name) != stamp:
+                with self._lock:
+                    self._cache.pop(ident, None)
+
+    def _stamp(self, entry, name=None):
+        # Change stamp of an indexed path: its fingerprint, or mtime/size for unindexed files.
+        if entry is None or (name is not None and entry[0] != name):
+            return None
+        if entry[1] is not None:
+            return entry[1]
+        try:
+            st = os.stat(os.path.join(self.certs_dir, entry[0]))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.refresh()
+
+    def get(self, atm_id, sig_type):
+        """Return the ATM's public key for sig_type, or None if not registered."""
+        ident = (atm_id, sig_type)
+        with self._lock:
+            cached = self._cache.get(ident)
+            if cached is not None:
+                self._cache.move_to_end(ident)
+                return cached[2]
+        entry = self._paths.get(ident)
+        if entry is None and time.monotonic() - self._last_scan >= self.miss_rescan_interval:
+            # Unknown ATM: re-index now (rate limited) in case it was just provisioned.
+            self.refresh()
+            entry = self._paths.get(ident)
+        if entry is None:
+            return None
+
+        stamp = self._stamp(entry)
+        try:
+            key = load_public_key(os.path.join(self.certs_dir, entry[0]))
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Could not load ATM key {entry[0]}: {e}")
+            return None
+        with self._lock:
+            self._cache[ident] = (entry[0], stamp, key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return key
+
+    def atm_ids(self):
+        return sorted({atm_id for atm_id, _ in self._paths})
@@ -0,0 +1,84 @@
+import asyncio
+import struct
+
+# Length-prefixed framing for the raw-socket bank protocol.
+#
+# Every message is one frame: a 4-byte big-endian length followed by the
+# payload. A command frame carries several fields (encrypted command,
+# signature, signature type), each packed as a 4-byte length plus bytes, so
+# the whole command arrives as a single unit regardless of how TCP splits it.
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 64 * 1024
+
+
+class FrameError(Exception):
+    """Raised on oversized or malformed frames."""
+
+
+def pack_fields(*fields):
+    return b"".join(HEADER.pack(len(f)) + f for f in fields)
+
+
+def unpack_fields(payload):
+    fields = []
+    offset = 0
+    while offset < len(payload):
+        if offset + HEADER.size > len(payload):
+            raise FrameError("truncated field header")
+        (size,) = HEADER.unpack_from(payload, offset)
+        offset += HEADER.size
+        if offset + size > len(payload):
+            raise FrameError("truncated field")
+        fields.append(payload[offset:offset + size])
+        offset += size
+    return fields
+
+
+def encode_frame(payload):
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"frame of {len(payload)} bytes exceeds {MAX_FRAME_SIZE}")
+    return HEADER.pack(len(payload)) + payload
+
+
+# ---------------------- BLOCKING SOCKETS --------------------
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def send_frame(sock, payload):
+    sock.sendall(encode_frame(payload))
+
+
+def recv_frame(sock):
+    """Read one frame; returns None if the peer closed the connection."""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise FrameError(f"frame of {size} bytes exceeds {MAX_FRAME_SIZE}")
+    return _recv_exact(sock, size)
+
+
+# ------------------------- ASYNCIO --------------------------
+async def read_frame(reader):
+    """Read one frame from an asyncio StreamReader; returns None on EOF."""
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (size,) = HEADER.unpack(header)
+        if size > MAX_FRAME_SIZE:
+            raise FrameError(f"frame of {size} bytes exceeds {MAX_FRAME_SIZE}")
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def write_frame(writer, payload):
+    writer.write(encode_frame(payload))
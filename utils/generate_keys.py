@@ -1,18 +1,24 @@
-from Crypto.PublicKey import RSA
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
 import os
 
 CERTS_DIR = os.path.join(os.path.dirname(__file__), "..", "certs")
 
 def generate_keys(name, bits=2048):
-    key = RSA.generate(bits)
-    private_key = key.export_key()
-    public_key = key.publickey().export_key()
+    key = rsa.generate_private_key(public_exponent=65537, key_size=bits)
 
     with open(os.path.join(CERTS_DIR, f"{name}_private.pem"), "wb") as priv_file:
-        priv_file.write(private_key)
+        priv_file.write(key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
 
     with open(os.path.join(CERTS_DIR, f"{name}_public.pem"), "wb") as pub_file:
-        pub_file.write(public_key)
+        pub_file.write(key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
 
 if __name__ == "__main__":
     os.makedirs(CERTS_DIR, exist_ok=True)
@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import time
+import shutil
+import threading
+from collections import OrderedDict, deque
+
+# Per-account transaction history, kept out of the account records.
+#
+# Each account's history is split into time-bucketed segment files
+# (history/<account>/<bucket>.jsonl, one bucket per `bucket_seconds`), so
+# appending costs one small write and reading a page touches only the
+# segments it needs. The newest `recent` entries of every account touched
+# since startup are also kept in an in-memory ring buffer, which serves the
+# common "latest activity" request without any disk I/O.
+#
+# Memory and file descriptors stay bounded however many accounts are
+# touched: at most `max_accounts` rings are kept, least recently used
+# dropped first (a dropped account is reseeded from its segments on next
+# use), and appends go through an LRU of at most `max_open` open segment
+# files instead of opening and closing one per entry.
+#
+# Pages are returned newest first. A cursor names the last entry returned
+# ("<bucket>-<seq>"); passing it back as `after` continues with older entries.
+
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class _AccountHistory:
+    def __init__(self, last_seq, recent):
+        self.last_seq = last_seq
+        self.recent = recent    # deque of the newest entries, oldest first
+        self.lock = threading.Lock()
+        self.evicted = False    # dropped from the table; callers must look up again
+
+
+class HistoryStore:
+    """
+    Segmented on-disk history per account with a bounded in-memory recent ring.
+    """
+
+    def __init__(self, root="history", bucket_seconds=86400, recent=50, max_accounts=100_000, max_open=256):
+        self.root = root
+        self.bucket_seconds = bucket_seconds
+        self.recent_size = recent
+        self.max_accounts = max_accounts
+        self.max_open = max_open
+        self._accounts = OrderedDict()   # user_id -> _AccountHistory, least recently used first
+        self._lock = threading.Lock()
+        self._files = OrderedDict()      # (user_id, bucket) -> open segment, least recently used first
+        self._files_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # ------------------------ LAYOUT ------------------------
+    def _dir(self, user_id):
+        name = user_id if _SAFE_ID.match(user_id) else "x" + user_id.encode().hex()
+        return os.path.join(self.root, name)
+
+    def _bucket(self, ts):
+        return int(ts // self.bucket_seconds)
+
+    def _segments(self, user_id):
+        # Bucket numbers with a segment on disk, newest first.
+        try:
+            names = os.listdir(self._dir(user_id))
+        except FileNotFoundError:
+            return []
+        return sorted((int(n[:-6]) for n in names if n.endswith(".jsonl")), reverse=True)
+
+    def _read_segment(self, user_id, bucket):
+        entries = []
+        with open(os.path.join(self._dir(user_id), f"{bucket}.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    break  # torn write at the tail
+        return entries
+
+    def _account(self, user_id):
+        with self._lock:
+            state = self._accounts.get(user_id)
+            if state is not None:
+                self._accounts.move_to_end(user_id)
+                return state
+            # First touch since startup or eviction: seed the ring from the newest segments.
+            recent = deque(maxlen=self.recent_size)
+            for bucket in self._segments(user_id):
+                recent.extendleft(reversed(self._read_segment(user_id, bucket)[-self.recent_size:]))
+                if len(recent) >= self.recent_size:
+                    break
+            last_seq = recent[-1]["seq"] if recent else 0
+            state = self._accounts[user_id] = _AccountHistory(last_seq, recent)
+            while len(self._accounts) > self.max_accounts:
+                _, victim = self._accounts.popitem(last=False)
+                # Wait out an append in progress, so a reseed sees its entry on disk
+                with victim.lock:
+                    victim.evicted = True
+        return state
+
+    def _write(self, user_id, bucket, line):
+        with self._files_lock:
+            key = (user_id, bucket)
+            f = self._files.get(key)
+            if f is None:
+                path = self._dir(user_id)
+                os.makedirs(path, exist_ok=True)
+                f = self._files[key] = open(os.path.join(path, f"{bucket}.jsonl"), "a", encoding="utf-8")
+                while len(self._files) > self.max_open:
+                    self._files.popitem(last=False)[1].close()
+            else:
+                self._files.move_to_end(key)
+            f.write(line)
+            f.flush()
+
+    def _close_files(self, user_id=None):
+        with self._files_lock:
+            for key in [key for key in self._files if user_id is None or key[0] == user_id]:
+                self._files.pop(key).close()
+
+    # ------------------------ WRITES ------------------------
+    def append(self, user_id, record, ts=None):
+        """Append a history record for an account and return the stored entry."""
+        ts = time.time() if ts is None else ts
+        while True:
+            state = self._account(user_id)
+            with state.lock:
+                if state.evicted:
+                    continue
+                state.last_seq += 1
+                entry = {"seq": state.last_seq, "ts": ts, **record}
+                self._write(user_id, self._bucket(ts), json.dumps(entry, separators=(",", ":")) + "\n")
+                state.recent.append(entry)
+            return entry
+
+    def import_legacy(self, user_id, records):
+        """Move an old unbounded activity list into the store (no timestamps: bucket 0)."""
+        if self._account(user_id).last_seq:
+            return
+        for record in records:
+            self.append(user_id, record, ts=0)
+
+    def import_entries(self, user_id, entries):
+        """Append exported entries (oldest first) to an account, keeping their timestamps."""
+        for entry in entries:
+            self.append(user_id, {k: v for k, v in entry.items() if k not in ("seq", "ts")}, ts=entry["ts"])
+
+    def remove(self, user_id):
+        """Delete an account's history from disk and memory."""
+        with self._lock:
+            self._accounts.pop(user_id, None)
+        self._close_files(user_id)
+        shutil.rmtree(self._dir(user_id), ignore_errors=True)
+
+    # ------------------------ READS -------------------------
+    def cursor(self, entry):
+        return f"{self._bucket(entry['ts'])}-{entry['seq']}"
+
+    def page(self, user_id, limit=20, after=None):
+        """
+        Return (entries, next_cursor): up to `limit` entries older than `after`,
+        newest first. next_cursor is None when there is nothing older.
+        """
+        state = self._account(user_id)
+        if after:
+            bucket_bound, seq_bound = (int(x) for x in after.split("-"))
+        else:
+            bucket_bound, seq_bound = None, state.last_seq + 1
+
+        with state.lock:
+            recent = list(state.recent)
+        entries = [e for e in reversed(recent) if e["seq"] < seq_bound][:limit + 1]
+
+        # Fall back to the segments when the ring does not reach back far enough.
+        oldest_in_ring = recent[0]["seq"] if recent else state.last_seq + 1
+        if len(entries) <= limit and oldest_in_ring > 1:
+            seq_bound = entries[-1]["seq"] if entries else min(seq_bound, oldest_in_ring)
+            for bucket in self._segments(user_id):
+                if bucket_bound is not None and bucket > bucket_bound:
+                    continue
+                for entry in reversed(self._read_segment(user_id, bucket)):
+                    if entry["seq"] < seq_bound:
+                        entries.append(entry)
+                        seq_bound = entry["seq"]
+                if len(entries) > limit:
+                    break
+
+        more = len(entries) > limit
+        entries = entries[:limit]
+        return entries, (self.cursor(entries[-1]) if more and entries else None)
+
+    def export(self, user_id):
+        """Every entry of an account, oldest first."""
+        entries = []
+        for bucket in reversed(self._segments(user_id)):
+            entries.extend(self._read_segment(user_id, bucket))
+        return entries
+
+    def recent(self, user_id, n=None):
+        """Newest entries from the in-memory ring, newest first."""
+        state = self._account(user_id)
+        with state.lock:
+            entries = list(state.recent)
+        entries.reverse()
+        return entries[:n] if n else entries
+
+    def close(self):
+        """Close the open segment files; later appends reopen them."""
+        self._close_files()
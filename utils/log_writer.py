@@ -0,0 +1,161 @@
+import os
+import json
+import queue
+import threading
+import time
+import atexit
+from datetime import datetime
+
+# Buffered, rotating transaction log.
+#
+# Request threads only enqueue entries. A single writer thread drains the
+# queue in batches (group commit): one write, and optionally one fsync, per
+# batch, with a batch held open for at most `max_latency` seconds. The active
+# file (e.g. logs/transactions.log) is rotated when it exceeds `max_bytes` or
+# the date changes; closed segments are renamed to
+# <name>.<YYYYmmdd-HHMMSS>.log and listed, with the time range and entry count
+# they cover, in <name>.index.json.
+
+
+def entry_timestamp(line):
+    # Timestamp of a "[YYYY-mm-dd HH:MM:SS] ..." log line, or None.
+    try:
+        return datetime.strptime(line[1:20], "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+
+
+class LogWriter:
+    """
+    Queue-fed log writer with group commit and size/date rotation.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, rotate_daily=True, max_latency=0.01,
+                 max_batch=4096, fsync=False, echo=False, max_queue=100000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.echo = echo
+
+        base, _ = os.path.splitext(path)
+        self.index_path = base + ".index.json"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._queue = queue.Queue(max_queue)
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._first_ts = self._last_ts = None
+        self._entries = 0
+        self._day = datetime.now().date()
+        if self._size:
+            self._resume()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _resume(self):
+        # Pick up counters for an active segment left by a previous run.
+        with open(self.path, "rb") as f:
+            first = f.readline().decode(errors="replace")
+            self._entries = 1 + sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+        self._first_ts = entry_timestamp(first) or os.path.getmtime(self.path)
+        self._last_ts = os.path.getmtime(self.path)
+        self._day = datetime.fromtimestamp(self._first_ts).date()
+
+    def write(self, entry, ts=None):
+        """Queue one log line; returns immediately unless the queue is full."""
+        self._queue.put((time.time() if ts is None else ts, entry))
+
+    # ------------------------ WRITER ------------------------
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                break
+
+    def _commit(self, batch):
+        ts = batch[0][0]
+        day = datetime.fromtimestamp(ts).date()
+        if self._size and (self._size >= self.max_bytes or (self.rotate_daily and day != self._day)):
+            self._rotate()
+        if not self._size:
+            self._day = day
+
+        data = "".join(entry + "\n" for _, entry in batch)
+        self._file.write(data)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+        self._size += len(data.encode())
+        self._entries += len(batch)
+        self._first_ts = self._first_ts or ts
+        self._last_ts = batch[-1][0]
+        if self.echo:
+            print(data, end="")
+
+    def _rotate(self):
+        self._file.close()
+        start = self._first_ts or time.time()
+        stamp = datetime.fromtimestamp(start).strftime("%Y%m%d-%H%M%S")
+        base, ext = os.path.splitext(self.path)
+        segment = f"{base}.{stamp}{ext}"
+        n = 1
+        while os.path.exists(segment):
+            segment = f"{base}.{stamp}-{n}{ext}"
+            n += 1
+        os.replace(self.path, segment)
+
+        index = self.segments()
+        index.append({
+            "file": os.path.basename(segment),
+            "start": start,
+            "end": self._last_ts or start,
+            "entries": self._entries,
+            "bytes": self._size,
+        })
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+        self._entries = 0
+        self._first_ts = self._last_ts = None
+
+    def segments(self):
+        """Closed segments with their time ranges, oldest first."""
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
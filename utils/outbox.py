@@ -0,0 +1,192 @@
+import os
+import re
+import time
+import random
+import sqlite3
+import threading
+
+# Store-and-forward outbox for ATM front-ends.
+#
+# Eligible commands (deposits) are written to a local SQLite database and the
+# page returns at once. A background worker sends pending commands to the
+# bank's batch endpoint (BankClient.send_batch), one batch per ATM and
+# signature type, and backs off exponentially while the bank is down or
+# busy. Each batch is given an ID that is stored with its rows before the
+# first attempt and sent inside the signed batch, so a retry after a lost
+# response resends the same batch and the bank answers it from its record
+# instead of applying it twice. Every batch ends with a balance query per
+# account; its answer becomes the account's confirmed balance.
+
+OUTBOX_COMMANDS = ("deposit",)
+
+# Batch-level rejections worth retrying; anything else fails the batch's rows
+TRANSIENT_REPLIES = ("Bank busy, retry later", "Rate limit exceeded, retry later",
+                     "Replayed request", "Stale or missing timestamp")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    atm_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    command TEXT NOT NULL,
+    sig_type TEXT NOT NULL,
+    created REAL NOT NULL,
+    batch_id TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, id);
+CREATE TABLE IF NOT EXISTS balances (
+    user_id TEXT PRIMARY KEY,
+    balance INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+_BALANCE = re.compile(r"^Balance: \$(-?\d+)$")
+
+
+class TransientError(Exception):
+    """The bank could not take the batch now; keep it and retry later."""
+
+
+class Outbox:
+    """
+    Durable SQLite queue of signed ATM commands, flushed in batches by a worker thread.
+    """
+
+    def __init__(self, client, path="atm_outbox.db", batch_size=200, flush_interval=0.5,
+                 min_backoff=0.5, max_backoff=30.0):
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self._backoff = 0.0
+        self._prefix = os.urandom(4).hex()   # keeps batch IDs unique across outbox files
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.executescript(_SCHEMA)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="atm-outbox", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def eligible(command):
+        return command in OUTBOX_COMMANDS
+
+    # ----------------------- PAGE SIDE ----------------------
+    def enqueue(self, atm_id, user_id, command, sig_type):
+        """Store a command for delivery; returns its outbox ID once it is on disk."""
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO outbox (atm_id, user_id, command, sig_type, created) VALUES (?, ?, ?, ?, ?)",
+                (atm_id, user_id, command, sig_type, time.time()))
+        self._wake.set()
+        return cursor.lastrowid
+
+    def pending(self, user_id):
+        """Commands for an account that the bank has not answered yet, oldest first."""
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                "SELECT command FROM outbox WHERE user_id = ? AND status = 'pending' ORDER BY id", (user_id,))]
+
+    def recent_results(self, user_id, limit=5):
+        """[(command, status, result)] of the account's latest delivered commands, newest first."""
+        with self._lock:
+            return list(self._db.execute(
+                "SELECT command, status, result FROM outbox WHERE user_id = ? AND status != 'pending' "
+                "ORDER BY id DESC LIMIT ?", (user_id, limit)))
+
+    def confirmed_balance(self, user_id):
+        """Balance the bank reported after the account's last delivered batch, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT balance FROM balances WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    # ------------------------ WORKER ------------------------
+    def _run(self):
+        while not self._closed:
+            if self._backoff:
+                self._stop.wait(self._backoff)   # new commands do not cut a backoff short
+            else:
+                self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                while not self._closed and self.flush_once():
+                    pass
+                self._backoff = 0.0
+            except TransientError as e:
+                self._backoff = min(self.max_backoff, max(self.min_backoff, 2 * self._backoff))
+                self._backoff *= random.uniform(0.8, 1.2)
+                print(f"[OUTBOX] Bank unavailable ({e}); retrying in {self._backoff:.1f}s")
+
+    def _next_batch(self):
+        # The oldest pending row decides the batch: resend its batch if it
+        # already has one, else claim up to batch_size pending rows of the
+        # same ATM and signature type under a new batch ID.
+        with self._lock:
+            head = self._db.execute(
+                "SELECT atm_id, sig_type, batch_id FROM outbox WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if head is None:
+                return None
+            atm_id, sig_type, batch_id = head
+            if batch_id is None:
+                batch_id = f"{self._prefix}-{time.time_ns()}"
+                self._db.execute(
+                    "UPDATE outbox SET batch_id = ? WHERE id IN (SELECT id FROM outbox WHERE status = 'pending' "
+                    "AND batch_id IS NULL AND atm_id = ? AND sig_type = ? ORDER BY id LIMIT ?)",
+                    (batch_id, atm_id, sig_type, self.batch_size))
+            rows = list(self._db.execute(
+                "SELECT id, user_id, command FROM outbox WHERE batch_id = ? ORDER BY id", (batch_id,)))
+        return atm_id, sig_type, batch_id, rows
+
+    def flush_once(self):
+        """Deliver one batch; returns False when nothing is pending."""
+        batch = self._next_batch()
+        if batch is None:
+            return False
+        atm_id, sig_type, batch_id, rows = batch
+        accounts = list(dict.fromkeys(user_id for _, user_id, _ in rows))
+        commands = [(user_id, command) for _, user_id, command in rows] + [(u, "balance") for u in accounts]
+
+        try:
+            reply = self.client.send_batch(atm_id, commands, sig_type, batch_id=batch_id)
+        except Exception as e:
+            raise TransientError(e)
+        if reply.get("status") != "ok":
+            if reply.get("message") in TRANSIENT_REPLIES:
+                raise TransientError(reply["message"])
+            # Rejected as a whole (e.g. ATM not registered): report on every row
+            results = [{"status": "fail", "message": reply.get("message")}] * len(rows)
+            balances = []
+        else:
+            results = reply["results"][:len(rows)]
+            balances = zip(accounts, reply["results"][len(rows):])
+
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("UPDATE outbox SET status = ?, result = ? WHERE id = ?",
+                                 [(r["status"], r["message"], row[0]) for r, row in zip(results, rows)])
+            for user_id, result in balances:
+                match = _BALANCE.match(result.get("message", ""))
+                if match:
+                    self._db.execute("INSERT OR REPLACE INTO balances VALUES (?, ?, ?)",
+                                     (user_id, int(match.group(1)), now))
+            self._db.execute("COMMIT")
+        return True
+
+    def close(self):
+        self._closed = True
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._db.close()
@@ -0,0 +1,106 @@
+import os
+import time
+import hashlib
+import math
+import threading
+
+# Replay protection for signed ATM requests.
+#
+# Every signed request carries a random nonce and a Unix timestamp, and the
+# ATM's signature covers both (see bind_freshness). The bank rejects a request
+# whose timestamp is more than `max_skew` seconds off, and remembers the
+# nonces it has accepted in rotating Bloom filter generations: one generation
+# is written per `max_skew` seconds and three are kept, so a nonce is
+# remembered for at least as long as its timestamp is acceptable. Memory is
+# fixed by `capacity` and `error_rate`; a check is a handful of bit tests and
+# runs before any private-key work, but only looks: a nonce is recorded once
+# the request's signature has verified, so requests nobody signed cannot fill
+# the filters and push out fresh ones. A false positive rejects a fresh
+# request with probability about `error_rate`.
+
+NONCE_BYTES = 16
+GENERATIONS = 3
+
+
+def new_nonce():
+    return os.urandom(NONCE_BYTES).hex()
+
+
+def bind_freshness(message, nonce, timestamp, session_id=None):
+    """
+    The bytes an ATM signs: the message followed by its nonce and timestamp,
+    and for a command in a login session, the session it belongs to.
+    """
+    bound = f"|{nonce}|{timestamp}" if session_id is None else f"|{nonce}|{timestamp}|{session_id}"
+    return message + bound.encode()
+
+
+class ReplayCache:
+    """
+    Time-windowed nonce cache of fixed size, built from rotating Bloom filters.
+    """
+
+    def __init__(self, max_skew=120, capacity=1_000_000, error_rate=1e-6):
+        self.max_skew = max_skew
+        self.capacity = capacity
+        # Standard Bloom sizing for `capacity` nonces per generation
+        self.bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._filters = [bytearray((self.bits + 7) // 8) for _ in range(GENERATIONS)]
+        self._counts = [0] * GENERATIONS
+        self._current = 0
+        self._rotated_at = time.time()
+        self._lock = threading.Lock()
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def _rotate(self, now):
+        # Caller holds the lock. Each elapsed period retires the oldest generation.
+        periods = int((now - self._rotated_at) // self.max_skew)
+        for _ in range(min(periods, GENERATIONS)):
+            self._current = (self._current + 1) % GENERATIONS
+            self._filters[self._current] = bytearray(len(self._filters[self._current]))
+            self._counts[self._current] = 0
+        if periods:
+            self._rotated_at += periods * self.max_skew
+
+    def check(self, atm_id, nonce, timestamp, now=None, record=True):
+        """
+        Check a request's nonce and, with record, remember it; returns None if
+        it is fresh, else the reason ("stale" or "replay") it must be rejected.
+        Checking and recording are one step, so of two requests with the same
+        nonce only one is recorded as fresh.
+        """
+        now = time.time() if now is None else now
+        try:
+            if abs(now - int(timestamp)) > self.max_skew or len(nonce) != 2 * NONCE_BYTES:
+                return "stale"
+            key = atm_id.encode() + b"|" + bytes.fromhex(nonce)
+        except (TypeError, ValueError):
+            return "stale"
+
+        positions = self._positions(key)
+        with self._lock:
+            self._rotate(now)
+            for bloom in self._filters:
+                if all(bloom[p >> 3] & (1 << (p & 7)) for p in positions):
+                    return "replay"
+            if not record:
+                return None
+            bloom = self._filters[self._current]
+            for p in positions:
+                bloom[p >> 3] |= 1 << (p & 7)
+            self._counts[self._current] += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "bytes": sum(len(f) for f in self._filters),
+                "hashes": self.hashes,
+                "current_fill": self._counts[self._current] / self.capacity,
+            }
@@ -0,0 +1,98 @@
+import os
+import struct
+import threading
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+
+# Symmetric session channel between an ATM and the bank.
+#
+# At login the ATM picks a random 256-bit key and sends it inside the RSA
+# encrypted, ATM-signed login message, so the key is wrapped with RSA once
+# and bound to the ATM's identity. Every later command is sealed with
+# AES-GCM under that key. The 96-bit nonce is a direction tag plus a 64-bit
+# message counter; the session ID and counter are authenticated as AAD and
+# the receiver rejects replayed or stale counters.
+
+KEY_SIZE = 32
+REPLAY_WINDOW = 64
+
+# Nonce prefixes keep ATM->bank and bank->ATM nonces disjoint under one key
+TO_BANK = b"ATM>"
+TO_ATM = b"BNK>"
+
+
+def new_session_key():
+    return os.urandom(KEY_SIZE)
+
+
+def new_session_id():
+    return os.urandom(16).hex()
+
+
+# One-shot sealing for bulk payloads (e.g. batched commands) under a fresh
+# single-use key: a random nonce is prepended to the ciphertext.
+def seal_blob(key, plaintext, aad=b""):
+    nonce = os.urandom(12)
+    return nonce + AESGCM(key).encrypt(nonce, plaintext, aad)
+
+
+def open_blob(key, blob, aad=b""):
+    """Decrypt a sealed blob; returns None if it was forged or truncated."""
+    if len(key) != KEY_SIZE or len(blob) < 12:
+        return None
+    try:
+        return AESGCM(key).decrypt(blob[:12], blob[12:], aad)
+    except InvalidTag:
+        return None
+
+
+class SessionChannel:
+    """
+    AES-GCM channel state for one login session.
+    """
+
+    def __init__(self, session_id, key, atm_id=None, user_id=None):
+        self.session_id = session_id
+        self.atm_id = atm_id
+        self.user_id = user_id
+        self._aead = AESGCM(key)
+        self._send_counter = 0
+        self._highest = 0          # highest counter accepted so far
+        self._window = 0           # bitmap of recently accepted counters below _highest
+        self._lock = threading.Lock()
+
+    def _aad(self, counter):
+        return self.session_id.encode() + struct.pack(">Q", counter)
+
+    def seal(self, plaintext, direction=TO_BANK):
+        """Encrypt the next outgoing message; returns (counter, ciphertext)."""
+        with self._lock:
+            self._send_counter += 1
+            counter = self._send_counter
+        nonce = direction + struct.pack(">Q", counter)
+        return counter, self._aead.encrypt(nonce, plaintext, self._aad(counter))
+
+    def open(self, counter, ciphertext, direction=TO_BANK):
+        """Decrypt an incoming message; returns None if forged, replayed or too old."""
+        if counter <= 0 or counter <= self._highest - REPLAY_WINDOW:
+            return None
+        nonce = direction + struct.pack(">Q", counter)
+        try:
+            plaintext = self._aead.decrypt(nonce, ciphertext, self._aad(counter))
+        except InvalidTag:
+            return None
+        # Sliding-window replay check, only after the tag has been verified.
+        with self._lock:
+            if counter > self._highest:
+                shift = counter - self._highest
+                self._window = ((self._window << shift) | (1 << (shift - 1))) & ((1 << REPLAY_WINDOW) - 1) \
+                    if shift < REPLAY_WINDOW else 0
+                self._highest = counter
+            elif counter == self._highest:
+                return None
+            else:
+                bit = 1 << (self._highest - counter - 1)
+                if self._window & bit:
+                    return None
+                self._window |= bit
+        return plaintext
@@ -0,0 +1,149 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Server-side login sessions for the bank API.
+#
+# /api/login issues a session handle bound to the ATM and the account that
+# logged in, and /api/action looks the handle up instead of trusting the
+# user_id a request names. Sessions are kept in one OrderedDict in
+# least-recently-used order with a sliding idle TTL, so the entry at the
+# front is always the next to expire: lookup, touch and expiry are O(1)
+# (expired entries are dropped from the front as requests come in) and the
+# table never holds more than max_sessions, evicting the least recently used
+# session when full. A per-ATM index gives session counts and lets an ATM be
+# logged out without scanning the table.
+
+# Reply to an action whose session handle is unknown, expired or ended
+SESSION_EXPIRED = "Not logged in or session expired"
+
+
+class Session:
+    """One login: handle, ATM, account, idle deadline and optional AES channel."""
+
+    __slots__ = ("session_id", "atm_id", "user_id", "expires", "channel")
+
+    def __init__(self, session_id, atm_id, user_id, expires, channel=None):
+        self.session_id = session_id
+        self.atm_id = atm_id
+        self.user_id = user_id
+        self.expires = expires
+        self.channel = channel   # SessionChannel when the ATM sent a session key
+
+    def __getstate__(self):
+        # Sent to worker processes without the channel (its keys stay put)
+        return self.session_id, self.atm_id, self.user_id, self.expires
+
+    def __setstate__(self, state):
+        self.session_id, self.atm_id, self.user_id, self.expires = state
+        self.channel = None
+
+
+class SessionRegistry:
+    """
+    Bounded session table with idle TTL, LRU eviction and per-ATM counts.
+    """
+
+    def __init__(self, ttl=900.0, max_sessions=500_000, sweep_batch=256):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sweep_batch = sweep_batch
+        self._sessions = OrderedDict()   # session_id -> Session, least recently used first
+        self._by_atm = {}                # atm_id -> set of session_ids
+        self._lock = threading.Lock()
+        self._expired = 0
+        self._evicted = 0
+
+    # ----------------------- INTERNALS ----------------------
+    def _drop(self, session):
+        # Caller holds the lock and has removed the session from the table.
+        ids = self._by_atm.get(session.atm_id)
+        if ids is not None:
+            ids.discard(session.session_id)
+            if not ids:
+                del self._by_atm[session.atm_id]
+
+    def _sweep(self, now):
+        # Drop up to sweep_batch expired sessions from the front; every call
+        # makes a bounded amount of progress.
+        for _ in range(self.sweep_batch):
+            if not self._sessions:
+                return
+            session = next(iter(self._sessions.values()))
+            if session.expires > now:
+                return
+            self._sessions.popitem(last=False)
+            self._drop(session)
+            self._expired += 1
+
+    # ------------------------ PUBLIC ------------------------
+    def create(self, session_id, atm_id, user_id, channel=None, now=None):
+        """Register a login under a fresh session_id; returns the session_id."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._sweep(now)
+            while len(self._sessions) >= self.max_sessions:
+                _, oldest = self._sessions.popitem(last=False)
+                self._drop(oldest)
+                self._evicted += 1
+            self._sessions[session_id] = Session(session_id, atm_id, user_id, now + self.ttl, channel)
+            self._by_atm.setdefault(atm_id, set()).add(session_id)
+        return session_id
+
+    def get(self, session_id, atm_id=None, now=None):
+        """
+        The live session for a handle, renewing its TTL; None if unknown,
+        expired, or (when atm_id is given) issued to another ATM.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._sweep(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if session.expires <= now:
+                del self._sessions[session_id]
+                self._drop(session)
+                self._expired += 1
+                return None
+            if atm_id is not None and session.atm_id != atm_id:
+                return None
+            session.expires = now + self.ttl
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def logout(self, session_id):
+        """End one session; returns False if it was not open."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self._drop(session)
+            return True
+
+    def logout_atm(self, atm_id):
+        """Force-logout every session of an ATM; returns how many were ended."""
+        with self._lock:
+            ids = self._by_atm.pop(atm_id, set())
+            for session_id in ids:
+                self._sessions.pop(session_id, None)
+            return len(ids)
+
+    def atm_count(self, atm_id):
+        with self._lock:
+            return len(self._by_atm.get(atm_id, ()))
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        with self._lock:
+            self._sweep(time.monotonic())
+            return {
+                "sessions": len(self._sessions),
+                "atms": len(self._by_atm),
+                "expired": self._expired,
+                "evicted": self._evicted,
+                "ttl": self.ttl,
+                "max_sessions": self.max_sessions,
+            }
@@ -0,0 +1,312 @@
+import os
+import json
+import bisect
+import hashlib
+import threading
+
+from utils.account_store import AccountStore
+from utils.history_store import HistoryStore
+from utils.transactions import TransactionManager, StripedLock
+from utils.state_server import StateClient, RemoteAccountStore, RemoteTransactionManager, state_authkey
+
+# Account sharding for the bank API.
+#
+# Accounts are spread over N storage shards by a consistent-hash ring of
+# user IDs (each shard owns `vnodes` points on the ring). A shard is either a
+# local directory (its own journal, snapshot and history) or a separate
+# state process (utils/state_server.py). ShardRouter sits where bank_api's
+# store and transaction manager used to be and sends each call to the shard
+# that owns the account.
+#
+# Adding a shard only moves the accounts whose ring owner changes, about
+# 1/(N+1) of them, and it happens online. Each account is moved while the
+# router holds that account's lock: export from the old shard, import on the
+# new one, drop the old copy. Requests for accounts not yet moved go to the
+# old shard; accounts already moved, and new signups, go to their new owner.
+#
+# With a state_path the router keeps the shard list and the migration cursor
+# (target shard, source shards already drained) in a small JSON file,
+# replaced atomically at each step. restore() reads it at startup and
+# finishes an interrupted move before anything is served: accounts already
+# on the target stay there, the rest are moved from the sources not yet
+# drained, and an account caught between import and drop is imported again
+# from the source, which still has the authoritative copy.
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping keys to shard names.
+    """
+
+    def __init__(self, shards=(), vnodes=128):
+        self.vnodes = vnodes
+        self._points = []   # sorted hashes
+        self._owners = []   # shard name per point
+        for name in shards:
+            self.add(name)
+
+    def add(self, name):
+        for i in range(self.vnodes):
+            point = _hash(f"{name}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, name)
+
+    def owner(self, key):
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def shards(self):
+        return sorted(set(self._owners))
+
+    def copy(self):
+        ring = HashRing(vnodes=self.vnodes)
+        ring._points, ring._owners = list(self._points), list(self._owners)
+        return ring
+
+
+class Shard:
+    """One storage partition: an AccountStore-like store and a TransactionManager-like txn."""
+
+    def __init__(self, name, store, txn, spec=None):
+        self.name, self.store, self.txn, self.spec = name, store, txn, spec
+
+
+def open_shard(name, spec, velocity=None):
+    """
+    Open a shard from its spec: "host:port" of a state process, or a local directory.
+    A local shard screens withdrawals with `velocity`; a state process has its own.
+    """
+    host, sep, port = spec.rpartition(":")
+    if sep and port.isdigit():
+        client = StateClient(spec, state_authkey())
+        return Shard(name, RemoteAccountStore(client), RemoteTransactionManager(client), spec)
+    os.makedirs(spec, exist_ok=True)
+    history = HistoryStore(os.path.join(spec, "history"))
+    store = AccountStore(os.path.join(spec, "user_db.json"), history=history)
+    return Shard(name, store, TransactionManager(store, history, velocity=velocity), spec)
+
+
+def parse_shards(text):
+    """ "s1=127.0.0.1:1301,s2=shards/s2" -> {name: spec} """
+    return dict(part.strip().split("=", 1) for part in text.split(",") if part.strip())
+
+
+class ShardRouter:
+    """
+    Routes account operations to shards by consistent hashing.
+
+    Offers the calls bank_api makes on its store (create_user, exists,
+    check_password, get_user, balance) and on its transaction manager
+    (execute, execute_batch).
+    """
+
+    def __init__(self, shards, vnodes=128, stripes=1024, state_path=None):
+        self.shards = {shard.name: shard for shard in shards}
+        self.ring = HashRing(self.shards, vnodes)
+        self.locks = StripedLock(stripes)
+        self.state_path = state_path
+        self._next_ring = None   # target ring while a shard is being added
+        self._moved = set()      # accounts already on their target shard
+        self._migration = {}     # progress of the running or last migration
+        self._admin_lock = threading.Lock()
+
+    @classmethod
+    def restore(cls, state_path, specs, opener, **kwargs):
+        """
+        Open the router described by state_path, or by specs ({name: spec})
+        if the file does not exist yet, and finish any migration it records.
+        opener(name, spec) opens one shard (see open_shard).
+        """
+        state = load_state(state_path)
+        if state is None:
+            state = {"shards": dict(specs), "migration": {}}
+        elif state["shards"] != dict(specs):
+            print(f"[SHARDS] Using the shard list in {state_path}: {state['shards']}")
+        router = cls([opener(name, spec) for name, spec in state["shards"].items()],
+                     state_path=state_path, **kwargs)
+        migration = state["migration"]
+        if migration and not migration["done"]:
+            print(f"[SHARDS] Resuming the move to shard {migration['shard']}")
+            router.add_shard(opener(migration["shard"], migration["spec"]),
+                             drained=migration["drained"], moved=migration["moved"])
+        else:
+            router._migration = dict(migration)
+            router._save()
+        return router
+
+    def _shard(self, user_id):
+        # Caller holds the account's stripe.
+        if self._next_ring is not None and user_id in self._moved:
+            return self.shards[self._next_ring.owner(user_id)]
+        return self.shards[self.ring.owner(user_id)]
+
+    # ------------------------ STORE -------------------------
+    def create_user(self, user_id, password):
+        with self.locks.hold(user_id):
+            current = self._shard(user_id)
+            if self._next_ring is None:
+                return current.store.create_user(user_id, password)
+            # Mid-migration: create on the final owner, unless the old owner has it
+            target = self.shards[self._next_ring.owner(user_id)]
+            if target is not current and current.store.exists(user_id):
+                return False
+            created = target.store.create_user(user_id, password)
+            if created:
+                self._moved.add(user_id)
+            return created
+
+    def exists(self, user_id):
+        with self.locks.hold(user_id):
+            return self._shard(user_id).store.exists(user_id)
+
+    def check_password(self, user_id, password):
+        with self.locks.hold(user_id):
+            return self._shard(user_id).store.check_password(user_id, password)
+
+    def get_user(self, user_id):
+        with self.locks.hold(user_id):
+            return self._shard(user_id).store.get_user(user_id)
+
+    def balance(self, user_id):
+        with self.locks.hold(user_id):
+            return self._shard(user_id).store.balance(user_id)
+
+    # --------------------- TRANSACTIONS ---------------------
+    def execute(self, user_id, command, atm_id=None):
+        with self.locks.hold(user_id):
+            return self._shard(user_id).txn.execute(user_id, command, atm_id)
+
+    def execute_batch(self, items, batch_key=None, atm_id=None):
+        """
+        Split a batch by shard and run each part as that shard's transaction;
+        results come back in the original order. Every part is keyed with
+        the batch's own key: shards record results per account and migration
+        carries them along, so a retry finds them wherever the account is.
+        """
+        with self.locks.hold(*{user_id for user_id, _ in items}):
+            parts = {}
+            for i, (user_id, command) in enumerate(items):
+                parts.setdefault(self._shard(user_id).name, []).append((i, user_id, command))
+            results = [None] * len(items)
+            for name, part in parts.items():
+                part_results = self.shards[name].txn.execute_batch([(u, c) for _, u, c in part], batch_key, atm_id)
+                for (i, _, _), result in zip(part, part_results):
+                    results[i] = result
+            return results
+
+    # ----------------------- MIGRATION ----------------------
+    def _save(self):
+        # Caller holds the admin lock, or nothing else is running yet
+        if self.state_path is None:
+            return
+        specs = {name: self.shards[name].spec for name in self.ring.shards()}
+        save_state(self.state_path, {"shards": specs, "migration": self._migration})
+
+    def add_shard(self, shard, progress_every=1000, drained=(), moved=0):
+        """
+        Add a shard and move the accounts it now owns to it, while serving
+        traffic. Returns the number of accounts moved.
+
+        drained and moved resume an interrupted migration: the sources
+        already emptied of the new shard's accounts, and how many were moved.
+        """
+        with self._admin_lock:
+            self._check_new_shard(shard)
+            return self._add_shard(shard, progress_every, drained, moved)
+
+    def start_add_shard(self, shard, progress_every=1000):
+        """
+        Check that the shard can be added, then run add_shard in a background
+        thread. Raises ValueError, before anything starts, if the name is
+        taken or another shard is still being added.
+        """
+        if not self._admin_lock.acquire(blocking=False):
+            raise ValueError("A shard is already being added")
+        try:
+            self._check_new_shard(shard)
+        except ValueError:
+            self._admin_lock.release()
+            raise
+
+        def run():
+            try:
+                self._add_shard(shard, progress_every)
+            finally:
+                self._admin_lock.release()
+        threading.Thread(target=run, name="shard-migration", daemon=True).start()
+
+    def _check_new_shard(self, shard):
+        if shard.name in self.shards:
+            raise ValueError(f"Shard {shard.name} already exists")
+        if self.state_path is not None and shard.spec is None:
+            raise ValueError(f"Shard {shard.name} has no spec to record")
+
+    def _add_shard(self, shard, progress_every=1000, drained=(), moved=0):
+        # Caller holds the admin lock
+        next_ring = self.ring.copy()
+        next_ring.add(shard.name)
+        sources = list(self.shards.values())
+        # Record the move before any account goes, so a restart can finish it
+        self._migration = {"shard": shard.name, "spec": shard.spec, "drained": list(drained),
+                           "moved": moved, "done": False}
+        self._save()
+        # Start routing by the target ring once no request is in flight, so
+        # no account can appear on an old shard after it has been listed
+        with self.locks.hold_all():
+            self.shards[shard.name] = shard
+            self._moved = set()
+            self._next_ring = next_ring
+
+        for source in sources:
+            if source.name in self._migration["drained"]:
+                continue
+            for user_id in source.store.user_ids():
+                if next_ring.owner(user_id) != shard.name:
+                    continue
+                with self.locks.hold(user_id):
+                    if user_id in self._moved:
+                        continue
+                    account = source.txn.export_account(user_id)
+                    if account is not None:
+                        shard.txn.import_account(user_id, account)
+                        source.txn.drop_account(user_id)
+                    self._moved.add(user_id)
+                self._migration["moved"] += 1
+                if progress_every and self._migration["moved"] % progress_every == 0:
+                    print(f"[SHARDS] {self._migration['moved']} accounts moved to {shard.name}")
+            self._migration["drained"].append(source.name)
+            self._save()
+
+        with self.locks.hold_all():
+            self.ring = next_ring
+            self._next_ring = None
+            self._moved = set()
+            self._migration["done"] = True
+            self._save()
+        return self._migration["moved"]
+
+    def status(self):
+        return {"shards": self.ring.shards(), "migration": dict(self._migration)}
+
+
+def load_state(path):
+    """The {"shards", "migration"} saved at path, or None if there is none yet."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_state(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,283 @@
+import os
+import queue
+import argparse
+import threading
+from multiprocessing.connection import Listener, Client
+
+from utils.account_store import AccountStore
+from utils.history_store import HistoryStore
+from utils.transactions import TransactionManager
+from utils.replay_cache import ReplayCache
+from utils.session_registry import SessionRegistry
+from utils.velocity import VelocityCheck
+
+# Single-writer state process for running bank_api in several processes.
+#
+# One StateServer process owns the account store, history, transaction locks,
+# the replay cache, the login sessions and the withdrawal velocity counters.
+# bank_api worker processes do the HTTP parsing and all RSA/signature work
+# themselves and reach the state over multiprocessing.connection with small
+# pickled calls, through proxies
+# (RemoteAccountStore, RemoteTransactionManager, RemoteReplayCache,
+# RemoteSessionRegistry, RemoteVelocityCheck) that have the same interface as
+# the local objects. Since every mutation runs in one process, per-account
+# locking, journaling, replay detection, sessions and velocity checks work
+# exactly as with a single worker.
+#
+# Calls are pickled, so whoever can connect can run code in the state
+# process: connections must authenticate with a shared secret, taken from
+# BANK_STATE_AUTHKEY. There is no default key; bank_cluster.py generates a
+# random one per run, and the state process refuses to start without one.
+
+
+def state_authkey():
+    """The shared secret from BANK_STATE_AUTHKEY; raises RuntimeError if unset."""
+    key = os.environ.get("BANK_STATE_AUTHKEY")
+    if not key:
+        raise RuntimeError("BANK_STATE_AUTHKEY is not set; the state process needs a shared secret "
+                           "(bank_cluster.py generates one per run)")
+    return key.encode()
+
+
+def parse_address(text):
+    """"host:port" -> (host, port); anything else is a Unix socket path."""
+    host, sep, port = text.rpartition(":")
+    return (host, int(port)) if sep and port.isdigit() else text
+
+
+class StateServer:
+    """
+    Serves AccountStore, TransactionManager, ReplayCache, SessionRegistry and
+    VelocityCheck calls to worker processes.
+    """
+
+    def __init__(self, address, snapshot_path="user_db.json", history_root="history",
+                 authkey=None, max_skew=120, session_ttl=900.0, max_sessions=500_000,
+                 velocity=None):
+        if not authkey:
+            raise ValueError("StateServer needs an authkey")
+        self.history = HistoryStore(history_root)
+        self.store = AccountStore(snapshot_path, history=self.history)
+        self.velocity = velocity
+        self.txn = TransactionManager(self.store, self.history, velocity=velocity)
+        self.replay = ReplayCache(max_skew=max_skew)
+        self.sessions = SessionRegistry(ttl=session_ttl, max_sessions=max_sessions)
+        self.listener = Listener(address, backlog=128, authkey=authkey)
+        self.address = self.listener.address
+        self._methods = {
+            "store.create_user": self.store.create_user,
+            "store.exists": self.store.exists,
+            "store.check_password": self.store.check_password,
+            "store.get_user": self.store.get_user,
+            "store.balance": self.store.balance,
+            "store.deposit": self.store.deposit,
+            "store.withdraw": self.store.withdraw,
+            "store.user_ids": self.store.user_ids,
+            "txn.execute": self.txn.execute,
+            "txn.execute_batch": self.txn.execute_batch,
+            "txn.export_account": self.txn.export_account,
+            "txn.import_account": self.txn.import_account,
+            "txn.drop_account": self.txn.drop_account,
+            "replay.check": self.replay.check,
+            "replay.stats": self.replay.stats,
+            "sessions.create": self.sessions.create,
+            "sessions.get": self.sessions.get,
+            "sessions.logout": self.sessions.logout,
+            "sessions.logout_atm": self.sessions.logout_atm,
+            "sessions.atm_count": self.sessions.atm_count,
+            "sessions.stats": self.sessions.stats,
+        }
+        if velocity is not None:
+            self._methods["velocity.stats"] = velocity.stats
+            self._methods["velocity.recent_flags"] = velocity.recent_flags
+
+    def serve_forever(self):
+        print(f"[STATE] Serving account state on {self.address}")
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError) as e:
+                print(f"[STATE] Rejected connection: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        # One thread per worker connection; calls on it are answered in order.
+        with conn:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ("ok", self._methods[method](*args))
+                except Exception as e:
+                    reply = ("error", e)
+                try:
+                    conn.send(reply)
+                except Exception as e:   # unpicklable result or exception
+                    conn.send(("error", RuntimeError(repr(e))))
+
+    def close(self):
+        self.listener.close()
+        self.store.close()
+
+
+class StateClient:
+    """
+    Pool of connections from one worker process to the state server.
+    """
+
+    def __init__(self, address, authkey, pool_size=32):
+        if not authkey:
+            raise ValueError("StateClient needs an authkey")
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.authkey = authkey
+        self._idle = queue.LifoQueue(pool_size)
+
+    def call(self, method, *args):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, authkey=self.authkey)
+        try:
+            conn.send((method, args))
+            status, result = conn.recv()
+        except BaseException:
+            conn.close()   # state of the connection is unknown; do not reuse it
+            raise
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        if status == "error":
+            raise result
+        return result
+
+
+class RemoteAccountStore:
+    """AccountStore interface served by the state process."""
+
+    def __init__(self, client):
+        self._call = client.call
+
+    def create_user(self, user_id, password):
+        return self._call("store.create_user", user_id, password)
+
+    def exists(self, user_id):
+        return self._call("store.exists", user_id)
+
+    def check_password(self, user_id, password):
+        return self._call("store.check_password", user_id, password)
+
+    def get_user(self, user_id):
+        return self._call("store.get_user", user_id)
+
+    def balance(self, user_id):
+        return self._call("store.balance", user_id)
+
+    def deposit(self, user_id, amount):
+        return self._call("store.deposit", user_id, amount)
+
+    def withdraw(self, user_id, amount):
+        return self._call("store.withdraw", user_id, amount)
+
+    def user_ids(self):
+        return self._call("store.user_ids")
+
+
+class RemoteTransactionManager:
+    """TransactionManager interface served by the state process."""
+
+    def __init__(self, client):
+        self._call = client.call
+
+    def execute(self, user_id, command, atm_id=None):
+        return self._call("txn.execute", user_id, command, atm_id)
+
+    def execute_batch(self, items, batch_key=None, atm_id=None):
+        return self._call("txn.execute_batch", items, batch_key, atm_id)
+
+    def export_account(self, user_id):
+        return self._call("txn.export_account", user_id)
+
+    def import_account(self, user_id, account):
+        return self._call("txn.import_account", user_id, account)
+
+    def drop_account(self, user_id):
+        return self._call("txn.drop_account", user_id)
+
+
+class RemoteReplayCache:
+    """ReplayCache interface served by the state process, shared by all workers."""
+
+    def __init__(self, client):
+        self._call = client.call
+
+    def check(self, atm_id, nonce, timestamp, now=None, record=True):
+        return self._call("replay.check", atm_id, nonce, timestamp, now, record)
+
+    def stats(self):
+        return self._call("replay.stats")
+
+
+class RemoteSessionRegistry:
+    """SessionRegistry interface served by the state process; sessions carry no AES channel."""
+
+    def __init__(self, client):
+        self._call = client.call
+
+    def create(self, session_id, atm_id, user_id, channel=None):
+        return self._call("sessions.create", session_id, atm_id, user_id)
+
+    def get(self, session_id, atm_id=None):
+        return self._call("sessions.get", session_id, atm_id)
+
+    def logout(self, session_id):
+        return self._call("sessions.logout", session_id)
+
+    def logout_atm(self, atm_id):
+        return self._call("sessions.logout_atm", atm_id)
+
+    def atm_count(self, atm_id):
+        return self._call("sessions.atm_count", atm_id)
+
+    def stats(self):
+        return self._call("sessions.stats")
+
+
+class RemoteVelocityCheck:
+    """Reports of the VelocityCheck in the state process (withdrawals are screened there)."""
+
+    def __init__(self, client):
+        self._call = client.call
+
+    def recent_flags(self, limit=100):
+        return self._call("velocity.recent_flags", limit)
+
+    def stats(self):
+        return self._call("velocity.stats")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Account state process for multi-worker bank_api")
+    parser.add_argument("--address", default="127.0.0.1:1201", help="host:port or Unix socket path")
+    parser.add_argument("--data", default="user_db.json")
+    parser.add_argument("--history", default="history")
+    args = parser.parse_args()
+
+    try:
+        authkey = state_authkey()
+    except RuntimeError as e:
+        parser.error(str(e))
+    server = StateServer(parse_address(args.address), args.data, args.history, authkey,
+                         max_skew=int(os.environ.get("BANK_MAX_CLOCK_SKEW", 120)),
+                         session_ttl=float(os.environ.get("BANK_SESSION_TTL", 900)),
+                         max_sessions=int(os.environ.get("BANK_MAX_SESSIONS", 500_000)),
+                         velocity=VelocityCheck.from_spec(os.environ.get("BANK_VELOCITY_RULES", ""),
+                                                          float(os.environ.get("BANK_VELOCITY_WINDOW", 600))))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
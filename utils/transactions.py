@@ -0,0 +1,247 @@
+import threading
+import zlib
+from contextlib import contextmanager
+
+# Transaction layer for the bank API.
+#
+# Every command runs while holding the lock stripe of its account, and the
+# stripe stays held until the store reports the change as durable. Commands
+# on the same account are therefore serialized, while commands on different
+# accounts proceed in parallel and share the store's batched fsyncs.
+#
+# With a VelocityCheck (utils/velocity.py), a withdrawal that the balance
+# covers is screened against the velocity rules before it is applied, still
+# under the account's lock; rejected ones are declined.
+
+DEPOSIT_AMOUNT = 100   # Fixed deposit
+WITHDRAW_AMOUNT = 50   # Fixed withdrawal
+ACTIVITY_PAGE = 20     # Default page size for "activity"
+MAX_ACTIVITY_PAGE = 200
+
+
+def parse_page_options(args, default_limit=ACTIVITY_PAGE):
+    """
+    Parse "limit=N after=CURSOR" arguments of a paginated history command.
+    """
+    options = dict(arg.split("=", 1) for arg in args if "=" in arg)
+    limit = min(max(int(options.get("limit", default_limit)), 1), MAX_ACTIVITY_PAGE)
+    return limit, options.get("after")
+
+
+def format_page(lines, next_cursor):
+    if next_cursor:
+        lines = lines + [f"More: after={next_cursor}"]
+    return "\n".join(lines)
+
+
+class StripedLock:
+    """
+    Fixed pool of locks; each key maps to one stripe by hash.
+    """
+
+    def __init__(self, stripes=1024):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _index(self, key):
+        return zlib.crc32(key.encode()) % len(self._locks)
+
+    def for_key(self, key):
+        return self._locks[self._index(key)]
+
+    @contextmanager
+    def hold(self, *keys):
+        # Acquire stripes in index order so multi-key holders cannot deadlock.
+        indexes = sorted({self._index(k) for k in keys})
+        for i in indexes:
+            self._locks[i].acquire()
+        try:
+            yield
+        finally:
+            for i in reversed(indexes):
+                self._locks[i].release()
+
+    @contextmanager
+    def hold_all(self):
+        # Every stripe, in index order: waits out all current holders.
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+
+
+class _StagedAccounts:
+    """
+    Store view for a batch: reads see earlier commands of the batch, writes
+    are collected as journal records for one AccountStore.apply_batch().
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.records = []
+        self._deltas = {}
+
+    def balance(self, user_id):
+        return self.store.balance(user_id) + self._deltas.get(user_id, 0)
+
+    def deposit(self, user_id, amount):
+        self.records.append({"op": "deposit", "user_id": user_id, "amount": amount})
+        self._deltas[user_id] = self._deltas.get(user_id, 0) + amount
+        return self.balance(user_id)
+
+    def withdraw(self, user_id, amount):
+        if self.balance(user_id) < amount:
+            return None
+        self.records.append({"op": "withdraw", "user_id": user_id, "amount": amount})
+        self._deltas[user_id] = self._deltas.get(user_id, 0) - amount
+        return self.balance(user_id)
+
+
+class _StagedHistory:
+    """
+    History view for a batch: appends are held back until the batch commits.
+    Pages are read from the committed history.
+    """
+
+    def __init__(self, history):
+        self.history = history
+        self.pending = []
+
+    def append(self, user_id, record):
+        self.pending.append((user_id, record))
+
+    def page(self, user_id, limit, after=None):
+        return self.history.page(user_id, limit, after)
+
+    def commit(self):
+        for user_id, record in self.pending:
+            self.history.append(user_id, record)
+
+
+class TransactionManager:
+    """
+    Runs ATM commands against an AccountStore under per-account locks.
+    """
+
+    def __init__(self, store, history, stripes=1024, velocity=None):
+        self.store = store
+        self.history = history
+        self.velocity = velocity
+        self.locks = StripedLock(stripes)
+        # Serializes the dedup check and the apply of one batch key
+        self._batch_locks = StripedLock(256)
+
+    def account(self, user_id):
+        return self.locks.hold(user_id)
+
+    def execute(self, user_id, command, atm_id=None):
+        """Apply one command to an account and return the response message."""
+        with self.account(user_id):
+            return self._execute_locked(user_id, command, atm_id=atm_id)
+
+    def execute_batch(self, items, batch_key=None, atm_id=None):
+        """
+        Apply (user_id, command) pairs in order as one transaction.
+
+        Every account in the batch stays locked until the batch is durable.
+        All balance changes go to the store as one journal record, so they
+        are persisted together with a single fsync. Returns one
+        (ok, message) pair per item; unknown accounts fail individually.
+        A keyed batch ((atm_id, batch_id)) is journaled with its key and each
+        account's results, and the same key again returns those results
+        without re-applying the batch, also after a restart; only commands for
+        accounts the key has no results for are run. The store remembers the
+        last few keys of each ATM (AccountStore.batches_per_atm), which covers
+        a sender that retries one batch until it is answered, as the outbox
+        does, and the results move with an account to another shard.
+        atm_id is the ATM that sent the batch, for the velocity checks.
+        """
+        if batch_key is None:
+            return self._execute_batch(items, atm_id)
+        batch_key = tuple(batch_key)
+        with self._batch_locks.hold(repr(batch_key)):
+            recorded = {}
+            for user_id, ok, message in self.store.batch_results(batch_key) or ():
+                recorded.setdefault(user_id, []).append((ok, message))
+            fresh = [(user_id, command) for user_id, command in items if user_id not in recorded]
+            if fresh:
+                for (user_id, _), result in zip(fresh, self._execute_batch(fresh, atm_id, batch_key)):
+                    recorded.setdefault(user_id, []).append(result)
+            # Each account's results answer its commands in order
+            replies = {user_id: iter(results) for user_id, results in recorded.items()}
+            return [next(replies[user_id], (False, "Batch already applied")) for user_id, _ in items]
+
+    # ----------------------- MIGRATION ----------------------
+    # Moving an account between shards (utils/sharding.py): export it, import
+    # it on the new shard, then drop it here.
+    def export_account(self, user_id):
+        """Return {"password", "balance", "history", "batches"} for an account, or None."""
+        with self.account(user_id):
+            user = self.store.get_user(user_id)
+            if user is None:
+                return None
+            return {"password": user["password"], "balance": user["balance"],
+                    "history": self.history.export(user_id), "batches": self.store.account_batches(user_id)}
+
+    def import_account(self, user_id, account):
+        """Install an exported account, replacing any copy left by an interrupted move."""
+        with self.account(user_id):
+            self.history.remove(user_id)
+            self.history.import_entries(user_id, account["history"])
+            self.store.import_user(user_id, account["password"], account["balance"], account.get("batches", ()))
+
+    def drop_account(self, user_id):
+        with self.account(user_id):
+            self.store.remove_user(user_id)
+            self.history.remove(user_id)
+
+    def _execute_batch(self, items, atm_id=None, batch_key=None):
+        with self.locks.hold(*{user_id for user_id, _ in items}):
+            accounts = _StagedAccounts(self.store)
+            activity = _StagedHistory(self.history)
+            results = []
+            for user_id, command in items:
+                if not self.store.exists(user_id):
+                    results.append((False, "User not found"))
+                else:
+                    results.append((True, self._execute_locked(user_id, command, accounts, activity, atm_id)))
+            if accounts.records or batch_key is not None:
+                self.store.apply_batch(accounts.records, batch_key,
+                                       [(user_id, ok, message) for (user_id, _), (ok, message) in zip(items, results)])
+            activity.commit()
+        return results
+
+    def _execute_locked(self, user_id, command, store=None, history=None, atm_id=None):
+        store = store or self.store
+        history = history or self.history
+        name, *args = command.split() or [""]
+        if command == "balance":
+            return f"Balance: ${store.balance(user_id)}"
+        elif command == "deposit":
+            store.deposit(user_id, DEPOSIT_AMOUNT)
+            history.append(user_id, {"action": "deposit", "amount": DEPOSIT_AMOUNT})
+            return f"Deposited ${DEPOSIT_AMOUNT}"
+        elif command == "withdraw":
+            if self.velocity is not None and store.balance(user_id) >= WITHDRAW_AMOUNT:
+                verdict, _ = self.velocity.screen(user_id, atm_id, WITHDRAW_AMOUNT)
+                if verdict == "reject":
+                    return "Withdrawal declined: unusual activity"
+            if store.withdraw(user_id, WITHDRAW_AMOUNT) is not None:
+                history.append(user_id, {"action": "withdraw", "amount": WITHDRAW_AMOUNT})
+                return f"Withdrew ${WITHDRAW_AMOUNT}"
+            return "Insufficient balance"
+        elif name == "activity":
+            # activity [limit=N] [after=CURSOR]: newest first, one page at a time
+            try:
+                limit, after = parse_page_options(args)
+                entries, next_cursor = history.page(user_id, limit, after)
+            except ValueError:
+                return "Invalid activity options"
+            if not entries:
+                return "No recent activity"
+            return format_page([f"{a['action']}: ${a['amount']}" for a in entries], next_cursor)
+        elif command == "quit":
+            return "Session ended"
+        return "Unknown command"
@@ -0,0 +1,238 @@
+import time
+import threading
+from array import array
+from collections import OrderedDict, deque
+
+# Velocity and anomaly checks on withdrawals.
+#
+# Before a withdrawal is applied it is screened against sliding-window
+# aggregates of recent withdrawals: per account (amount, count and distinct
+# ATMs) and per ATM (amount and count). The aggregates are never recomputed
+# from history. Each account and ATM has a ring of per-bucket counters with a
+# running total; a window of `window` seconds is `buckets` buckets wide, and
+# buckets that slide out are subtracted as time advances, so a check costs a
+# bounded number of steps and a fixed amount of memory per key however long
+# the history is. Keys idle for a whole window hold nothing and are dropped
+# from the front of an LRU table, which is also capped at max_tracked.
+#
+# Rules compare the aggregates as they would be after the withdrawal against
+# a limit and either "flag" the withdrawal (applied, and listed for review)
+# or "reject" it. A rule is any object with name, action and exceeded(stats);
+# parse_rules() builds the standard ones from a spec such as
+#     "account_amount>1000:reject,account_atms>3:reject,atm_amount>20000:flag"
+#
+# Counters are per process: in multi-process mode they live with the
+# TransactionManager in the state process; each storage shard keeps its own.
+
+METRICS = ("account_amount", "account_count", "account_atms", "atm_amount", "atm_count")
+ACTIONS = ("flag", "reject")
+
+# Suggested rules for bank_api's fixed $50 withdrawal: 20 in a window pass,
+# the 21st is declined. Neither bank_api nor bank_server applies any rules
+# unless they are configured.
+DEFAULT_RULES = "account_amount>1000:reject,account_count>15:flag,account_atms>3:reject,atm_amount>20000:flag"
+
+
+class Rule:
+    """Flag or reject when a windowed aggregate would exceed a limit."""
+
+    __slots__ = ("name", "metric", "limit", "action")
+
+    def __init__(self, metric, limit, action="reject", name=None):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown velocity metric: {metric}")
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown velocity action: {action}")
+        self.metric = metric
+        self.limit = limit
+        self.action = action
+        self.name = name or f"{metric}>{limit}"
+
+    def exceeded(self, stats):
+        return stats[self.metric] > self.limit
+
+    def __repr__(self):
+        return f"{self.name}:{self.action}"
+
+
+def parse_rules(spec):
+    """ "account_amount>1000:reject,atm_count>500:flag" -> [Rule, ...] """
+    rules = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        condition, _, action = part.strip().partition(":")
+        metric, sep, limit = condition.partition(">")
+        if not sep:
+            raise ValueError(f"Bad velocity rule: {part}")
+        rules.append(Rule(metric.strip(), int(limit), action.strip() or "reject"))
+    return rules
+
+
+class RingCounter:
+    """
+    Amount and count over the last len(amounts) buckets, kept as running totals.
+
+    Also remembers, for an account, the last bucket each ATM was used in
+    (at most max_atms of them) to count distinct ATMs in the window.
+    """
+
+    __slots__ = ("tick", "amounts", "counts", "amount", "count", "atms")
+
+    def __init__(self, buckets, tick, track_atms=False):
+        self.tick = tick
+        self.amounts = array("q", bytes(8 * buckets))
+        self.counts = array("q", bytes(8 * buckets))
+        self.amount = 0
+        self.count = 0
+        self.atms = {} if track_atms else None
+
+    def advance(self, tick):
+        # Subtract the buckets that slid out since the last call; at most one
+        # pass over the ring, however long the gap.
+        n = len(self.counts)
+        gap = tick - self.tick
+        if gap <= 0:
+            return
+        if gap >= n:
+            for i in range(n):
+                self.amounts[i] = self.counts[i] = 0
+            self.amount = self.count = 0
+        else:
+            for t in range(self.tick + 1, tick + 1):
+                i = t % n
+                self.amount -= self.amounts[i]
+                self.count -= self.counts[i]
+                self.amounts[i] = self.counts[i] = 0
+        self.tick = tick
+
+    def distinct_atms(self, atm_id, max_atms):
+        # ATMs used in the window, counting atm_id; caller has advanced the ring.
+        oldest = self.tick - len(self.counts)
+        for atm, last in list(self.atms.items()):
+            if last <= oldest:
+                del self.atms[atm]
+        return len(self.atms) + (atm_id not in self.atms)
+
+    def add(self, amount, atm_id=None, max_atms=16):
+        i = self.tick % len(self.counts)
+        self.amounts[i] += amount
+        self.counts[i] += 1
+        self.amount += amount
+        self.count += 1
+        if self.atms is not None:
+            if atm_id not in self.atms and len(self.atms) >= max_atms:
+                del self.atms[min(self.atms, key=self.atms.get)]
+            self.atms[atm_id] = self.tick
+
+
+class VelocityCheck:
+    """
+    Pre-commit rule stage for withdrawals over per-account and per-ATM windows.
+    """
+
+    def __init__(self, rules=None, window=600.0, buckets=10, max_tracked=1_000_000,
+                 max_atms=16, sweep_batch=64, recent_flags=1000):
+        self.rules = parse_rules(DEFAULT_RULES) if rules is None else list(rules)
+        self.window = window
+        self.buckets = buckets
+        self.width = window / buckets
+        self.max_tracked = max_tracked
+        self.max_atms = max_atms
+        self.sweep_batch = sweep_batch
+        self._accounts = OrderedDict()   # user_id -> RingCounter, least recently used first
+        self._atms = OrderedDict()       # atm_id -> RingCounter
+        self._recent = deque(maxlen=recent_flags)
+        self._lock = threading.Lock()
+        self._screened = 0
+        self._flagged = {}
+        self._rejected = {}
+
+    @classmethod
+    def from_spec(cls, spec, window=600.0):
+        """A check with the rules in spec, or None if spec is empty (checks off)."""
+        return cls(parse_rules(spec), window) if spec.strip() else None
+
+    # ----------------------- INTERNALS ----------------------
+    def _counter(self, table, key, tick, track_atms=False):
+        counter = table.get(key)
+        if counter is None:
+            counter = table[key] = RingCounter(self.buckets, tick, track_atms)
+            while len(table) > self.max_tracked:
+                table.popitem(last=False)
+        else:
+            counter.advance(tick)
+            table.move_to_end(key)
+        return counter
+
+    def _sweep(self, table, tick):
+        # Drop keys idle for a whole window from the front, a bounded batch per call
+        for _ in range(self.sweep_batch):
+            if not table:
+                return
+            counter = next(iter(table.values()))
+            if counter.tick > tick - self.buckets:
+                return
+            table.popitem(last=False)
+
+    # ------------------------ PUBLIC ------------------------
+    def screen(self, user_id, atm_id, amount, now=None):
+        """
+        Check a withdrawal against the rules and, unless rejected, count it.
+
+        Returns (verdict, rule): (None, None) to pass, ("flag", name) to pass
+        and list for review, ("reject", name) to decline. Call it only for a
+        withdrawal that will be applied if it passes.
+        """
+        if amount <= 0:
+            raise ValueError(f"Withdrawal amount must be positive: {amount}")
+        now = time.monotonic() if now is None else now
+        tick = int(now // self.width)
+        atm_id = atm_id or ""
+        with self._lock:
+            self._sweep(self._accounts, tick)
+            self._sweep(self._atms, tick)
+            account = self._counter(self._accounts, user_id, tick, track_atms=True)
+            atm = self._counter(self._atms, atm_id, tick)
+            stats = {
+                "account_amount": account.amount + amount,
+                "account_count": account.count + 1,
+                "account_atms": account.distinct_atms(atm_id, self.max_atms),
+                "atm_amount": atm.amount + amount,
+                "atm_count": atm.count + 1,
+            }
+            verdict = rule = None
+            for candidate in self.rules:
+                if candidate.exceeded(stats):
+                    verdict, rule = candidate.action, candidate.name
+                    if verdict == "reject":
+                        break
+            self._screened += 1
+            if verdict == "reject":
+                self._rejected[rule] = self._rejected.get(rule, 0) + 1
+                return verdict, rule
+            account.add(amount, atm_id, self.max_atms)
+            atm.add(amount)
+            if verdict == "flag":
+                self._flagged[rule] = self._flagged.get(rule, 0) + 1
+                self._recent.append({"time": time.time(), "user_id": user_id, "atm_id": atm_id,
+                                     "amount": amount, "rule": rule})
+            return verdict, rule
+
+    def recent_flags(self, limit=100):
+        """Most recent flagged withdrawals, newest first."""
+        with self._lock:
+            return list(self._recent)[::-1][:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rules": [repr(rule) for rule in self.rules],
+                "window": self.window,
+                "buckets": self.buckets,
+                "accounts_tracked": len(self._accounts),
+                "atms_tracked": len(self._atms),
+                "screened": self._screened,
+                "flagged": dict(self._flagged),
+                "rejected": dict(self._rejected),
+            }